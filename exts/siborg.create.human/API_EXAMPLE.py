@@ -3,10 +3,12 @@
 # Description: This is an example of how to use the Human Generator API to create human models in NVIDIA Omniverse.
 # The siborg.create.human extension must be installed and enabled for this to work.
 
-# The script generates 10 humans, placing them throughout the stage. Random modifiers and clothing are applied to each.
+# The script generates 10 humans, placing them throughout the stage without overlaps. Random modifiers and
+# clothing are applied to each.
 
 import siborg.create.human as hg
 from siborg.create.human.shared import data_path
+from siborg.create.human import crowd
 import omni.usd
 import random
 
@@ -31,16 +33,12 @@ clothes = ["nvidia_Casual/nvidia_casual.mhclo", "omni_casual/omni_casual.mhclo",
 # Convert the clothing names to their full paths.
 clothes = [data_path(f"clothes/{c}") for c in clothes]
 
-# Create 20 humans, placing them randomly throughout the scene, and applying random modifier values
+# Create 10 humans with random modifier values
+paths = []
 for _ in range(10):
     h = hg.Human()
     h.add_to_scene()
-
-    # Apply a random translation and Y rotation to the human prim
-    translateOp = h.prim.AddTranslateOp()
-    translateOp.Set((random.uniform(-50, 50), 0, random.uniform(-50, 50)))
-    rotateOp = h.prim.AddRotateXYZOp()
-    rotateOp.Set((0, random.uniform(0, 360), 0))
+    paths.append(h.prim_path)
 
     # Apply a random value to the last 9 modifiers in the list.
     # These modifiers are macros that affect the overall shape of the human more than any individual modifier.
@@ -59,3 +57,7 @@ for _ in range(10):
 
     # Add a random clothing item to the human
     h.add_item(random.choice(clothes))
+
+# Place all the humans at once, at random positions and Y rotations in a 20 x 20 meter region. Humans are
+# kept at least their footprint apart so that they don't overlap
+crowd.place_humans(stage, paths, region=((-1000, -1000), (1000, 1000)))
@@ -1,2 +1,8 @@
+import importlib.util
 from .extension import *
-from .human import Human
\ No newline at end of file
+from .human import Human
+
+# Import the tests so that omni.kit.test discovers them. The test runner is only loaded
+# in test runs, so the tests are skipped otherwise
+if importlib.util.find_spec("omni.kit.test") is not None:
+    from . import tests
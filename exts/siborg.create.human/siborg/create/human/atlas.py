@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Union
+import hashlib
+import json
+import os
+import numpy as np
+import carb
+from PIL import Image
+from .shared import cache_path
+
+# Maps packed into atlases, in the order they are baked
+MAPS = ("diffuse", "normal", "ao")
+# Fill of the tiles of textures which don't have a map: white, a flat normal and no occlusion
+DEFAULT_COLORS = {"diffuse": (255, 255, 255), "normal": (128, 128, 255), "ao": (255, 255, 255)}
+# Default width and height of atlases, in pixels
+ATLAS_SIZE = 4096
+# Pixels around each tile filled with its edge, so that filtering doesn't bleed between tiles
+PADDING = 8
+
+
+@dataclass
+class Atlas:
+    """Textures packed into one image per map
+
+    Attributes
+    ----------
+    key : str
+        Hash of the packed textures, which names the atlas on disk
+    textures : Dict[str, str]
+        Path to the atlas of each map, keyed by "diffuse", "normal" and "ao". Maps which none
+        of the textures have are left out
+    transforms : np.ndarray
+        Scale (u, v) and offset (u, v) which move each texture's UVs into its tile, shape (n, 4)
+    """
+
+    key: str
+    textures: Dict[str, str]
+    transforms: np.ndarray
+
+    def remap_uvs(self, uvs: np.ndarray, parts: Union[int, np.ndarray]) -> np.ndarray:
+        """Move UVs into the tiles of their textures
+
+        Parameters
+        ----------
+        uvs : np.ndarray
+            UVs, shape (n, 2)
+        parts : Union[int, np.ndarray]
+            Index of the texture of all UVs, or of each UV, shape (n,)
+
+        Returns
+        -------
+        np.ndarray
+            UVs in the atlas, shape (n, 2), float32
+        """
+        # UVs outside of the texture would sample neighboring tiles. Textures repeat, so they
+        # are wrapped back into it. UVs within [0, 1] are kept as they are, so that a UV of 1 stays
+        # on the far edge of its tile
+        uvs = np.asarray(uvs, dtype=np.float32).reshape(-1, 2)
+        uvs = np.where((uvs < 0.0) | (uvs > 1.0), uvs % 1.0, uvs)
+        transforms = self.transforms[parts]
+        return (uvs * transforms[..., :2] + transforms[..., 2:]).astype(np.float32)
+
+
+def atlas_key(textures: List[Dict[str, str]], size: int) -> str:
+    """Hash of a combination of textures. Includes modification times and sizes, so that edited
+    textures are baked again.
+
+    Parameters
+    ----------
+    textures : List[Dict[str, str]]
+        Maps of each texture, keyed by kind
+    size : int
+        Width and height of the atlas
+
+    Returns
+    -------
+    str
+        Hex digest
+    """
+
+    def stamp(path):
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return [path, None, None]
+        return [path, stat.st_mtime_ns, stat.st_size]
+
+    spec = [{kind: stamp(path) for kind, path in sorted(maps.items())} for maps in textures]
+    return hashlib.sha256(json.dumps([size, PADDING, spec]).encode()).hexdigest()
+
+
+def layout(count: int, size: int, padding: int = PADDING) -> Tuple[int, int, np.ndarray]:
+    """Arrange textures in a square grid of equal tiles
+
+    Parameters
+    ----------
+    count : int
+        Number of textures
+    size : int
+        Width and height of the atlas
+    padding : int, optional
+        Pixels of padding around each tile, by default PADDING
+
+    Returns
+    -------
+    columns : int
+        Number of tiles in each row and column
+    tile : int
+        Width and height of each tile, including padding
+    transforms : np.ndarray
+        Scale (u, v) and offset (u, v) of each texture's UVs, shape (count, 4), float32
+    """
+    columns = max(int(np.ceil(np.sqrt(count))), 1)
+    tile = size // columns
+    inner = tile - 2 * padding
+    index = np.arange(count)
+    # Image rows run top-down, while V runs bottom-up
+    x0, y0 = (index % columns) * tile, (index // columns) * tile
+    transforms = np.empty((count, 4), dtype=np.float32)
+    transforms[:, :2] = inner / size
+    transforms[:, 2] = (x0 + padding) / size
+    transforms[:, 3] = 1 - (y0 + padding + inner) / size
+    return columns, tile, transforms
+
+
+def _bake_map(kind: str, paths: List[Union[str, None]], size: int, columns: int, tile: int, padding: int) -> np.ndarray:
+    """Pack one map of all textures into an image
+
+    Parameters
+    ----------
+    kind : str
+        Kind of map, one of MAPS
+    paths : List[Union[str, None]]
+        Path to the map of each texture, or None if the texture doesn't have it
+    size : int
+        Width and height of the atlas
+    columns : int
+        Number of tiles in each row and column
+    tile : int
+        Width and height of each tile, including padding
+    padding : int
+        Pixels of padding around each tile
+
+    Returns
+    -------
+    np.ndarray
+        RGB image, shape (size, size, 3), uint8
+    """
+    atlas = np.empty((size, size, 3), dtype=np.uint8)
+    atlas[:] = DEFAULT_COLORS[kind]
+    inner = tile - 2 * padding
+    for i, path in enumerate(paths):
+        if not path:
+            continue
+        try:
+            with Image.open(path) as image:
+                pixels = np.asarray(image.convert("RGB").resize((inner, inner), Image.BILINEAR))
+        except OSError as e:
+            carb.log_warn(f"Could not read {path} for the texture atlas: {e}")
+            continue
+        # Extend the edges of the texture into the padding
+        pixels = np.pad(pixels, ((padding, padding), (padding, padding), (0, 0)), mode="edge")
+        x0, y0 = (i % columns) * tile, (i // columns) * tile
+        atlas[y0 : y0 + tile, x0 : x0 + tile] = pixels
+    return atlas
+
+
+def bake(textures: List[Dict[str, str]], size: int = ATLAS_SIZE, padding: int = PADDING) -> Union[Atlas, None]:
+    """Pack the diffuse, normal and ambient occlusion maps of several textures into one atlas
+    per map. Atlases are cached on disk by the combination of textures, so each combination is
+    only baked once.
+
+    Parameters
+    ----------
+    textures : List[Dict[str, str]]
+        Maps of each texture, keyed by "diffuse", "normal" and "ao"
+    size : int, optional
+        Width and height of the atlas, by default ATLAS_SIZE
+    padding : int, optional
+        Pixels of padding around each tile, by default PADDING
+
+    Returns
+    -------
+    Union[Atlas, None]
+        The atlas, or None if there are no textures to pack
+    """
+    if not textures:
+        return None
+    columns, tile, transforms = layout(len(textures), size, padding)
+    if tile <= 2 * padding:
+        carb.log_warn(f"Can't pack {len(textures)} textures into a {size}px atlas")
+        return None
+
+    key = atlas_key(textures, size)
+    directory = cache_path("atlas")
+    os.makedirs(directory, exist_ok=True)
+
+    paths = {}
+    for kind in MAPS:
+        sources = [maps.get(kind) for maps in textures]
+        # Maps which none of the textures have are left out
+        if not any(sources):
+            continue
+        path = os.path.join(directory, f"{key}_{kind}.png")
+        if not os.path.isfile(path):
+            pixels = _bake_map(kind, sources, size, columns, tile, padding)
+            # Write to a temporary file first, so that a partial atlas is never read from the cache
+            partial = path + ".part"
+            Image.fromarray(pixels).save(partial, format="PNG")
+            os.replace(partial, path)
+            carb.log_info(f"Baked {kind} atlas of {len(textures)} textures to {path}")
+        paths[kind] = path
+
+    return Atlas(key, paths, transforms)
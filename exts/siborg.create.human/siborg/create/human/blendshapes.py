@@ -0,0 +1,197 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from pxr import Usd, UsdSkel, Sdf, Tf, Vt
+
+# Macro modifiers from the "General" panel of the macro frame. Exported as blend shapes by default
+MACRO_MODIFIERS = (
+    "macrodetails/Gender",
+    "macrodetails/Age",
+    "macrodetails-universal/Muscle",
+    "macrodetails-universal/Weight",
+    "macrodetails-height/Height",
+    "macrodetails-proportions/BodyProportions",
+)
+
+# Name of the skel animation prim which holds blend shape weights, relative to the human prim
+ANIMATION_NAME = "BlendShapeAnimation"
+
+# Offsets smaller than this are left out of blend shapes
+OFFSET_THRESHOLD = 1e-6
+
+
+def shape_names(full_name: str) -> Tuple[str, str]:
+    """Names of the pair of blend shapes which represent a modifier. The first moves the
+    modifier towards its maximum value, the second towards its minimum.
+
+    Parameters
+    ----------
+    full_name : str
+        Full name of the modifier
+
+    Returns
+    -------
+    Tuple[str, str]
+        Prim-safe names of the blend shapes
+    """
+    name = Tf.MakeValidIdentifier(full_name)
+    return name + "_up", name + "_down"
+
+
+def sparse_offsets(base: np.ndarray, target: np.ndarray, threshold: float = OFFSET_THRESHOLD):
+    """Compute sparse blend shape offsets between two sets of points
+
+    Parameters
+    ----------
+    base : np.ndarray
+        Points of the mesh at rest, shape (n, 3)
+    target : np.ndarray
+        Points of the mesh with the shape fully applied, shape (n, 3)
+    threshold : float, optional
+        Offsets whose largest component is not above this value are dropped, by default OFFSET_THRESHOLD
+
+    Returns
+    -------
+    offsets : np.ndarray
+        Offsets of the moved points, shape (m, 3), float32
+    indices : np.ndarray
+        Indices of the moved points, shape (m,), int32
+    """
+    delta = np.asarray(target, dtype=np.float32) - np.asarray(base, dtype=np.float32)
+    indices = np.flatnonzero(np.abs(delta).max(axis=1) > threshold).astype(np.int32)
+    return np.ascontiguousarray(delta[indices]), indices
+
+
+def merge_offsets(mesh_offsets: List[Tuple[np.ndarray, np.ndarray]], starts: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine the sparse offsets of several meshes into the offsets of a mesh which holds their
+    points one after the other
+
+    Parameters
+    ----------
+    mesh_offsets : List[Tuple[np.ndarray, np.ndarray]]
+        Offsets and point indices of each mesh, as returned by `sparse_offsets()`
+    starts : List[int]
+        Index of the first point of each mesh in the merged mesh
+
+    Returns
+    -------
+    offsets : np.ndarray
+        Offsets of the moved points, shape (m, 3), float32
+    indices : np.ndarray
+        Indices of the moved points in the merged mesh, shape (m,), int32
+    """
+    offsets = np.concatenate([o.reshape(-1, 3) for o, _ in mesh_offsets]).astype(np.float32)
+    indices = np.concatenate([i + start for (_, i), start in zip(mesh_offsets, starts)]).astype(np.int32)
+    return offsets, indices
+
+
+def shape_weights(values: Dict[str, float], ranges: Dict[str, Tuple[float, float, float]]) -> List[float]:
+    """Compute blend shape weights from modifier values. Each modifier has an "up" and a "down"
+    shape, in the order of `ranges`. Values are mapped linearly between the modifier value the
+    shapes were computed at and the modifier minimum or maximum.
+
+    Parameters
+    ----------
+    values : Dict[str, float]
+        Modifier values, keyed by full name. Modifiers which are left out are at their base value
+    ranges : Dict[str, Tuple[float, float, float]]
+        (base, min, max) values of each exported modifier, keyed by full name
+
+    Returns
+    -------
+    List[float]
+        Weights of all blend shapes
+    """
+    weights = []
+    for name, (base, vmin, vmax) in ranges.items():
+        value = values.get(name, base)
+        up = (value - base) / (vmax - base) if value > base and vmax > base else 0.0
+        down = (base - value) / (base - vmin) if value < base and base > vmin else 0.0
+        weights += [up, down]
+    return weights
+
+
+def author_blend_shapes(
+    stage: Usd.Stage,
+    mesh_paths: List[Sdf.Path],
+    skeleton: UsdSkel.Skeleton,
+    shapes: List[Tuple[str, List[Tuple[np.ndarray, np.ndarray]]]],
+) -> UsdSkel.Animation:
+    """Write blend shapes for each mesh and bind them to a skel animation which holds their weights.
+    Blend shapes which are no longer listed are removed.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage in which the meshes exist
+    mesh_paths : List[Sdf.Path]
+        Paths to the mesh prims
+    skeleton : UsdSkel.Skeleton
+        Skeleton which the meshes are bound to. The animation is set as its animation source
+    shapes : List[Tuple[str, List[Tuple[np.ndarray, np.ndarray]]]]
+        Name of each blend shape, with its offsets and point indices for each mesh in `mesh_paths`
+
+    Returns
+    -------
+    UsdSkel.Animation
+        Skel animation holding blend shape weights, initialized to 0
+    """
+    names = [name for name, _ in shapes]
+
+    for i, mesh_path in enumerate(mesh_paths):
+        mesh_prim = stage.GetPrimAtPath(mesh_path)
+
+        # Remove stale blend shapes
+        for child in mesh_prim.GetChildren():
+            if child.IsA(UsdSkel.BlendShape) and child.GetName() not in names:
+                stage.RemovePrim(child.GetPath())
+
+        targets = []
+        for name, mesh_offsets in shapes:
+            offsets, indices = mesh_offsets[i]
+            shape = UsdSkel.BlendShape.Define(stage, mesh_path.AppendChild(name))
+            shape.CreateOffsetsAttr().Set(Vt.Vec3fArray.FromNumpy(offsets.reshape(-1, 3)))
+            shape.CreatePointIndicesAttr().Set(Vt.IntArray.FromNumpy(indices))
+            targets.append(shape.GetPath())
+
+        binding = UsdSkel.BindingAPI.Apply(mesh_prim)
+        binding.CreateBlendShapesAttr().Set(names)
+        binding.CreateBlendShapeTargetsRel().SetTargets(targets)
+
+    # Blend shape weights are driven by an animation. It animates no joints, so the skeleton
+    # keeps its rest transforms
+    anim_path = skeleton.GetPath().GetParentPath().AppendChild(ANIMATION_NAME)
+    anim = UsdSkel.Animation.Define(stage, anim_path)
+    anim.CreateBlendShapesAttr().Set(names)
+    anim.CreateBlendShapeWeightsAttr().Set(Vt.FloatArray(len(names)))
+
+    skel_binding = UsdSkel.BindingAPI.Apply(skeleton.GetPrim())
+    skel_binding.CreateAnimationSourceRel().SetTargets([anim_path])
+
+    return anim
+
+
+def remove_blend_shapes(stage: Usd.Stage, mesh_paths: List[Sdf.Path], skeleton: UsdSkel.Skeleton):
+    """Remove all blend shapes and the blend shape animation from a human
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage in which the human exists
+    mesh_paths : List[Sdf.Path]
+        Paths to the human's mesh prims
+    skeleton : UsdSkel.Skeleton
+        Skeleton which the meshes are bound to
+    """
+    for mesh_path in mesh_paths:
+        mesh_prim = stage.GetPrimAtPath(mesh_path)
+        for child in mesh_prim.GetChildren():
+            if child.IsA(UsdSkel.BlendShape):
+                stage.RemovePrim(child.GetPath())
+        binding = UsdSkel.BindingAPI(mesh_prim)
+        if binding.GetBlendShapesAttr():
+            binding.GetBlendShapesAttr().Clear()
+        if binding.GetBlendShapeTargetsRel():
+            binding.GetBlendShapeTargetsRel().ClearTargets(True)
+
+    UsdSkel.BindingAPI(skeleton.GetPrim()).GetAnimationSourceRel().ClearTargets(True)
+    stage.RemovePrim(skeleton.GetPath().GetParentPath().AppendChild(ANIMATION_NAME))
@@ -0,0 +1,127 @@
+from typing import Dict, List
+import numpy as np
+from pxr import Usd, UsdGeom, UsdSkel, Gf
+
+# Skinned bounds are padded by this fraction of the size of the rest bounds on each side, so
+# that they still hold the meshes when joints and blend shapes move them from the rest pose
+SKINNED_BOUNDS_PADDING = 0.25
+
+
+def points_extent(points: np.ndarray) -> np.ndarray:
+    """Compute the extent of a set of points
+
+    Parameters
+    ----------
+    points : np.ndarray
+        Points, shape (n, 3)
+
+    Returns
+    -------
+    np.ndarray
+        Minimum and maximum corners, shape (2, 3), float32. Zero if there are no points
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    if not len(points):
+        return np.zeros((2, 3), dtype=np.float32)
+    return np.stack([points.min(axis=0), points.max(axis=0)])
+
+
+def skinned_extent(extents: List[np.ndarray], padding: float = SKINNED_BOUNDS_PADDING) -> np.ndarray:
+    """Estimate the extent of skinned meshes from the extents of the meshes at rest. The union
+    of the rest extents is padded, as skinning can move points outside of them.
+
+    Parameters
+    ----------
+    extents : List[np.ndarray]
+        Rest extent of each mesh, shape (2, 3)
+    padding : float, optional
+        Fraction of the size of the union added on each side, by default SKINNED_BOUNDS_PADDING
+
+    Returns
+    -------
+    np.ndarray
+        Minimum and maximum corners, shape (2, 3), float32
+    """
+    if not extents:
+        return np.zeros((2, 3), dtype=np.float32)
+    extents = np.asarray(extents, dtype=np.float32)
+    lower, upper = extents[:, 0].min(axis=0), extents[:, 1].max(axis=0)
+    margin = (upper - lower) * padding
+    return np.stack([lower - margin, upper + margin])
+
+
+def find_humans(stage: Usd.Stage, predicate=Usd.PrimDefaultPredicate) -> List[Usd.Prim]:
+    """Find all the humans in a stage. Humans are not searched for nested humans.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage to search
+    predicate : optional
+        Prim predicate for the traversal, by default Usd.PrimDefaultPredicate, which skips
+        unloaded humans
+
+    Returns
+    -------
+    List[Usd.Prim]
+        SkelRoot prims of all humans
+    """
+    humans = []
+    it = iter(Usd.PrimRange(stage.GetPseudoRoot(), predicate))
+    for prim in it:
+        if prim.IsA(UsdSkel.Root) and prim.GetCustomDataByKey("human"):
+            humans.append(prim)
+            it.PruneChildren()
+    return humans
+
+
+def human_bounds(stage: Usd.Stage, time: Usd.TimeCode = Usd.TimeCode.Default(), prims: List[Usd.Prim] = None) -> Dict[str, Gf.Range3d]:
+    """Compute the world-space bounds of all humans in a stage at once. Uses the extents
+    authored on each human's SkelRoot, so that meshes are neither read nor skinned. Humans
+    without an authored extent are bounded from their meshes instead.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+    time : Usd.TimeCode, optional
+        Time at which to evaluate transforms, by default Usd.TimeCode.Default()
+    prims : List[Usd.Prim], optional
+        Human prims to bound, by default all loaded humans in the stage
+
+    Returns
+    -------
+    Dict[str, Gf.Range3d]
+        World-space axis-aligned bounds of each human, keyed by prim path
+    """
+    xform_cache = UsdGeom.XformCache(time)
+    bbox_cache = None
+
+    paths, extents, matrices = [], [], []
+    bounds = {}
+    if prims is None:
+        prims = find_humans(stage)
+    for prim in prims:
+        path = prim.GetPath().pathString
+        extent = UsdGeom.Boundable(prim).GetExtentAttr().Get(time)
+        if extent is None or len(extent) != 2:
+            # Fall back to computing bounds from the meshes
+            if bbox_cache is None:
+                bbox_cache = UsdGeom.BBoxCache(time, [UsdGeom.Tokens.default_, UsdGeom.Tokens.render])
+            bounds[path] = bbox_cache.ComputeWorldBound(prim).ComputeAlignedRange()
+            continue
+        paths.append(path)
+        extents.append(np.array(extent, dtype=np.float64))
+        matrices.append(np.array(xform_cache.GetLocalToWorldTransform(prim), dtype=np.float64))
+
+    if paths:
+        extents = np.asarray(extents)
+        # The 8 corners of each extent, in homogeneous coordinates, shape (humans, 8, 4)
+        select = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)])
+        corners = extents[:, select, [0, 1, 2]]
+        corners = np.concatenate([corners, np.ones(corners.shape[:2] + (1,))], axis=2)
+        # Gf matrices transform row vectors
+        world = np.einsum("nci,nij->ncj", corners, np.asarray(matrices))[..., :3]
+        for path, lower, upper in zip(paths, world.min(axis=1), world.max(axis=1)):
+            bounds[path] = Gf.Range3d(Gf.Vec3d(*lower.tolist()), Gf.Vec3d(*upper.tolist()))
+    return bounds
@@ -1,24 +1,127 @@
-from typing import Callable
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Union
+import asyncio
+import hashlib
+import json
 import carb
 import aiohttp
 import omni.client
 import os, zipfile
 
+# Size of the chunks streamed to disk
+CHUNK_SIZE = 1024 * 512
+# Number of times an interrupted download is resumed before giving up
+RETRIES = 3
+# Number of asset packs downloaded at once
+MAX_CONNECTIONS = 4
+# File in the destination which records the ETag and size of each downloaded pack
+STATE_FILE = ".downloads.json"
+
+
+@dataclass
+class AssetPack:
+    """A zip of assets to download
+
+    Attributes
+    ----------
+    name : str
+        Name of the pack, shown in progress messages
+    url : str
+        Remote URL of the zip
+    sha256 : str, optional
+        Expected SHA-256 hex digest of the zip, by default None
+    """
+
+    name: str
+    url: str
+    sha256: str = None
+
+
+# Packs downloaded by default
+SYSTEM_ASSETS = AssetPack(
+    "system assets",
+    "http://files.makehumancommunity.org/asset_packs/makehuman_system_assets/makehuman_system_assets_cc0.zip",
+)
+
+
+def _response_validator(response: aiohttp.ClientResponse) -> Union[str, None]:
+    """Validator with which to resume a download: the strong ETag of the response, or else its
+    Last-Modified date. Weak ETags can't be used in If-Range headers."""
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _read_validator(path: str) -> Union[str, None]:
+    """Validator of a partial download, or None if it wasn't recorded"""
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _range_start(content_range: str) -> Union[int, None]:
+    """First byte of a "bytes <start>-<end>/<size>" Content-Range header, or None if the header
+    is missing or malformed"""
+    try:
+        unit, byte_range = content_range.split(" ", 1)
+        if unit.strip().lower() != "bytes":
+            return None
+        return int(byte_range.split("-", 1)[0])
+    except (AttributeError, ValueError):
+        return None
+
+
+def _write_state(path: str, state: Dict[str, Dict]):
+    """Write the ETag and size of the downloaded packs. Written to a temporary file first, so
+    that the state is never partially written."""
+    partial = path + ".part"
+    try:
+        with open(partial, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(partial, path)
+    except OSError as e:
+        carb.log_warn(f"Could not record downloaded packs in {path}: {e}")
+
+
+def _remove(*paths: str):
+    """Delete files, ignoring those which don't exist"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
 
 class Downloader:
-    """Downloads and unzips remote files and tracks download status/progress"""
-    def __init__(self, log_fn : Callable[[float], None]) -> None:
+    """Downloads and unzips remote files and tracks download status/progress. Downloads are
+    streamed to a ".part" file next to the destination, so that memory use doesn't grow with
+    the size of the file and interrupted downloads can be resumed with HTTP range requests."""
+    def __init__(self, log_fn : Callable[[float, str], None], session: aiohttp.ClientSession = None) -> None:
         """Construct an instance of Downloader. Assigns the logging function and sets initial is_downloading status
 
         Parameters
         ----------
-        log_fn : Callable[[float], None]
-            Function to which to pass progress. Recieves a proportion that represents the amount downloaded
+        log_fn : Callable[[float, str], None]
+            Function to which to pass progress. Recieves a proportion that represents the amount
+            downloaded or extracted, and a description of the current step
+        session : aiohttp.ClientSession, optional
+            Session through which to download. A session is created for each download if None,
+            by default None
         """
         self._is_downloading = False
         self._log_fn = log_fn
+        self._session = session
+        # Step of the current download: "download", "verify" or "extract"
+        self.phase = None
+
+    def _log(self, proportion: float, status: str):
+        if self._log_fn:
+            self._log_fn(proportion, status)
 
-    async def download(self, url : str, dest_url : str) -> None:
+    async def download(self, url : str, dest_url : str, sha256: str = None) -> Dict[str, Union[omni.client.Result, str]]:
         """Download a given url to disk and unzip it
 
         Parameters
@@ -27,51 +130,283 @@ class Downloader:
             Remote URL to fetch
         dest_url : str
             Local path at which to write and then unzip the downloaded files
+        sha256 : str, optional
+            Expected SHA-256 hex digest of the file. If None, the integrity of the zip is checked
+            instead, by default None
 
         Returns
         -------
         dict of  str, Union[omni.client.Result, str]
             Error message and location on disk
         """
-
         ret_value = {"url": None}
-        async with aiohttp.ClientSession() as session:
-            self._is_downloading = True
-            content = bytearray()
-            # Download content from the given url
-            downloaded = 0
-            async with session.get(url) as response:
-                size = int(response.headers.get("content-length", 0))
-                if size > 0:
-                    async for chunk in response.content.iter_chunked(1024 * 512):
-                        content.extend(chunk)
-                        downloaded += len(chunk)
-                        if self._log_fn:
-                            self._log_fn(float(downloaded) / size)
-                else:
-                    if self._log_fn:
-                        self._log_fn(0)
-                    content = await response.read()
-                    if self._log_fn:
-                        self._log_fn(1)
-
-            if response.ok:
-                # Write to destination
-                filename = os.path.basename(url.split("?")[0])
-                dest_url = f"{dest_url}/{filename}"
-                (result, list_entry) = await omni.client.stat_async(dest_url)
-                ret_value["status"] = await omni.client.write_file_async(dest_url, content)
-                ret_value["url"] = dest_url
-                if  ret_value["status"] == omni.client.Result.OK:
-                    # TODO handle file already exists
-                    pass
-                z = zipfile.ZipFile(dest_url, 'r')
-                z.extractall(os.path.dirname(dest_url))
+        self._is_downloading = True
+        try:
+            filename = os.path.basename(url.split("?")[0])
+            path = os.path.join(dest_url, filename)
+            if self._session is None:
+                async with aiohttp.ClientSession() as session:
+                    ret_value["status"] = await self._fetch(session, url, path)
             else:
-                carb.log_error(f"[access denied: {url}")
-                ret_value["status"] = omni.client.Result.ERROR_ACCESS_DENIED
-        self._is_downloading = False
+                ret_value["status"] = await self._fetch(self._session, url, path)
+
+            if ret_value["status"] == omni.client.Result.OK:
+                ret_value["status"] = await self._verify(path, sha256)
+            if ret_value["status"] == omni.client.Result.OK:
+                ret_value["url"] = path
+                await self._extract(path, os.path.dirname(path))
+        finally:
+            self._is_downloading = False
         return ret_value
 
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, path: str) -> omni.client.Result:
+        """Stream a url to disk, resuming from a partial download if there is one. Resumed
+        requests carry the ETag or Last-Modified date of the partial download in an If-Range
+        header, so that the server sends the whole file again if it has changed, and the start
+        of the returned range is checked against the size of the partial download.
+
+        Parameters
+        ----------
+        session : aiohttp.ClientSession
+            Session through which to download
+        url : str
+            Remote URL to fetch
+        path : str
+            Path at which to write the file. The download is written to "<path>.part" and
+            moved to the path once complete. The validator of the partial download is kept
+            in "<path>.part.validator"
+
+        Returns
+        -------
+        omni.client.Result
+            OK if the file was downloaded
+        """
+        self.phase = "download"
+        loop = asyncio.get_event_loop()
+        part = path + ".part"
+        validator_path = part + ".validator"
+        name = os.path.basename(path)
+        for attempt in range(RETRIES + 1):
+            downloaded = os.path.getsize(part) if os.path.isfile(part) else 0
+            validator = _read_validator(validator_path) if downloaded else None
+            if downloaded and validator:
+                headers = {"Range": f"bytes={downloaded}-", "If-Range": validator}
+            else:
+                # Partial downloads which can't be validated are started over
+                headers = {}
+                downloaded = 0
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 416 and downloaded:
+                        # The partial download is already complete. It is verified afterwards
+                        break
+                    if not response.ok:
+                        carb.log_error(f"[access denied: {url}")
+                        return omni.client.Result.ERROR_ACCESS_DENIED
+                    if response.status == 206:
+                        start = _range_start(response.headers.get("Content-Range"))
+                        if start != downloaded:
+                            carb.log_warn(f"{url} returned a range starting at {start} instead of {downloaded}, starting over")
+                            _remove(part, validator_path)
+                            continue
+                    else:
+                        # The server ignored the range or the file changed, so the download
+                        # starts over
+                        downloaded = 0
+                        validator = _response_validator(response)
+                        _remove(validator_path)
+                        if validator:
+                            with open(validator_path, "w") as f:
+                                f.write(validator)
+                    size = downloaded + int(response.headers.get("content-length", 0))
+                    with open(part, "ab" if downloaded else "wb") as f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await loop.run_in_executor(None, f.write, chunk)
+                            downloaded += len(chunk)
+                            self._log(float(downloaded) / size if size else 0, f"Downloading {name}")
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == RETRIES:
+                    carb.log_error(f"Download of {url} failed: {e}")
+                    return omni.client.Result.ERROR
+                carb.log_warn(f"Download of {url} was interrupted, resuming: {e}")
+        else:
+            carb.log_error(f"Download of {url} failed: the server kept returning the wrong range")
+            return omni.client.Result.ERROR
+
+        os.replace(part, path)
+        _remove(validator_path)
+        self._log(1, f"Downloaded {name}")
+        return omni.client.Result.OK
+
+    async def _verify(self, path: str, sha256: str = None) -> omni.client.Result:
+        """Check a downloaded file against its expected hash, or check the zip's own checksums
+        if no hash is given. Corrupt files are deleted so that they are downloaded again.
+
+        Parameters
+        ----------
+        path : str
+            Path to the downloaded file
+        sha256 : str, optional
+            Expected SHA-256 hex digest, by default None
+
+        Returns
+        -------
+        omni.client.Result
+            OK if the file is intact
+        """
+        def check():
+            if sha256:
+                digest = hashlib.sha256()
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                return digest.hexdigest().lower() == sha256.lower()
+            try:
+                with zipfile.ZipFile(path) as z:
+                    return z.testzip() is None
+            except zipfile.BadZipFile:
+                return False
+
+        self.phase = "verify"
+        self._log(0, f"Verifying {os.path.basename(path)}")
+        if await asyncio.get_event_loop().run_in_executor(None, check):
+            return omni.client.Result.OK
+        carb.log_error(f"{path} is corrupt and was deleted")
+        os.remove(path)
+        return omni.client.Result.ERROR
+
+    async def _extract(self, path: str, dest: str):
+        """Extract a zip in a worker thread, reporting progress for each file
+
+        Parameters
+        ----------
+        path : str
+            Path to the zip
+        dest : str
+            Directory to extract to
+        """
+        self.phase = "extract"
+        loop = asyncio.get_event_loop()
+        dest = os.path.realpath(dest)
+
+        def extract():
+            with zipfile.ZipFile(path) as z:
+                members = z.infolist()
+                for i, member in enumerate(members):
+                    # Skip members which would be written outside of the destination
+                    target = os.path.realpath(os.path.join(dest, member.filename))
+                    if os.path.commonpath([dest, target]) != dest:
+                        carb.log_warn(f"Skipping {member.filename}, which is outside of {dest}")
+                        continue
+                    z.extract(member, dest)
+                    # Progress is reported on the event loop, which owns the UI
+                    loop.call_soon_threadsafe(self._log, (i + 1) / len(members), f"Extracting {member.filename}")
+
+        await loop.run_in_executor(None, extract)
+        self._log(1, f"Extracted {os.path.basename(path)}")
+
+    async def download_all(self, packs: List[AssetPack], dest_url: str, max_connections: int = MAX_CONNECTIONS) -> Dict[str, Dict[str, Union[omni.client.Result, str]]]:
+        """Download and unzip several asset packs at once through a single session. Packs whose
+        ETag and size are unchanged since they were last downloaded are skipped. Progress is
+        reported for all packs together, weighted by their sizes.
+
+        Parameters
+        ----------
+        packs : List[AssetPack]
+            Packs to download
+        dest_url : str
+            Local path at which to write and then unzip the downloaded files
+        max_connections : int, optional
+            Number of packs downloaded at once, by default MAX_CONNECTIONS
+
+        Returns
+        -------
+        Dict[str, Dict[str, Union[omni.client.Result, str]]]
+            Result of each pack, as returned by `download()`, keyed by pack name. Skipped
+            packs have an OK status, and packs which raised an error have an ERROR status
+        """
+        self._is_downloading = True
+        state_path = os.path.join(dest_url, STATE_FILE)
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+
+        semaphore = asyncio.Semaphore(max_connections)
+
+        async def check(session, pack):
+            # ETag and size of the remote zip
+            async with semaphore:
+                try:
+                    async with session.head(pack.url, allow_redirects=True) as response:
+                        return {
+                            "etag": response.headers.get("ETag"),
+                            "size": int(response.headers.get("content-length", 0)),
+                        }
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    carb.log_warn(f"Could not check {pack.url}: {e}")
+                    return {"etag": None, "size": 0}
+
+        # Proportion downloaded of each pack, for the aggregate progress
+        progress = {pack.name: 0.0 for pack in packs}
+        sizes = {}
+
+        def report(name, downloader, proportion, status):
+            # Verifying and extracting only update the status
+            if downloader is None or downloader.phase == "download":
+                progress[name] = proportion
+            total = sum(sizes.values())
+            if total:
+                done = sum(progress[n] * sizes[n] for n in progress) / total
+            else:
+                done = sum(progress.values()) / len(progress)
+            self._log(done, f"{name}: {status}")
+
+        async def fetch(session, pack, remote):
+            filename = os.path.basename(pack.url.split("?")[0])
+            path = os.path.join(dest_url, filename)
+            known = state.get(pack.url)
+            if known and (remote["etag"] or remote["size"]) and known == remote and os.path.isfile(path):
+                report(pack.name, None, 1.0, "Up to date")
+                return {"url": path, "status": omni.client.Result.OK}
+
+            async with semaphore:
+                downloader = Downloader(lambda proportion, status: report(pack.name, downloader, proportion, status), session)
+                result = await downloader.download(pack.url, dest_url, pack.sha256)
+            if result["status"] == omni.client.Result.OK:
+                state[pack.url] = remote
+            return result
+
+        async def run(session):
+            remotes = await asyncio.gather(*(check(session, pack) for pack in packs))
+            # Weight progress by size once the sizes of all packs are known
+            sizes.update({pack.name: remote["size"] for pack, remote in zip(packs, remotes)})
+            # A failed pack doesn't stop the others
+            return await asyncio.gather(
+                *(fetch(session, pack, remote) for pack, remote in zip(packs, remotes)), return_exceptions=True
+            )
+
+        try:
+            # One session for all packs, with no more connections than packs downloaded at once
+            if self._session is None:
+                async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_connections)) as session:
+                    results = await run(session)
+            else:
+                results = await run(self._session)
+        finally:
+            # Packs which were downloaded are recorded, even if the others failed
+            _write_state(state_path, state)
+            self._is_downloading = False
+
+        outcomes = {}
+        for pack, result in zip(packs, results):
+            if isinstance(result, BaseException):
+                carb.log_error(f"Download of {pack.name} failed: {result}")
+                result = {"url": None, "status": omni.client.Result.ERROR}
+            outcomes[pack.name] = result
+        return outcomes
+
     def not_downloading(self):
-        return not self._is_downloading
\ No newline at end of file
+        return not self._is_downloading
@@ -1,9 +1,11 @@
 from omni.kit.browser.core import OptionMenuDescription, OptionsMenu
 from omni.kit.browser.folder.core.models.folder_browser_item import FolderCollectionItem
+from typing import List
 import carb
+import carb.settings
 import asyncio
 from ..shared import data_path
-from .downloader import Downloader
+from .downloader import Downloader, AssetPack, SYSTEM_ASSETS, MAX_CONNECTIONS
 import omni.ui as ui
 
 
@@ -28,8 +30,8 @@ class FolderOptionsMenu(OptionsMenu):
     def destroy(self) -> None:
         super().destroy()
 
-    def progress_fn(self, proportion: float):
-        carb.log_info(f"Download is {int(proportion * 100)}% done")
+    def progress_fn(self, proportion: float, status: str = None):
+        carb.log_info(f"{status or 'Download'}: {int(proportion * 100)}% done")
         if self._progress_bar:
             self._progress_bar.model.set_value(proportion)
 
@@ -71,15 +73,26 @@ class FolderOptionsMenu(OptionsMenu):
         if self._progress_bar:
             self._progress_bar.visible = False
 
+    def _asset_packs(self) -> List[AssetPack]:
+        """Asset packs to download, read from the extension settings. Each pack is a dictionary
+        with a name, a url and optionally a sha256. Defaults to the makehuman system assets."""
+        settings = carb.settings.get_settings()
+        packs = settings.get("/exts/siborg.create.human.browser.asset/packs") or []
+        packs = [AssetPack(p["name"], p["url"], p.get("sha256") or None) for p in packs if p.get("url")]
+        return packs or [SYSTEM_ASSETS]
+
     async def _download(self):
-        # Makehuman system assets
-        url = "http://files.makehumancommunity.org/asset_packs/makehuman_system_assets/makehuman_system_assets_cc0.zip"
-        # Smaller zip for testing
-        # url = "https://download.tuxfamily.org/makehuman/asset_packs/shirts03/shirts03_ccby.zip"
+        # Smaller zip for testing:
+        # https://download.tuxfamily.org/makehuman/asset_packs/shirts03/shirts03_ccby.zip
         dest_url = data_path("")
-        await self.downloader.download(url, dest_url)
-        self._hide_progress_bar()
-        self.refresh_collection()
+        max_connections = carb.settings.get_settings().get("/exts/siborg.create.human.browser.asset/max_connections")
+        try:
+            results = await self.downloader.download_all(self._asset_packs(), dest_url, max_connections or MAX_CONNECTIONS)
+            for name, result in results.items():
+                carb.log_info(f"Asset pack {name}: {result['status']}")
+            self.refresh_collection()
+        finally:
+            self._hide_progress_bar()
 
     def refresh_collection(self):
         collection_item: FolderCollectionItem = self._browser_widget.collection_selection
@@ -0,0 +1,331 @@
+from dataclasses import dataclass, asdict
+from typing import Dict, List, TypeVar, Union
+from importlib import metadata
+import hashlib
+import inspect
+import json
+import os
+import makehuman
+import targets
+import mh
+import carb
+from .shared import cache_path
+
+Human = TypeVar("Human")
+
+
+@dataclass
+class ModifierInfo:
+    """Dataclass to store precomputed modifier data
+
+    Attributes
+    ----------
+    label: str
+        Human-readable label for the modifier. Used for building UI
+    group: str
+        Name of the modifier group
+    full_name: str
+        The full name of the modifier, in the format "group/name"
+    name: str
+        The name of the modifier within its group
+    min: float
+        The minimum allowed value of the modifier
+    max: float
+        The maximum allowed value of the modifier
+    default: float
+        The default value of the modifier
+    image: str, optional
+        Path to the modifier image, relative to the makehuman package. By default None
+    """
+
+    label: str
+    group: str
+    full_name: str
+    name: str
+    min: float
+    max: float
+    default: float
+    image: str = None
+
+    @property
+    def image_path(self) -> Union[str, None]:
+        """Absolute path to the modifier image on disk, or None if the modifier has no image"""
+        if self.image is None:
+            return None
+        return os.path.join(_makehuman_dir(), self.image)
+
+
+class ModifierCatalog:
+    """Precomputed metadata for every modifier loaded from modeling_modifiers.json. Built once
+    and persisted to disk, keyed by the makehuman version and validated against the modification times
+    of the modifier and target files, so that the UI and API don't need to query makehuman for labels,
+    ranges and images each time.
+
+    Attributes
+    ----------
+    version : str
+        Version of makehuman the catalog was built from
+    sources : str
+        Stamp of the modifier and target files the catalog was built from. See `source_stamp()`
+    modifiers : Dict[str, ModifierInfo]
+        Modifier data, keyed by full modifier name. Ordered as loaded by makehuman
+    groups : List[str]
+        Names of all modifier groups, in load order
+    """
+
+    def __init__(self, modifiers: List[ModifierInfo], version: str = None, sources: str = None):
+        """Constructs an instance of ModifierCatalog
+
+        Parameters
+        ----------
+        modifiers : List[ModifierInfo]
+            Data for each modifier
+        version : str, optional
+            Version of makehuman the catalog was built from, by default None
+        sources : str, optional
+            Stamp of the modifier and target files the catalog was built from, by default None
+        """
+        self.version = version
+        self.sources = sources
+        self.modifiers = {m.full_name: m for m in modifiers}
+        self.groups = list(dict.fromkeys(m.group for m in modifiers))
+        self._by_group = {g: [] for g in self.groups}
+        for m in modifiers:
+            self._by_group[m.group].append(m)
+
+    def __contains__(self, full_name: str) -> bool:
+        return full_name in self.modifiers
+
+    def __len__(self) -> int:
+        return len(self.modifiers)
+
+    def get(self, full_name: str) -> Union[ModifierInfo, None]:
+        """Get the data for a modifier by full name. Returns None if no such modifier exists."""
+        return self.modifiers.get(full_name)
+
+    def names(self) -> List[str]:
+        """Full names of all modifiers in the catalog"""
+        return list(self.modifiers.keys())
+
+    def group(self, group: str) -> List[ModifierInfo]:
+        """Data for all the modifiers in the given group"""
+        return self._by_group.get(group, [])
+
+    def validate(self, full_name: str, value: float) -> bool:
+        """Checks that a modifier exists and that the given value is within its range. Logs a
+        warning if not.
+
+        Parameters
+        ----------
+        full_name : str
+            Full name of the modifier
+        value : float
+            Value to check
+
+        Returns
+        -------
+        bool
+            True if the value can be applied to the modifier, False otherwise
+        """
+        info = self.get(full_name)
+        if info is None:
+            carb.log_warn(f"No modifier named {full_name}")
+            return False
+        if value < info.min or value > info.max:
+            carb.log_warn(f"Value must be between {str(info.min)} and {str(info.max)}")
+            return False
+        return True
+
+    @classmethod
+    def build(cls, human: Human, version: str = None, sources: str = None) -> "ModifierCatalog":
+        """Build the catalog from the modifiers loaded on a makehuman human
+
+        Parameters
+        ----------
+        human : makehuman.human.Human
+            Makehuman human with modifiers loaded
+        version : str, optional
+            Version of makehuman the catalog is built from, by default None
+        sources : str, optional
+            Stamp of the modifier and target files the catalog is built from, by default None
+
+        Returns
+        -------
+        ModifierCatalog
+            The catalog of all the human's modifiers
+        """
+        images = targets.getTargets().images
+        root = _makehuman_dir()
+        modifiers = []
+        for m in human.modifiers:
+            # Guess a suitable image path from modifier name, and keep it only if the image exists
+            image_name = ("%s.png" % "-".join(m.name.replace("|", "-").split("-"))).lower()
+            image = images.get(image_name, image_name)
+            if not os.path.isfile(os.path.join(root, image)):
+                image = None
+            modifiers.append(
+                ModifierInfo(
+                    modifier_label(m.name, m.groupName),
+                    m.groupName,
+                    m.fullName,
+                    m.name,
+                    float(m.getMin()),
+                    float(m.getMax()),
+                    float(m.getDefaultValue()),
+                    image=image,
+                )
+            )
+        return cls(modifiers, version, sources)
+
+    @classmethod
+    def load(cls, path: str) -> Union["ModifierCatalog", None]:
+        """Load a catalog from disk. Returns None if the file can't be read."""
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            modifiers = [ModifierInfo(**m) for m in data["modifiers"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cls(modifiers, data.get("version"), data.get("sources"))
+
+    def save(self, path: str):
+        """Write the catalog to disk
+
+        Parameters
+        ----------
+        path : str
+            Path of the file to write
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {"version": self.version, "sources": self.sources, "modifiers": [asdict(m) for m in self.modifiers.values()]}
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load_or_build(cls, human: Human) -> "ModifierCatalog":
+        """Load the catalog for the installed makehuman version from the cache, or build it
+        from the human and cache it if there is none, or if the modifier files or the targets
+        directory have changed since it was built. Only the modification times are checked, so
+        that startup doesn't walk every target file. Edits to files inside subdirectories of
+        the targets directory are not detected; use `rebuild()` after making them.
+
+        Parameters
+        ----------
+        human : makehuman.human.Human
+            Makehuman human with modifiers loaded
+
+        Returns
+        -------
+        ModifierCatalog
+            The catalog of all the human's modifiers
+        """
+        version = makehuman_version()
+        sources = source_stamp()
+        path = _catalog_path(version)
+        if path:
+            catalog = cls.load(path)
+            # Only use the cached catalog if it matches the loaded modifiers and their files
+            if (
+                catalog
+                and catalog.version == version
+                and catalog.sources == sources
+                and len(catalog) == len(human.modifiers)
+            ):
+                return catalog
+        return cls.rebuild(human)
+
+    @classmethod
+    def rebuild(cls, human: Human) -> "ModifierCatalog":
+        """Build the catalog from the human and cache it, whether or not a cached catalog is
+        up to date
+
+        Parameters
+        ----------
+        human : makehuman.human.Human
+            Makehuman human with modifiers loaded
+
+        Returns
+        -------
+        ModifierCatalog
+            The catalog of all the human's modifiers
+        """
+        version = makehuman_version()
+        catalog = cls.build(human, version, source_stamp())
+        path = _catalog_path(version)
+        if path:
+            try:
+                catalog.save(path)
+            except OSError as e:
+                carb.log_warn(f"Could not cache modifier catalog: {e}")
+        return catalog
+
+
+def modifier_label(name: str, group: str) -> str:
+    """Guess a suitable UI label from a modifier name
+
+    Parameters
+    ----------
+    name : str
+        Name of the modifier
+    group : str
+        Name of the modifier's group
+
+    Returns
+    -------
+    str
+        Label for the modifier
+    """
+    tlabel = name.split("-")
+    if "|" in tlabel[len(tlabel) - 1]:
+        tlabel = tlabel[:-1]
+    if len(tlabel) > 1 and tlabel[0] == group:
+        label = tlabel[1:]
+    else:
+        label = tlabel
+    return " ".join([word.capitalize() for word in label])
+
+
+def makehuman_version() -> Union[str, None]:
+    """Version of the installed makehuman package, or None if it can't be determined"""
+    try:
+        return metadata.version("makehuman")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def source_stamp() -> str:
+    """Stamp of the files modifiers are built from, made of the modification times of the
+    modifier definitions and of the targets directory. Adding or removing targets at the top
+    of the targets directory changes it, but editing targets in subdirectories does not.
+
+    Returns
+    -------
+    str
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    modifiers_dir = mh.getSysDataPath("modifiers")
+    if os.path.isdir(modifiers_dir):
+        for name in sorted(os.listdir(modifiers_dir)):
+            if name.endswith(".json"):
+                digest.update(f"{name}:{_mtime(os.path.join(modifiers_dir, name))}\n".encode())
+    digest.update(f"targets:{_mtime(mh.getSysDataPath('targets'))}\n".encode())
+    return digest.hexdigest()
+
+
+def _mtime(path: str) -> int:
+    """Modification time of a file or directory in nanoseconds, or 0 if it doesn't exist"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _catalog_path(version: Union[str, None]) -> Union[str, None]:
+    """Path of the cached catalog for a makehuman version, or None if the version is unknown"""
+    return cache_path(f"modifiers/modifiers-{version}.json") if version else None
+
+
+def _makehuman_dir() -> str:
+    """Directory of the installed makehuman package. Modifier image paths are relative to it."""
+    return os.path.dirname(inspect.getfile(makehuman))
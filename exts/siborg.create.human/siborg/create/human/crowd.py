@@ -0,0 +1,583 @@
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import carb
+import omni.usd
+from pxr import Usd, UsdGeom, Sdf, Gf
+from .bounds import human_bounds
+from .blendshapes import MACRO_MODIFIERS
+from .human import Human
+from .mhcaller import MHCaller
+from .prototypes import PrototypeLibrary
+
+# Offsets of the cells which may hold a point closer than the spacing to a point in the center
+# cell. Cells are spacing / sqrt(2) wide, so conflicting points are at most 2 cells away
+NEIGHBOR_OFFSETS = np.array([(i, j) for i in range(-2, 3) for j in range(-2, 3)])
+
+# Candidates are tested in 5 x 5 phases of their cells. Cells of the same phase are 5 cells
+# apart, so their candidates can't conflict with each other and can be tested all at once
+PHASES = 5
+
+# Smallest number of candidates drawn at once by `poisson_disc()`
+MIN_BATCH = 64
+
+Region = Tuple[Tuple[float, float], Tuple[float, float]]
+
+# Unsuffixed rotate ops, which `apply_xforms()` replaces with a rotateXYZ op
+ROTATE_OPS = tuple(
+    f"xformOp:rotate{axes}" for axes in ("X", "Y", "Z", "XYZ", "XZY", "YXZ", "YZX", "ZXY", "ZYX")
+)
+# Types of the ops `apply_xforms()` creates, and the value type of each op type
+DEFAULT_OP_TYPES = {"xformOp:translate": "double3", "xformOp:rotateXYZ": "float3", "xformOp:orient": "quatf"}
+OP_VALUE_TYPES = {
+    "double3": Gf.Vec3d,
+    "float3": Gf.Vec3f,
+    "half3": Gf.Vec3h,
+    "quatd": Gf.Quatd,
+    "quatf": Gf.Quatf,
+    "quath": Gf.Quath,
+}
+
+
+def poisson_disc(region: Region, count: int, spacing: float, seed: int = None, attempts: int = 30) -> np.ndarray:
+    """Sample points in a rectangle which are no closer to each other than the given spacing.
+    Random candidates are tested in batches against a spatial hash of the accepted points, with
+    cells small enough to hold a single point. The hash only holds occupied cells, so time and
+    memory grow with the number of points rather than with the area of the region. Sampling
+    stops once `count` points are placed.
+
+    Parameters
+    ----------
+    region : Tuple[Tuple[float, float], Tuple[float, float]]
+        Minimum and maximum corners of the rectangle, as (x, z) pairs
+    count : int
+        Number of points to sample
+    spacing : float
+        Minimum distance between points
+    seed : int, optional
+        Seed for the random number generator, by default None
+    attempts : int, optional
+        Largest number of candidates to try per point, by default 30
+
+    Returns
+    -------
+    np.ndarray
+        Points, shape (n, 2). Fewer than `count` if the region is too small to fit them
+    """
+    rng = np.random.default_rng(seed)
+    lower = np.asarray(region[0], dtype=np.float64)
+    upper = np.asarray(region[1], dtype=np.float64)
+    if count <= 0 or spacing <= 0 or np.any(upper <= lower):
+        return np.zeros((0, 2))
+
+    cell = spacing / np.sqrt(2)
+    # Cells are keyed by row * width + column. Columns are padded by 2 cells on each side so
+    # that the keys of neighboring cells don't wrap around to another row
+    width = int(np.ceil((upper[1] - lower[1]) / cell)) + 4
+    neighbor_keys = NEIGHBOR_OFFSETS[:, 0] * width + NEIGHBOR_OFFSETS[:, 1]
+
+    points = np.zeros((count, 2))
+    # Sorted keys of the occupied cells, and the index of the point in each of them
+    keys = np.zeros(0, dtype=np.int64)
+    owners = np.zeros(0, dtype=np.int64)
+    n = 0
+    budget = attempts * count
+
+    while n < count and budget > 0:
+        size = min(budget, max(2 * (count - n), MIN_BATCH))
+        budget -= size
+        candidates = lower + rng.random((size, 2)) * (upper - lower)
+        cells = np.floor((candidates - lower) / cell).astype(np.int64) + 2
+        candidate_keys = cells[:, 0] * width + cells[:, 1]
+        if len(keys):
+            # Candidates in occupied cells are too close to the point in their cell
+            slots = np.minimum(np.searchsorted(keys, candidate_keys), len(keys) - 1)
+            free = keys[slots] != candidate_keys
+            candidates, cells, candidate_keys = candidates[free], cells[free], candidate_keys[free]
+        phase_of = (cells[:, 0] % PHASES) * PHASES + cells[:, 1] % PHASES
+
+        for phase in range(PHASES * PHASES):
+            # One candidate per cell. Candidates are in random order, so keeping the first ones
+            # doesn't favor any part of the region
+            index = np.flatnonzero(phase_of == phase)
+            index = np.sort(index[np.unique(candidate_keys[index], return_index=True)[1]])
+            if not len(index):
+                continue
+
+            if len(keys):
+                # Points in the neighboring cells of each candidate, shape (candidates, 25)
+                neighbors = candidate_keys[index, None] + neighbor_keys
+                slots = np.minimum(np.searchsorted(keys, neighbors), len(keys) - 1)
+                valid = keys[slots] == neighbors
+                delta = points[owners[slots]] - candidates[index, None]
+                too_close = valid & (np.einsum("nki,nki->nk", delta, delta) < spacing * spacing)
+                index = index[~too_close.any(axis=1)]
+            index = index[:count - n]
+            k = len(index)
+            if not k:
+                continue
+
+            points[n:n + k] = candidates[index]
+            order = np.argsort(candidate_keys[index])
+            slots = np.searchsorted(keys, candidate_keys[index][order])
+            keys = np.insert(keys, slots, candidate_keys[index][order])
+            owners = np.insert(owners, slots, np.arange(n, n + k)[order])
+            n += k
+            if n >= count:
+                break
+
+    if n < count:
+        carb.log_warn(f"Only {n} of {count} placements fit in the region with a spacing of {spacing}")
+    return points[:n]
+
+
+def footprint(stage: Usd.Stage, prim_paths: List[str]) -> float:
+    """Diameter of the largest footprint of the given humans, which is the diagonal of their
+    bounds in the ground (xz) plane. Humans spaced this far apart don't overlap, whatever their
+    rotation about the vertical axis.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+    prim_paths : List[str]
+        Paths to the human prims
+
+    Returns
+    -------
+    float
+        Footprint diameter, or 0 if none of the humans are bounded
+    """
+    prims = [stage.GetPrimAtPath(p) for p in prim_paths]
+    bounds = human_bounds(stage, prims=[prim for prim in prims if prim.IsValid()])
+    sizes = [bounds[p].GetSize() for p in prim_paths if p in bounds and not bounds[p].IsEmpty()]
+    if not sizes:
+        return 0.0
+    sizes = np.array([(s[0], s[2]) for s in sizes])
+    return float(np.sqrt((sizes ** 2).sum(axis=1)).max())
+
+
+def apply_xforms(stage: Usd.Stage, prim_paths: List[str], translations: np.ndarray, rotations: np.ndarray):
+    """Set the translation and rotation of many prims at once. Ops are written directly to the
+    edit target layer in a single change block. Existing ops are kept in their order and with
+    their precision: the translation is written to the prim's translate op, and the rotation to
+    its orient op if it has one, or else to a rotateXYZ op which replaces any other unsuffixed
+    rotate op. Scale, pivot and other ops are left as they are. Prims without ops get
+    translate and rotateXYZ ops, in the order of UsdGeom.XformCommonAPI.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the prims
+    prim_paths : List[str]
+        Paths to the prims
+    translations : np.ndarray
+        Translation of each prim, shape (n, 3)
+    rotations : np.ndarray
+        XYZ rotation of each prim in degrees, shape (n, 3)
+    """
+    edit_target = stage.GetEditTarget()
+    layer = edit_target.GetLayer()
+
+    # Read the ops of each prim before the change block, since stage queries aren't safe within it
+    prim_ops = []
+    for path in prim_paths:
+        prim = stage.GetPrimAtPath(path)
+        order = list(UsdGeom.Xformable(prim).GetXformOpOrderAttr().Get() or []) if prim else []
+        types = {}
+        for name in order:
+            attr = prim.GetAttribute(name)
+            if attr and str(attr.GetTypeName()) in OP_VALUE_TYPES:
+                types[name] = str(attr.GetTypeName())
+        prim_ops.append((order, types))
+
+    with Sdf.ChangeBlock():
+        for path, translation, rotation, (order, types) in zip(prim_paths, translations.tolist(), rotations.tolist(), prim_ops):
+            spec = Sdf.CreatePrimInLayer(layer, edit_target.MapToSpecPath(Sdf.Path(path)))
+
+            if "xformOp:translate" not in order:
+                order.insert(0, "xformOp:translate")
+            if "xformOp:orient" in order:
+                values = {"xformOp:translate": translation, "xformOp:orient": _euler_quat(rotation)}
+            else:
+                rotate_ops = [name for name in order if name in ROTATE_OPS]
+                index = order.index(rotate_ops[0]) if rotate_ops else order.index("xformOp:translate") + 1
+                order = [name for name in order if name not in rotate_ops]
+                order.insert(index, "xformOp:rotateXYZ")
+                for name in rotate_ops:
+                    if name != "xformOp:rotateXYZ":
+                        _remove_property(layer, spec, name)
+                values = {"xformOp:translate": translation, "xformOp:rotateXYZ": rotation}
+
+            for name, value in values.items():
+                type_name = types.get(name, DEFAULT_OP_TYPES[name])
+                attr = layer.GetAttributeAtPath(spec.path.AppendProperty(name))
+                if attr is not None and str(attr.typeName) != type_name:
+                    # Ops written with another precision are replaced
+                    spec.RemoveProperty(attr)
+                    attr = None
+                if attr is None:
+                    attr = Sdf.AttributeSpec(spec, name, Sdf.ValueTypeNames.Find(type_name))
+                attr.default = OP_VALUE_TYPES[type_name](*value)
+
+            order_attr = layer.GetAttributeAtPath(spec.path.AppendProperty("xformOpOrder"))
+            if order_attr is None:
+                order_attr = Sdf.AttributeSpec(spec, "xformOpOrder", Sdf.ValueTypeNames.TokenArray, Sdf.VariabilityUniform)
+            order_attr.default = order
+
+
+def _euler_quat(rotation: Sequence[float]) -> Tuple[float, float, float, float]:
+    """Quaternion (real, i, j, k) of an XYZ rotation in degrees, as applied by a rotateXYZ op"""
+    quat = (
+        Gf.Rotation(Gf.Vec3d.XAxis(), rotation[0])
+        * Gf.Rotation(Gf.Vec3d.YAxis(), rotation[1])
+        * Gf.Rotation(Gf.Vec3d.ZAxis(), rotation[2])
+    ).GetQuat()
+    return (quat.GetReal(), *quat.GetImaginary())
+
+
+def _remove_property(layer: Sdf.Layer, spec: Sdf.PrimSpec, name: str):
+    """Remove a property from a prim spec, if the spec has it"""
+    attr = layer.GetAttributeAtPath(spec.path.AppendProperty(name))
+    if attr is not None:
+        spec.RemoveProperty(attr)
+
+
+def _remove_prims(stage: Usd.Stage, prim_paths: List[str]):
+    """Remove the specs of many prims from the edit target layer in a single change block"""
+    edit_target = stage.GetEditTarget()
+    layer = edit_target.GetLayer()
+    with Sdf.ChangeBlock():
+        for path in prim_paths:
+            spec = layer.GetPrimAtPath(edit_target.MapToSpecPath(Sdf.Path(path)))
+            if spec:
+                spec.realNameParent.RemoveNameChild(spec)
+
+
+def place_humans(
+    stage: Usd.Stage,
+    prim_paths: List[str],
+    region: Region,
+    spacing: float = None,
+    seed: int = None,
+    rotate: bool = True,
+) -> np.ndarray:
+    """Place humans in a region without overlaps, with Poisson-disc sampling. Humans are placed
+    on the ground (y = 0) and, optionally, given random rotations about the vertical axis.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+    prim_paths : List[str]
+        Paths to the human prims
+    region : Tuple[Tuple[float, float], Tuple[float, float]]
+        Minimum and maximum corners of the region, as (x, z) pairs
+    spacing : float, optional
+        Minimum distance between humans. Humans are always at least their footprint apart.
+        By default the footprint of the largest human
+    seed : int, optional
+        Seed for the random number generator, by default None
+    rotate : bool, optional
+        Whether to rotate humans randomly about the vertical axis, by default True
+
+    Returns
+    -------
+    np.ndarray
+        Translation of each placed human, shape (n, 3). If the region is too small, only the
+        first n humans are placed
+    """
+    spacing = max(spacing or 0.0, footprint(stage, prim_paths))
+    if spacing <= 0:
+        carb.log_warn("Can't place humans without a spacing or human bounds")
+        return np.zeros((0, 3))
+
+    points = poisson_disc(region, len(prim_paths), spacing, seed)
+    n = len(points)
+    translations = np.zeros((n, 3))
+    translations[:, 0] = points[:, 0]
+    translations[:, 2] = points[:, 1]
+
+    rotations = np.zeros((n, 3))
+    if rotate:
+        rotations[:, 1] = np.random.default_rng(seed).uniform(0, 360, n)
+
+    apply_xforms(stage, prim_paths[:n], translations, rotations)
+    return translations
+
+
+@dataclass
+class CrowdReport:
+    """Summary of a crowd built from archetypes
+
+    Attributes
+    ----------
+    individuals : int
+        Number of humans placed in the crowd
+    archetypes : int
+        Number of unique bodies generated
+    archetype_paths : List[str]
+        Paths to the prototype of each archetype. Archetypes which came out identical share
+        a prototype
+    instance_paths : List[str]
+        Paths to the placed humans, in the order of the sampled modifier vectors. Individuals
+        which don't fit in the region are left out of the crowd
+    labels : np.ndarray
+        Archetype of each placed individual
+    error : float
+        Mean distance of the individuals' sampled modifiers to their archetype's, with each
+        modifier scaled to its range. Lower means the archetypes preserve more variety
+    unique_bytes : int
+        Estimated size of the geometry data of N unique humans
+    instanced_bytes : int
+        Size of the geometry data of the archetypes, which all instances share
+    """
+
+    individuals: int
+    archetypes: int
+    archetype_paths: List[str]
+    instance_paths: List[str]
+    labels: np.ndarray
+    error: float
+    unique_bytes: int
+    instanced_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        """Estimated memory saved by instancing archetypes rather than generating unique humans"""
+        return self.unique_bytes - self.instanced_bytes
+
+
+def sample_modifiers(count: int, modifiers: Sequence[str] = MACRO_MODIFIERS, seed: int = None) -> np.ndarray:
+    """Sample random modifier values, uniformly within the range of each modifier
+
+    Parameters
+    ----------
+    count : int
+        Number of modifier vectors to sample
+    modifiers : Sequence[str], optional
+        Full names of the modifiers to sample, by default the macro modifiers
+    seed : int, optional
+        Seed for the random number generator, by default None
+
+    Returns
+    -------
+    np.ndarray
+        Modifier values, shape (count, len(modifiers))
+    """
+    catalog = MHCaller.modifier_catalog
+    lower = np.array([catalog.get(m).min for m in modifiers])
+    upper = np.array([catalog.get(m).max for m in modifiers])
+    return np.random.default_rng(seed).uniform(lower, upper, (count, len(modifiers)))
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 50, seed: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster points with k-means, initialized with k-means++
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Points to cluster, shape (n, d)
+    k : int
+        Number of clusters. Clamped to the number of points
+    iterations : int, optional
+        Largest number of iterations, by default 50
+    seed : int, optional
+        Seed for the random number generator, by default None
+
+    Returns
+    -------
+    centers : np.ndarray
+        Center of each cluster, shape (k, d)
+    labels : np.ndarray
+        Cluster of each point, shape (n,)
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float64)
+    n = len(data)
+    k = max(min(k, n), 1)
+
+    # k-means++: pick centers far from those already picked
+    centers = np.empty((k, data.shape[1]))
+    centers[0] = data[rng.integers(n)]
+    d2 = ((data - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = d2.sum()
+        index = rng.choice(n, p=d2 / total) if total > 0 else rng.integers(n)
+        centers[i] = data[index]
+        d2 = np.minimum(d2, ((data - centers[i]) ** 2).sum(axis=1))
+
+    norms = (data ** 2).sum(axis=1)
+    for _ in range(iterations):
+        # Squared distances to each center, without building an (n, k, d) array
+        distances = norms[:, None] - 2 * data @ centers.T + (centers ** 2).sum(axis=1)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, data)
+        # Empty clusters keep their center
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        converged = np.allclose(updated, centers)
+        centers = updated
+        if converged:
+            break
+    labels = (norms[:, None] - 2 * data @ centers.T + (centers ** 2).sum(axis=1)).argmin(axis=1)
+    return centers, labels
+
+
+def geometry_bytes(prim: Usd.Prim) -> int:
+    """Size of the numeric array data authored on a prim and its descendants
+
+    Parameters
+    ----------
+    prim : Usd.Prim
+        Root of the hierarchy to measure
+
+    Returns
+    -------
+    int
+        Size in bytes
+    """
+    size = 0
+    # Archetypes are abstract, so they have to be included explicitly
+    for descendant in Usd.PrimRange(prim, Usd.PrimAllPrimsPredicate):
+        for attr in descendant.GetAttributes():
+            if not attr.GetTypeName().isArray:
+                continue
+            try:
+                size += np.asarray(attr.Get()).nbytes
+            except (TypeError, ValueError):
+                continue
+    return size
+
+
+def build_archetype(values: Dict[str, float], clothes: Sequence[str], library: PrototypeLibrary) -> str:
+    """Get the prototype of a human with the given modifier values and clothes, generating it
+    if the library doesn't have it yet
+
+    Parameters
+    ----------
+    values : Dict[str, float]
+        Modifier values, keyed by full name
+    clothes : Sequence[str]
+        Paths to the clothes to add
+    library : PrototypeLibrary
+        Library which holds the prototype
+
+    Returns
+    -------
+    str
+        Path to the prototype
+    """
+    human = Human(name="archetype")
+    for name, value in values.items():
+        modifier = human.get_modifier_by_name(name)
+        if modifier is None:
+            # Unknown modifiers are reported by get_modifier_by_name()
+            continue
+        human.set_modifier_value(modifier, value)
+    # Clothes of the previous archetype would otherwise be carried over
+    MHCaller.clear_proxies()
+    for item in clothes:
+        MHCaller.add_item(item)
+    MHCaller.human.applyAllTargets()
+    return library.get_or_create(human)
+
+
+def build_crowd(
+    count: int,
+    archetypes: int,
+    region: Region,
+    modifiers: Sequence[str] = MACRO_MODIFIERS,
+    values: np.ndarray = None,
+    outfits: Sequence[Sequence[str]] = ((),),
+    spacing: float = None,
+    seed: int = None,
+    root_path: str = None,
+) -> CrowdReport:
+    """Build a crowd from a few generated bodies. Modifier vectors are sampled for each
+    individual and clustered into archetypes with k-means. One human is generated per
+    archetype as a prototype in a `PrototypeLibrary` under the crowd, and each individual is
+    an instanceable reference to its archetype, placed with `place_humans()`. Increasing `archetypes` preserves more of
+    the sampled variety at the cost of generation time and memory; see the returned report. The makehuman human is
+    restored afterwards, so the human being edited is kept.
+
+    Parameters
+    ----------
+    count : int
+        Number of individuals
+    archetypes : int
+        Number of unique bodies to generate
+    region : Tuple[Tuple[float, float], Tuple[float, float]]
+        Minimum and maximum corners of the region to place individuals in, as (x, z) pairs
+    modifiers : Sequence[str], optional
+        Full names of the modifiers which vary across the crowd, by default the macro modifiers
+    values : np.ndarray, optional
+        Modifier values of each individual, shape (count, len(modifiers)). Sampled uniformly
+        by default
+    outfits : Sequence[Sequence[str]], optional
+        Sets of clothes to choose from for each archetype, by default no clothes
+    spacing : float, optional
+        Minimum distance between individuals, by default their footprint
+    seed : int, optional
+        Seed for the random number generator, by default None
+    root_path : str, optional
+        Path to the prim which holds the crowd, by default "Crowd" under the default prim
+
+    Returns
+    -------
+    CrowdReport
+        The crowd's prims and the memory saved by instancing
+    """
+    stage = omni.usd.get_context().get_stage()
+    rng = np.random.default_rng(seed)
+    if root_path is None:
+        default_prim = stage.GetDefaultPrim()
+        parent = default_prim.GetPath().pathString if default_prim.IsValid() else ""
+        root_path = omni.usd.get_stage_next_free_path(stage, parent + "/Crowd", False)
+
+    # Cluster the individuals, with each modifier scaled to its range so that all count equally
+    if values is None:
+        values = sample_modifiers(count, modifiers, seed)
+    catalog = MHCaller.modifier_catalog
+    lower = np.array([catalog.get(m).min for m in modifiers])
+    span = np.array([catalog.get(m).max for m in modifiers]) - lower
+    span[span == 0] = 1
+    normalized = (np.asarray(values, dtype=np.float64) - lower) / span
+    centers, labels = kmeans(normalized, archetypes, seed=seed)
+    error = float(np.linalg.norm(normalized - centers[labels], axis=1).mean())
+    centers = lower + centers * span
+
+    # Generate the archetypes as prototypes, which are abstract so they are not rendered themselves
+    UsdGeom.Xform.Define(stage, root_path)
+    library = PrototypeLibrary(stage, root_path + "/Archetypes")
+    archetype_paths = []
+    # Archetypes are generated with the makehuman human, which holds the human being edited
+    state = MHCaller.save_state()
+    try:
+        for center in centers:
+            outfit = outfits[rng.integers(len(outfits))] if outfits else ()
+            archetype_paths.append(build_archetype(dict(zip(modifiers, center.tolist())), outfit, library))
+    finally:
+        MHCaller.restore_state(state)
+
+    # Reference the archetypes from instanceable prims
+    instance_paths = [f"{root_path}/Human_{i:05d}" for i in range(count)]
+    library.add_instances(instance_paths, [archetype_paths[label] for label in labels])
+
+    # Individuals which don't fit in the region are removed rather than left at the origin
+    placed = len(place_humans(stage, instance_paths, region, spacing, seed))
+    _remove_prims(stage, instance_paths[placed:])
+    instance_paths, labels = instance_paths[:placed], labels[:placed]
+
+    archetype_bytes = {p: geometry_bytes(stage.GetPrimAtPath(p)) for p in set(archetype_paths)}
+    return CrowdReport(
+        individuals=placed,
+        archetypes=len(archetype_bytes),
+        archetype_paths=archetype_paths,
+        instance_paths=instance_paths,
+        labels=labels,
+        error=error,
+        unique_bytes=int(sum(archetype_bytes[archetype_paths[label]] for label in labels)),
+        instanced_bytes=int(sum(archetype_bytes.values())),
+    )
@@ -1,13 +1,11 @@
 import omni.ui as ui
 from typing import List, TypeVar, Union, Callable
 from dataclasses import dataclass, field
+from functools import partial
 from . import styles
 from .mhcaller import MHCaller
+from .catalog import ModifierInfo
 from pxr import Usd
-import os
-import inspect
-import makehuman
-import targets
 from siborg.create.human.shared import data_path
 
 class SliderEntry:
@@ -143,12 +141,13 @@ class SliderEntryPanelModel:
     toggle : ui.SimpleBoolModel
         Tracks whether or not the human should update immediately when changes are made
     instant_update : Callable
-        A function to call when instant update is toggled
+        A function to call with the name, update function and value of a parameter
+        when it is changed while instant update is toggled on
     subscriptions : list of `Subscription`
         List of event subscriptions triggered by editing a SliderEntry
     """
 
-    def __init__(self, params: List[Param], toggle: ui.SimpleBoolModel = None, instant_update: Callable = None):
+    def __init__(self, params: List[Param], toggle: ui.SimpleBoolModel = None, instant_update: Callable = None, lazy: bool = False):
         """Constructs an instance of SliderEntryPanelModel and instantiates models
         to hold parameter data for individual SliderEntries
 
@@ -160,7 +159,10 @@ class SliderEntryPanelModel:
         toggle : ui.SimpleBoolModel, optional
             Tracks whether or not the human should update immediately when changes are made, by default None
         instant_update : Callable
-            A function to call when instant update is toggled
+            A function to call with the name, update function and value of a parameter
+            when it is changed while instant update is toggled on
+        lazy : bool, optional
+            Whether to defer creating value models until `build()` is called, by default False
         """
 
         self.params = []
@@ -173,12 +175,21 @@ class SliderEntryPanelModel:
 
         self.subscriptions = []
         """List of event subscriptions triggered by editing a SliderEntry"""
+
+        self.built = False
+        """Whether value models have been created for the parameters"""
+        self._pending_values = {}
+        """Values set before the value models were built, keyed by full parameter name"""
+
         for p in params:
             self.add_param(p)
 
+        if not lazy:
+            self.build()
+
     def add_param(self, param: Param):
-        """Adds a parameter to the SliderEntryPanelModel. Subscribes to the parameter's model
-        to check for editing changes
+        """Adds a parameter to the SliderEntryPanelModel. If the model has been built,
+        subscribes to the parameter's model to check for editing changes
 
         Parameters
         ----------
@@ -186,21 +197,64 @@ class SliderEntryPanelModel:
             The Parameter object from which to create the subscription
         """
 
-        # Create a model to track the current value of the parameter. Set the value to the default
-        param.value = ui.SimpleFloatModel(param.default)
-
         # Add the parameter to the list of parameters
         self.params.append(param)
 
+        if self.built:
+            self._build_param(param)
+
+    def build(self):
+        """Creates a value model and an editing subscription for each parameter. Lazy
+        models are built when the panel displaying them is first shown.
+        """
+        if self.built:
+            return
+        self.built = True
+        for param in self.params:
+            self._build_param(param)
+        self._pending_values = {}
+
+    def _build_param(self, param: Param):
+        """Creates the value model for a parameter and subscribes to its changes
+
+        Parameters
+        ----------
+        param : Param
+            The Parameter object from which to create the subscription
+        """
+        # Create a model to track the current value of the parameter. Use any value
+        # loaded before the model was built, or the default otherwise
+        value = self._pending_values.get(param.full_name, param.default)
+        param.value = ui.SimpleFloatModel(value)
+
         # Subscribe to changes in parameter editing
         self.subscriptions.append(
             param.value.subscribe_end_edit_fn(
                 lambda m: self._sanitize_and_run(param))
         )
 
+    def set_value(self, param: Param, value: float):
+        """Sets the value of a parameter. If the value models have not been built yet, the
+        value is kept until they are.
+
+        Parameters
+        ----------
+        param : Param
+            The parameter to set
+        value : float
+            The new value
+        """
+        if self.built:
+            param.value.set_value(value)
+        else:
+            self._pending_values[param.full_name] = value
+
     def reset(self):
         """Resets the values of each floatmodel to parameter default for UI reset
         """
+        if not self.built:
+            self._pending_values = {}
+            return
         for param in self.params:
             param.value.set_value(param.default)
 
@@ -229,12 +283,11 @@ class SliderEntryPanelModel:
             self.changed_params.remove(param)
         self.changed_params.append(param)
 
-        # If instant update is toggled on, add the changes to the stage instantly
+        # If instant update is toggled on, pass the change to the instant update function,
+        # which is responsible for applying it and updating the stage
         if self.toggle.get_value_as_bool():
-            # Apply the changes
-            self.apply_changes()
-            # Run the instant update function
-            self.instant_update()
+            self.changed_params.remove(param)
+            self.instant_update(param.full_name, param.fn, m.get_value_as_float())
 
     def apply_changes(self):
         """Apply the changes made to the parameters. Runs the function associated with each
@@ -348,7 +401,8 @@ class ParamPanel(ui.Frame):
         model: ParamPanelModel
             Stores data for the panel. Contains a toggle model to track whether changes should be instant
         instant_update : Callable
-            Function to call when a parameter is changed (if instant update is toggle on)
+            Function to call when a parameter is changed (if instant update is toggle on). Receives
+            the parameter's full name, update function and value
         """
 
         # Subclassing ui.Frame allows us to use styling on the whole widget
@@ -363,45 +417,28 @@ class ParamPanel(ui.Frame):
     def _build_widget(self):
         """Build widget UI
         """
-        Modifier = TypeVar('Modifier')
-
-        def modifier_param(m: Modifier):
-            """Generate a parameter data object from a human modifier,
+        def modifier_param(info: ModifierInfo):
+            """Generate a parameter data object from the catalog data of a human modifier
 
             Parameters
             ----------
-            m : Modifier
-                Makehuman Human modifier object. Represents a set of targets to apply to the human when modifying
+            info : ModifierInfo
+                Precomputed modifier data from the modifier catalog
 
             Returns
             -------
             Param
                 Parameter data object holding all the modifier data needed to build UI elements
             """
-            # print(m.name)
-            # Guess a suitable title from the modifier name
-            tlabel = m.name.split("-")
-            if "|" in tlabel[len(tlabel) - 1]:
-                tlabel = tlabel[:-1]
-            if len(tlabel) > 1 and tlabel[0] == m.groupName:
-                label = tlabel[1:]
-            else:
-                label = tlabel
-            label = " ".join([word.capitalize() for word in label])
-
-            # Guess a suitable image path from modifier name
-            tlabel = m.name.replace("|", "-").split("-")
-            image = modifier_image(("%s.png" % "-".join(tlabel)).lower())
-
             # Store modifier info in dataclass for building UI elements
             return Param(
-                label,
-                m.fullName,
-                m.updateValue,
-                image=image,
-                min=m.getMin(),
-                max=m.getMax(),
-                default=m.getDefaultValue(),
+                info.label,
+                info.full_name,
+                MHCaller.human.getModifier(info.full_name).updateValue,
+                image=info.image_path,
+                min=info.min,
+                max=info.max,
+                default=info.default,
             )
 
         def group_params(group: str):
@@ -417,8 +454,8 @@ class ParamPanel(ui.Frame):
             List of Param
                 A list of all the parameters built from modifiers in the group
             """
-            params = [modifier_param(m)
-                      for m in MHCaller.human.getModifiersByGroup(group)]
+            params = [modifier_param(info)
+                      for info in MHCaller.modifier_catalog.group(group)]
             return params
 
         def build_macro_frame():
@@ -451,7 +488,7 @@ class ParamPanel(ui.Frame):
                 Param("Proportions", "macrodetails-proportions/BodyProportions", human.setBodyProportions),
             )
             # Create a model for storing macro parameter data
-            macro_model = SliderEntryPanelModel(macro_params, self.toggle,  self.instant_update)
+            macro_model = SliderEntryPanelModel(macro_params, self.toggle, self.instant_update, lazy=True)
 
             # Separate set of race parameters to also be included in the Macros group
             # TODO make race parameters automatically normalize in UI
@@ -461,13 +498,12 @@ class ParamPanel(ui.Frame):
                 Param("Caucasian", "macrodetails/Caucasian", human.setCaucasian),
             )
             # Create a model for storing race parameter data
-            race_model = SliderEntryPanelModel(race_params, self.toggle, self.instant_update)
+            race_model = SliderEntryPanelModel(race_params, self.toggle, self.instant_update, lazy=True)
 
             self.models.append(macro_model)
             self.models.append(race_model)
 
-            # Create category widget for macros
-            with ui.CollapsableFrame("Macros", style=styles.frame_style, height=0, collapsed=True):
+            def build_macro_panels():
                 with ui.VStack():
                     # Create panels for macros and race
                     self.panels = (
@@ -475,31 +511,65 @@ class ParamPanel(ui.Frame):
                         SliderEntryPanel(race_model, label="Race"),
                     )
 
+            # Create category widget for macros
+            self._lazy_frame("Macros", [macro_model, race_model], build_macro_panels, height=0)
+
         # The scrollable list of modifiers
         with ui.ScrollingFrame():
             with ui.VStack():
                 # Add the macros frame first
                 build_macro_frame()
 
-                # Create a set of all modifier groups that include macros
-                macrogroups = [
-                    g for g in MHCaller.human.modifierGroups if "macrodetails" in g]
-                macrogroups = set(macrogroups)
-
                 # Remove macro groups from list of modifier groups as we have already
                 # included them explicitly
-                allgroups = set(
-                    MHCaller.human.modifierGroups).difference(macrogroups)
+                allgroups = [
+                    g for g in MHCaller.modifier_catalog.groups if "macrodetails" not in g]
 
                 for group in allgroups:
+                    # Model to hold panel parameters. Value models and widgets are only
+                    # built once the group is expanded
+                    model = SliderEntryPanelModel(
+                        group_params(group), self.toggle, self.instant_update, lazy=True)
+                    self.models.append(model)
                     # Create a collapseable frame for each modifier group
-                    with ui.CollapsableFrame(group.capitalize(), style=styles.frame_style, collapsed=True):
-                        # Model to hold panel parameters
-                        model = SliderEntryPanelModel(
-                            group_params(group), self.toggle,self.instant_update)
-                        self.models.append(model)
-                        # Create panel of slider entries for modifier group
-                        SliderEntryPanel(model)
+                    self._lazy_frame(group.capitalize(), [model], partial(SliderEntryPanel, model))
+
+    def _lazy_frame(self, title: str, models: List[SliderEntryPanelModel], build_fn: Callable, **kwargs):
+        """Creates a collapsed frame whose contents are only built when it is first expanded
+
+        Parameters
+        ----------
+        title : str
+            Title of the frame
+        models : list of SliderEntryPanelModel
+            Models of the panels shown in the frame. Built along with the frame contents
+        build_fn : Callable
+            Function that builds the frame contents
+        """
+        frame = ui.CollapsableFrame(title, style=styles.frame_style, collapsed=True, **kwargs)
+        frame.set_collapsed_changed_fn(partial(self._on_frame_collapsed_changed, frame, models, build_fn))
+        return frame
+
+    def _on_frame_collapsed_changed(self, frame: ui.CollapsableFrame, models: List[SliderEntryPanelModel], build_fn: Callable, collapsed: bool):
+        """Builds the contents of a lazy frame the first time it is expanded
+
+        Parameters
+        ----------
+        frame : ui.CollapsableFrame
+            The frame which was expanded or collapsed
+        models : list of SliderEntryPanelModel
+            Models of the panels shown in the frame
+        build_fn : Callable
+            Function that builds the frame contents
+        collapsed : bool
+            Whether the frame is now collapsed
+        """
+        if collapsed or all(model.built for model in models):
+            return
+        for model in models:
+            model.build()
+        frame.set_build_fn(build_fn)
+        frame.rebuild()
 
     def reset(self):
         """Reset every SliderEntryPanel to set UI values to defaults
@@ -530,11 +600,12 @@ class ParamPanel(ui.Frame):
 
         modifiers = humandata.get("Modifiers")
 
-        # Set any changed values in the models
-        for SliderEntryPanelModel in self.models:
-            for param in SliderEntryPanelModel.params:
+        # Set any changed values in the models. Models which have not been built yet keep the
+        # values until they are
+        for model in self.models:
+            for param in model.params:
                 if param.full_name in modifiers:
-                    param.value.set_value(modifiers[param.full_name])
+                    model.set_value(param, modifiers[param.full_name])
 
     def update_models(self):
         """Update all models"""
@@ -591,27 +662,3 @@ class NoSelectionNotification:
         messages = message.split("\n")
         self._message_label.text = messages[0]
         self._suggestion_label.text = messages[1]
-
-
-def modifier_image(name : str):
-    """Guess the path to a modifier's corresponding image on disk based on the name
-    of the modifier. Useful for building UI for list of modifiers.
-
-    Parameters
-    ----------
-    name : str
-        Name of the modifier
-
-    Returns
-    -------
-    str
-        The path to the image on disk
-    """
-    if name is None:
-        # If no modifier name is provided, we can't guess the file name
-        return None
-    name = name.lower()
-    # Return the modifier path based on the modifier name
-    # TODO determine if images can be loaded from the Makehuman module stored in
-    # site-packages so we don't have to include the data twice
-    return os.path.join(os.path.dirname(inspect.getfile(makehuman)),targets.getTargets().images.get(name, name))
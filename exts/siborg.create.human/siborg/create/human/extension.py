@@ -10,6 +10,8 @@ from pxr import Usd
 from typing import Union
 
 from .window import MHWindow, WINDOW_TITLE, MENU_PATH
+from . import layers
+from . import textures
 
 class MakeHumanExtension(omni.ext.IExt):
     # ext_id is current extension id. It can be used with extension manager to query additional information, like where
@@ -54,6 +56,9 @@ class MakeHumanExtension(omni.ext.IExt):
         # Deregister the function that shows the window from omni.ui
         ui.Workspace.set_show_window_fn(WINDOW_TITLE, None)
 
+        # Stop generating downscaled textures
+        textures.shutdown_cache()
+
     async def _destroy_window_async(self):
         # wait one frame, this is due to the one frame defer
         # in Window::_moveToMainOSWindow()
@@ -84,8 +89,14 @@ class MakeHumanExtension(omni.ext.IExt):
             self._window.visible = False
 
     def _on_stage_event(self, event):
-        """Handles stage events. This is where we get notified when the user selects/deselects a prim in the viewport."""
-        if event.type == int(omni.usd.StageEventType.SELECTION_CHANGED):
+        """Handles stage events. This is where we get notified when the user selects/deselects a prim in the viewport,
+        and when the stage is saved."""
+        if event.type == int(omni.usd.StageEventType.SAVED):
+            # Humans in their own layer are saved along with the stage. Only layers with changes are written
+            stage = omni.usd.get_context().get_stage()
+            if stage:
+                layers.save(stage)
+        elif event.type == int(omni.usd.StageEventType.SELECTION_CHANGED):
             # Get the current selection
             selection = self._selection.get_selected_prim_paths()
 
@@ -110,6 +121,9 @@ class MakeHumanExtension(omni.ext.IExt):
                         # This event will be picked up by the window and used to update the UI
                         if prim and prim.GetCustomDataByKey("human"):
                             # carb.log_warn("Human selected")
+                            # Humans in their own layer are loaded when they are selected
+                            if prim.HasAuthoredPayloads() and not prim.IsLoaded():
+                                prim.Load()
                             path = prim.GetPath().pathString
                             self._bus.push(self._human_selection_event, payload={"prim_path": path})
                         else:
@@ -0,0 +1,112 @@
+from typing import List, TypeVar
+import numpy as np
+from scipy import sparse
+
+Proxy = TypeVar("Proxy")
+
+
+class ProxyFitter:
+    """Fits all the proxies of a human to the body at once. Makehuman places each proxy
+    vertex at a weighted combination of three reference vertices of the body, plus an
+    offset scaled to the body. The reference weights of all proxies are compiled into a
+    single sparse matrix, so that fitting is one sparse product against the body
+    coordinates. The matrix is rebuilt only when the set of proxies changes.
+
+    Attributes
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        Reference weights of all proxy vertices, shape (proxy vertices, body vertices)
+    """
+
+    def __init__(self):
+        """Constructs an instance of ProxyFitter"""
+        self.matrix = None
+        # Identifies the proxies the matrix was compiled for
+        self._key = None
+        # Start of each proxy's vertices in the compiled matrix
+        self._starts = None
+        # Offsets of all proxy vertices
+        self._offsets = None
+
+    def compile(self, proxies: List[Proxy], body_vertex_count: int):
+        """Compile the fitting data of the given proxies
+
+        Parameters
+        ----------
+        proxies : List[proxy.Proxy]
+            Makehuman proxies to fit
+        body_vertex_count : int
+            Number of vertices of the body the proxies are fitted to
+        """
+        counts = [len(p.ref_vIdxs) for p in proxies]
+        matrices = [reference_matrix(p, body_vertex_count) for p in proxies]
+        if matrices:
+            self.matrix = sparse.vstack(matrices, format="csr")
+        else:
+            self.matrix = sparse.csr_matrix((0, body_vertex_count), dtype=np.float32)
+
+        self._starts = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+        self._offsets = np.concatenate([np.asarray(p.offsets, dtype=np.float32) for p in proxies]) if proxies else np.zeros((0, 3), dtype=np.float32)
+        self._key = self._make_key(proxies, body_vertex_count)
+
+    def fit(self, proxies: List[Proxy], hcoord: np.ndarray) -> List[np.ndarray]:
+        """Compute the fitted coordinates of each proxy. Equivalent to makehuman's
+        `Proxy.getCoords()` for every proxy.
+
+        Parameters
+        ----------
+        proxies : List[proxy.Proxy]
+            Makehuman proxies to fit
+        hcoord : np.ndarray
+            Coordinates of the body, shape (body vertices, 3)
+
+        Returns
+        -------
+        List[np.ndarray]
+            Coordinates of each proxy, in the order of `proxies`
+        """
+        if self._make_key(proxies, len(hcoord)) != self._key:
+            self.compile(proxies, len(hcoord))
+        if not proxies:
+            return []
+
+        hcoord = np.asarray(hcoord, dtype=np.float32)[:, :3]
+        coords = self.matrix @ hcoord
+
+        # Offsets are scaled to the body by a matrix which is computed per proxy. The vertices of
+        # each proxy are contiguous, so each matrix is applied to its own rows in place
+        starts = self._starts
+        for i, p in enumerate(proxies):
+            matrix = np.asarray(p.tmatrix.getMatrix(hcoord), dtype=np.float32)
+            coords[starts[i]:starts[i + 1]] += self._offsets[starts[i]:starts[i + 1]] @ matrix.T
+
+        return [coords[starts[i]:starts[i + 1]] for i in range(len(proxies))]
+
+    @staticmethod
+    def _make_key(proxies: List[Proxy], body_vertex_count: int):
+        """Key identifying a set of proxies, used to check whether the matrix must be recompiled"""
+        return (body_vertex_count,) + tuple((p.uuid, len(p.ref_vIdxs)) for p in proxies)
+
+
+def reference_matrix(proxy: Proxy, body_vertex_count: int) -> sparse.csr_matrix:
+    """Build the sparse matrix of reference weights of a proxy. Each row holds the weights
+    of the three body vertices that a proxy vertex is fitted to.
+
+    Parameters
+    ----------
+    proxy : proxy.Proxy
+        Makehuman proxy
+    body_vertex_count : int
+        Number of vertices of the body the proxy is fitted to
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Reference weights, shape (proxy vertices, body vertices)
+    """
+    ref_vIdxs = np.asarray(proxy.ref_vIdxs)
+    weights = np.asarray(proxy.weights, dtype=np.float32)
+    rows = np.repeat(np.arange(len(ref_vIdxs)), 3)
+    return sparse.csr_matrix(
+        (weights.ravel(), (rows, ref_vIdxs.ravel())), shape=(len(ref_vIdxs), body_vertex_count)
+    )
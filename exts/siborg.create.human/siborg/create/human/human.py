@@ -1,4 +1,5 @@
 from typing import Tuple, List, Dict, Union
+import os
 from .mhcaller import MHCaller
 import numpy as np
 import omni.kit
@@ -9,8 +10,22 @@ from .skeleton import Skeleton
 from module3d import Object3D
 from pxr import Usd, UsdGeom, UsdPhysics, UsdShade, Sdf, Gf, Tf, UsdSkel, Vt
 import carb
+import carb.settings
+
+from .materials import get_mesh_texture, get_mesh_textures, create_material, bind_material
+from . import blendshapes
+from . import bounds
+from .prototypes import PrototypeLibrary
+from . import layers
+from . import lod
+from . import atlas
+from . import textures
+from .weights import influences
+from scipy import sparse
+
+# Name of the mesh which holds all the meshes of a human written with `merge_meshes`
+MERGED_MESH_NAME = "MergedMesh"
 
-from .materials import get_mesh_texture, create_material, bind_material
 class Human:
     """Class representing a human in the scene. This class is used to add a human to the scene,
     and to update the human in the scene. The class also contains functions to add and remove
@@ -34,17 +49,112 @@ class Human:
         List of objects attached to the human. Fetched from the makehuman app
     mh_meshes : List[Object3D]
         List of meshes attached to the human. Fetched from the makehuman app
+    usd_subdivision : bool
+        Whether the unsubdivided (cage) meshes are written with a catmullClark subdivision
+        scheme, leaving subdivision to the renderer, rather than being subdivided by makehuman
+    max_influences : int
+        Largest number of joint influences to keep per vertex. None or 0 keeps all influences
+    weight_threshold : float
+        Joint influences with smaller weights are dropped, except for the strongest influence
+        of each vertex
+    compact_meshes : bool
+        Whether vertices which no face references (such as body vertices hidden by clothes)
+        are left out of the meshes written to the stage
+    vertex_maps : Dict[str, np.ndarray]
+        Indices of the makehuman vertices kept in each compacted mesh, keyed by mesh prim name
+    separate_layer : bool
+        Whether new humans are written to their own layer, brought into the stage as a payload
+    layer_directory : str
+        Directory to write human layers to. Layers are written next to the stage if empty
+    lods : bool
+        Whether new humans are written with levels of detail, in a variant set on the SkelRoot
+    merge_meshes : bool
+        Whether the human and its proxies are written as a single mesh, with a subset of faces
+        for each of them
+    atlas_textures : bool
+        Whether the textures of the human and its proxies are baked into an atlas, so that the
+        human has a single material
+    texture_level : int
+        Resolution of the human's textures. Level 0 is full resolution, and each level halves it
         """
-    def __init__(self, name='human', **kwargs):
+    def __init__(self, name='human', usd_subdivision: bool = None, max_influences: int = None, weight_threshold: float = None, compact_meshes: bool = None, separate_layer: bool = None, layer_directory: str = None, lods: bool = None, merge_meshes: bool = None, atlas_textures: bool = None, texture_level: int = None, **kwargs):
         """Constructs an instance of Human.
 
         Parameters
         ----------
         name : str
             Name of the human. Defaults to 'human'
+        usd_subdivision : bool, optional
+            Whether to write cage meshes with a catmullClark subdivision scheme instead of
+            subdividing them in makehuman. Read from the extension settings by default
+        max_influences : int, optional
+            Largest number of joint influences to keep per vertex, for example 4 or 8. Read
+            from the extension settings by default
+        weight_threshold : float, optional
+            Joint influences with smaller weights are dropped. Read from the extension
+            settings by default
+        compact_meshes : bool, optional
+            Whether to leave unreferenced vertices out of the meshes. Read from the extension
+            settings by default
+        separate_layer : bool, optional
+            Whether to write new humans to their own layer, so that updates only change that
+            layer and the human can be unloaded and saved on its own. Read from the extension
+            settings by default
+        layer_directory : str, optional
+            Directory to write human layers to. Layers are written next to the stage if
+            empty. Read from the extension settings by default
+        lods : bool, optional
+            Whether to write new humans with levels of detail: the full human, its unsubdivided
+            cage, and a low-poly proxy body with its clothing. Read from the extension settings
+            by default
+        merge_meshes : bool, optional
+            Whether to write the human and its proxies as a single mesh with one skin binding,
+            which cuts the number of prims and draw calls of crowds. Read from the extension
+            settings by default
+        atlas_textures : bool, optional
+            Whether to bake the diffuse, normal and occlusion maps of the human and its proxies
+            into atlases and bind a single material. Read from the extension settings by default
+        texture_level : int, optional
+            Resolution of the human's textures, from 0 (full resolution) to
+            `textures.MAX_LEVEL`. Each level halves the resolution. Levels of detail use at
+            least the level set for them. Read from the extension settings by default
         """
 
         self.name = name
+
+        # Options which selected humans override. New humans go back to these, see reset()
+        self._option_args = {
+            "usd_subdivision": usd_subdivision,
+            "merge_meshes": merge_meshes,
+            "texture_level": texture_level,
+        }
+        self._load_options()
+
+        settings = carb.settings.get_settings()
+        if max_influences is None:
+            max_influences = settings.get("/exts/siborg.create.human/skinning/max_influences")
+        self.max_influences = max_influences or None
+        if weight_threshold is None:
+            weight_threshold = settings.get("/exts/siborg.create.human/skinning/weight_threshold")
+        self.weight_threshold = weight_threshold or 0.0
+        if compact_meshes is None:
+            compact_meshes = bool(settings.get("/exts/siborg.create.human/compact_meshes"))
+        self.compact_meshes = compact_meshes
+        if separate_layer is None:
+            separate_layer = bool(settings.get("/exts/siborg.create.human/layers/separate"))
+        self.separate_layer = separate_layer
+        if layer_directory is None:
+            layer_directory = settings.get("/exts/siborg.create.human/layers/directory")
+        self.layer_directory = layer_directory or None
+        if lods is None:
+            lods = bool(settings.get("/exts/siborg.create.human/lod/enabled"))
+        self.lods = lods
+        if atlas_textures is None:
+            atlas_textures = bool(settings.get("/exts/siborg.create.human/atlas/enabled"))
+        self.atlas_textures = atlas_textures
+
+        # Makehuman vertices kept in each compacted mesh, written by import_meshes
+        self.vertex_maps = {}
         
         # Reference to the usd prim for the skelroot representing the human in the stage
         self.prim = None
@@ -59,23 +169,140 @@ class Human:
         self.usd_skel = None
 
         # Set the human in makehuman to default values
-        MHCaller.reset_human()
+        MHCaller.reset_human(subdivided=not self.usd_subdivision)
+
+    def _load_options(self):
+        """Set the options which are read from selected humans to the values passed to the
+        constructor, or to the extension settings for those left out"""
+        settings = carb.settings.get_settings()
+        usd_subdivision = self._option_args["usd_subdivision"]
+        if usd_subdivision is None:
+            usd_subdivision = bool(settings.get("/exts/siborg.create.human/usd_subdivision"))
+        self.usd_subdivision = usd_subdivision
+        merge_meshes = self._option_args["merge_meshes"]
+        if merge_meshes is None:
+            merge_meshes = bool(settings.get("/exts/siborg.create.human/merge_meshes"))
+        self.merge_meshes = merge_meshes
+        texture_level = self._option_args["texture_level"]
+        if texture_level is None:
+            texture_level = settings.get("/exts/siborg.create.human/textures/level") or 0
+        self.texture_level = int(texture_level)
+
+    def reset(self, keep_options: bool = False):
+        """Resets the human in makehuman and adds a new skeleton to the human. Options read
+        from the last selected human are set back to their defaults
 
-    def reset(self):
-        """Resets the human in makehuman and adds a new skeleton to the human"""
+        Parameters
+        ----------
+        keep_options : bool, optional
+            Whether to keep the options of the selected human, for resetting it in place,
+            by default False
+        """
 
+        # Selected humans set these to their own values
+        if not keep_options:
+            self._load_options()
         # Reset the human in makehuman
-        MHCaller.reset_human()
+        MHCaller.reset_human(subdivided=not self.usd_subdivision)
         # Re-add the skeleton to the human
         self.skeleton = Skeleton(self.scale)
 
     def delete_proxies(self):
         """Deletes the prims corresponding to proxies attached to the human"""
         # Delete any child prims corresponding to proxies
-        if self.prim:
-            # Get the children of the human prim and delete them all at once
-            proxy_prims = [child.GetPath() for child in self.prim.GetChildren() if child.GetCustomDataByKey("Proxy_path:")]
-            omni.kit.commands.execute("DeletePrims", paths=proxy_prims)
+        # Levels of detail are cleared when they are rewritten
+        if self.prim and not lod.has_lods(self.prim) and self._is_editable(self.prim.GetPrim()):
+            stage, prim_path = self._authoring_target(self.prim)
+            # Get the proxy prims of the human and delete them all at once
+            proxy_prims = [
+                child.GetPath().ReplacePrefix(self.prim.GetPath(), Sdf.Path(prim_path))
+                for child in self._proxy_prims(self.prim)
+            ]
+            self._delete_prims(stage, proxy_prims)
+
+    @staticmethod
+    def _proxy_prims(prim: Usd.Prim) -> List[Usd.Prim]:
+        """Prims which hold the data of the proxies of a human. These are the proxy meshes, or the
+        subsets of the merged mesh if the human was written with `merge_meshes`
+
+        Parameters
+        ----------
+        prim : Usd.Prim
+            Human prim
+
+        Returns
+        -------
+        List[Usd.Prim]
+            Prims with proxy data
+        """
+        merged = prim.GetChild(MERGED_MESH_NAME)
+        children = merged.GetChildren() if merged else prim.GetChildren()
+        return [child for child in children if child.GetCustomDataByKey("Proxy_path:")]
+
+    def _authoring_target(self, prim: Usd.Prim) -> Tuple[Usd.Stage, str]:
+        """Stage and path to write a human's data to. Humans with their own layer are written to
+        that layer, and others to the current stage.
+
+        Parameters
+        ----------
+        prim : Usd.Prim
+            Human prim in the current stage
+
+        Returns
+        -------
+        stage : Usd.Stage
+            Stage to author the human's data on
+        prim_path : str
+            Path to the human's SkelRoot on that stage
+        """
+        layer = layers.layer_of(prim)
+        if layer is None:
+            return prim.GetStage(), prim.GetPath().pathString
+        return layers.authoring_stage(layer), layers.HUMAN_ROOT
+
+    @staticmethod
+    def _is_editable(prim: Usd.Prim) -> bool:
+        """Whether a human can be edited in place. Instanced humans share their prims with
+        every instance of their prototype, so they are read-only, and editing a prototype
+        would reshape all of its instances. Logs a warning if the human can't be edited.
+
+        Parameters
+        ----------
+        prim : Usd.Prim
+            Human prim
+
+        Returns
+        -------
+        bool
+            True if the human can be edited, False otherwise
+        """
+        if prim.IsInstance() or prim.IsInstanceProxy() or prim.IsInPrototype():
+            carb.log_warn(f"{prim.GetPath()} is an instanced human and can't be edited in place")
+            return False
+        # Prototypes are written under an abstract (class) scope
+        if prim.IsAbstract() and prim.GetCustomDataByKey("PrototypeHash"):
+            carb.log_warn(f"{prim.GetPath()} is a prototype shared by instanced humans and can't be edited")
+            return False
+        return True
+
+    @staticmethod
+    def _delete_prims(stage: Usd.Stage, paths: List[Sdf.Path]):
+        """Delete prims, with an undoable command if they are in the current stage
+
+        Parameters
+        ----------
+        stage : Usd.Stage
+            Stage which holds the prims
+        paths : List[Sdf.Path]
+            Paths to the prims to delete
+        """
+        if not paths:
+            return
+        if stage == omni.usd.get_context().get_stage():
+            omni.kit.commands.execute("DeletePrims", paths=paths)
+        else:
+            for path in paths:
+                stage.RemovePrim(path)
 
     @property
     def prim_path(self):
@@ -95,19 +322,39 @@ class Human:
         """List of meshes attached to the human. Fetched from the makehuman app"""
         return MHCaller.meshes
 
-    def add_to_scene(self):
+    def add_to_scene(self, parent_path: str = None, instanced: bool = False, local_materials: bool = False):
         """Adds the human to the scene. Creates a prim for the human with custom attributes
         to hold modifiers and proxies. Also creates a prim for each proxy and attaches it to
         the human prim.
 
+        Parameters
+        ----------
+        parent_path : str, optional
+            Path to the prim under which to create the human, by default the stage's default
+            prim. Materials are created under the default prim unless local_materials is set
+        instanced : bool, optional
+            Whether to write the human as an instanceable reference to a prototype, shared
+            with all identical humans, by default False. The prototype is written the first
+            time a human with the same modifiers, proxies and options is added. Instanced
+            humans can't be updated in place
+        local_materials : bool, optional
+            Whether to create materials under the human's own prim, so that they are carried
+            along when the prim is referenced, by default False
+
         Returns
         -------
-        str
-            Path to the human prim"""
+        UsdSkel.Root
+            The human's SkelRoot, which is the instance if the human is instanced"""
 
         # Get the current stage
         stage = omni.usd.get_context().get_stage()
 
+        if instanced:
+            # Reference a prototype, which is written once for all identical humans. The instance
+            # is a SkelRoot through its reference
+            self.prim = UsdSkel.Root(PrototypeLibrary(stage).instance(self, parent_path))
+            return self.prim
+
         root_path = "/"
 
         # Get default prim.
@@ -117,14 +364,70 @@ class Human:
             root_path = default_prim.GetPath().pathString
 
         # Create a path for the next available prim
-        prim_path = omni.usd.get_stage_next_free_path(stage, root_path + "/" + self.name, False)
+        prim_path = omni.usd.get_stage_next_free_path(stage, (parent_path or root_path) + "/" + self.name, False)
 
         # Create a prim for the human
         # Prim should be a SkelRoot so we can rig the human with a skeleton later
         self.prim = UsdSkel.Root.Define(stage, prim_path)
 
-        # Write the properties of the human to the prim
-        self.write_properties(prim_path, stage)
+        layer = None
+        if self.separate_layer:
+            # Write the human's data to its own layer, which holds the SkelRoot and materials
+            layer = layers.create_layer(prim_path.strip("/").replace("/", "_"), self.layer_directory, stage, self.prim.GetPrim())
+
+        MHCaller.set_subdivided(not self.usd_subdivision)
+
+        if layer is not None:
+            target_stage = layers.authoring_stage(layer)
+            UsdSkel.Root.Define(target_stage, layers.HUMAN_ROOT)
+            # The properties live in the layer, so that updates don't change the stage
+            self.write_properties(layers.HUMAN_ROOT, target_stage)
+            if self.lods:
+                self._write_lods(target_stage, layers.HUMAN_ROOT)
+            else:
+                self._write_human(target_stage, layers.HUMAN_ROOT, layers.HUMAN_ROOT, self.subdivision_scheme(), new=True)
+            # Humans are found by this key while their payload is unloaded
+            self.prim.GetPrim().SetCustomDataByKey("human", True)
+            layers.add_payload(self.prim.GetPrim(), layer)
+            layers.author_stand_in(self.prim.GetPrim(), target_stage)
+        else:
+            # Write the properties of the human to the prim
+            self.write_properties(prim_path, stage)
+            if self.lods:
+                self._write_lods(stage, prim_path)
+            else:
+                material_root = prim_path if local_materials else root_path
+                self._write_human(stage, prim_path, material_root, self.subdivision_scheme(), new=True)
+
+        Human._set_scale(self.prim.GetPrim(), self.scale)
+
+        return self.prim
+
+    def _write_human(self, stage: Usd.Stage, prim_path: str, material_root: str, subdivision_scheme: str, new: bool = False, texture_level: int = None) -> List[Sdf.Path]:
+        """Write the meshes, skeleton, weights and materials of the human
+
+        Parameters
+        ----------
+        stage : Usd.Stage
+            Stage to write to
+        prim_path : str
+            Path to the human's SkelRoot on the stage
+        material_root : str
+            Path to the prim under which to create materials
+        subdivision_scheme : str
+            USD subdivision scheme to apply to the meshes
+        new : bool, optional
+            Whether the human is being added rather than updated, by default False
+        texture_level : int, optional
+            Resolution of the textures, by default `texture_level`
+
+        Returns
+        -------
+        List[Sdf.Path]
+            Paths to the mesh prims
+        """
+        if texture_level is None:
+            texture_level = self.texture_level
 
         # Get the objects of the human from mhcaller
         objects = MHCaller.objects
@@ -135,11 +438,21 @@ class Human:
         # Determine the offset for the human from the ground
         offset = -1 * human.getJointPosition("ground")
 
-        # Import makehuman objects into the scene
-        mesh_paths = self.import_meshes(prim_path, stage, offset = offset)
+        # Import makehuman objects into the scene. Materials are bound to the mesh of each
+        # object, or to its subset of the merged mesh
+        if self.merge_meshes:
+            mesh_path, part_paths = self.import_merged_mesh(prim_path, stage, offset=offset, subdivision_scheme=subdivision_scheme)
+            mesh_paths = [mesh_path]
+        else:
+            mesh_paths = self.import_meshes(prim_path, stage, offset=offset, subdivision_scheme=subdivision_scheme)
+            part_paths = mesh_paths
 
-        # Add the skeleton to the scene
-        self.usd_skel= self.skeleton.add_to_stage(stage, prim_path, offset = offset)
+        if new:
+            # Add the skeleton to the scene
+            self.usd_skel = self.skeleton.add_to_stage(stage, prim_path, offset=offset)
+        else:
+            # Update the skeleton values and insert it into the stage
+            self.usd_skel = self.skeleton.update_in_scene(stage, prim_path, offset=offset)
 
         # Create bindings between meshes and the skeleton. Returns a list of
         # bindings the length of the number of meshes
@@ -147,21 +460,61 @@ class Human:
 
         # Setup weights for corresponding mh_meshes (which hold the data) and
         # bindings (which link USD_meshes to the skeleton)
-        self.setup_weights(self.mh_meshes, bindings, self.skeleton.joint_names, self.skeleton.joint_paths)
+        saved = self.setup_weights(self.mh_meshes, bindings, self.skeleton.joint_names, self.skeleton.joint_paths)
+        # Record the bytes saved by pruning influences, keyed by mesh name
+        stage.GetPrimAtPath(prim_path).SetCustomDataByKey(
+            "Pruned_weights", {Sdf.Path(path).name: size for path, size in saved.items()}
+        )
+
+        if self.atlas_textures and self.setup_atlas(mesh_paths, part_paths, material_root, stage, texture_level):
+            return mesh_paths
 
-        self.setup_materials(self.mh_meshes, mesh_paths, root_path, stage)
+        self.setup_materials(self.mh_meshes, part_paths, material_root, stage, texture_level)
 
         # Explicitly setup material for human skin
-        texture_path = data_path("skins/textures/skin.png")
-        skin = create_material(texture_path, "Skin", root_path, stage)
+        skin = create_material(data_path("skins/textures/skin.png"), textures.level_name("Skin", texture_level), material_root, stage)
+        textures.get_cache().bind_variants(skin, texture_level)
         # Bind the skin material to the first prim in the list (the human)
-        bind_material(mesh_paths[0], skin, stage)
+        bind_material(part_paths[0], skin, stage)
 
-        Human._set_scale(self.prim.GetPrim(), self.scale)
+        return mesh_paths
 
-        return self.prim
+    def _write_lods(self, stage: Usd.Stage, prim_path: str, levels: List[str] = lod.LODS, shape_modifiers: List[str] = None, preview: bool = False):
+        """Write levels of detail of the human, each into its variant of the LOD variant set on
+        the SkelRoot. Every level has its own meshes, skeleton, weights and materials, so each
+        is skinned on its own. Materials are written under the SkelRoot, since variants can
+        only hold prims beneath it.
 
-    def update_in_scene(self, prim_path: str):
+        Parameters
+        ----------
+        stage : Usd.Stage
+            Stage to write to
+        prim_path : str
+            Path to the human's SkelRoot on the stage
+        levels : List[str], optional
+            Levels of detail to write, by default all of them
+        shape_modifiers : List[str], optional
+            Modifiers to write as blend shapes on each level, by default None
+        preview : bool, optional
+            Whether to write the full level as a low-resolution preview, by default False
+        """
+        variant_set = stage.GetPrimAtPath(prim_path).GetVariantSets().AddVariantSet(lod.LOD_SET)
+        selection = variant_set.GetVariantSelection()
+        for level in levels:
+            variant_set.AddVariant(level)
+            # Edits are written to the selected variant
+            variant_set.SetVariantSelection(level)
+            lod.clear_level(stage, prim_path, level)
+            subdivision_scheme = self.subdivision_scheme(preview) if level == "full" else "none"
+            texture_level = max(self.texture_level, lod.texture_level(level))
+            with lod.level_state(level, self.usd_subdivision or preview), variant_set.GetVariantEditContext():
+                mesh_paths = self._write_human(stage, prim_path, prim_path, subdivision_scheme, new=True, texture_level=texture_level)
+                if shape_modifiers:
+                    self.setup_blend_shapes(shape_modifiers, mesh_paths, stage)
+        # New humans show the most detailed level
+        variant_set.SetVariantSelection(selection or lod.LODS[0])
+
+    def update_in_scene(self, prim_path: str, preview: bool = False):
         """Updates the human in the scene. Writes the properties of the human to the
         human prim and imports the human and proxy meshes. This is called when the
         human is updated
@@ -170,6 +523,11 @@ class Human:
         ----------
         prim_path : str
             Path to the human prim (prim type is SkelRoot)
+        preview : bool, optional
+            Whether to write a low-resolution preview for interactive editing, by default
+            False. Previews write the unsubdivided meshes and leave subdivision to the USD
+            subdivision scheme. The full-resolution meshes should be written once editing
+            is done
         """
 
         usd_context = omni.usd.get_context()
@@ -182,6 +540,9 @@ class Human:
             prim_kind = prim.GetTypeName()
             # Check if the prim is a SkelRoot and a human
             if prim_kind == "SkelRoot" and prim.GetCustomDataByKey("human"):
+                # Instances can't be authored on, and their prototype is shared
+                if not self._is_editable(prim):
+                    return
                 # Get default prim.
                 default_prim = stage.GetDefaultPrim()
                 if default_prim.IsValid():
@@ -189,50 +550,73 @@ class Human:
                     root_path = default_prim.GetPath().pathString
                 else:
                     root_path = "/"
-                    
-                # Write the properties of the human to the prim
-                self.write_properties(prim_path, stage)
-
-                # Get the objects of the human from mhcaller
-                objects = MHCaller.objects
 
-                # Get the human object from the list of objects
-                human = objects[0]
+                # Previews skip makehuman's subdivision, which quadruples the vertex count
+                MHCaller.set_subdivided(not (preview or self.usd_subdivision))
+                subdivision_scheme = self.subdivision_scheme(preview)
 
-                # Determine the offset for the human from the ground
-                offset = -1 * human.getJointPosition("ground")
+                # Humans with their own layer are written to that layer only
+                target_stage, target_path = self._authoring_target(prim)
+                if target_stage != stage:
+                    root_path = target_path
+                    if not prim.IsLoaded():
+                        prim.Load()
 
-                # Import makehuman objects into the scene
-                mesh_paths = self.import_meshes(prim_path, stage, offset = offset)
-
-                # Update the skeleton values and insert it into the stage
-                self.usd_skel = self.skeleton.update_in_scene(stage, prim_path, offset = offset)
-
-                # Create bindings between meshes and the skeleton. Returns a list of
-                # bindings the length of the number of meshes
-                bindings = self.setup_bindings(mesh_paths, stage, self.usd_skel)
-
-                # Setup weights for corresponding mh_meshes (which hold the data) and
-                # bindings (which link USD_meshes to the skeleton)
-                self.setup_weights(self.mh_meshes, bindings, self.skeleton.joint_names, self.skeleton.joint_paths)
-
-                self.setup_materials(self.mh_meshes, mesh_paths, root_path, stage)
-
-                # Explicitly setup material for human skin
-                texture_path = data_path("skins/textures/skin.png")
-                skin = create_material(texture_path, "Skin", root_path, stage)
-                # Bind the skin material to the first prim in the list (the human)
-                bind_material(mesh_paths[0], skin, stage)
+                # Write the properties of the human to the prim
+                self.write_properties(target_path, target_stage)
+
+                # Blend shape offsets depend on the meshes that are written, so they have to
+                # be rebuilt as well. Previews drop them instead, since their meshes don't match,
+                # and they are rebuilt once the full-resolution meshes are written
+                shape_modifiers = None if preview else prim.GetCustomDataByKey("BlendShapes")
+
+                target_prim = target_stage.GetPrimAtPath(target_path)
+                if lod.has_lods(target_prim):
+                    # Previews only rewrite the level being shown, which clears its blend shapes
+                    levels = [target_prim.GetVariantSet(lod.LOD_SET).GetVariantSelection()] if preview else lod.LODS
+                    self._write_lods(target_stage, target_path, levels, shape_modifiers, preview)
+                else:
+                    mesh_paths = self._write_human(target_stage, target_path, root_path, subdivision_scheme)
+                    if shape_modifiers:
+                        self.setup_blend_shapes(shape_modifiers, mesh_paths, target_stage)
+                    elif preview and prim.GetCustomDataByKey("BlendShapes"):
+                        blendshapes.remove_blend_shapes(target_stage, mesh_paths, self.usd_skel)
             else:
                 carb.log_warn("The selected prim must be a human!")
         else:
             carb.log_warn("Can't update human. No prim selected!")
 
-    def import_meshes(self, prim_path: str, stage: Usd.Stage, offset: List[float] = [0, 0, 0]):
+    def subdivision_scheme(self, preview: bool = False) -> str:
+        """The USD subdivision scheme to write on the human's meshes. Cage meshes are
+        subdivided by the renderer, while meshes subdivided by makehuman are not refined
+        further.
+
+        Parameters
+        ----------
+        preview : bool, optional
+            Whether the meshes are written as a low-resolution preview, by default False
+
+        Returns
+        -------
+        str
+            "catmullClark" if the meshes are not subdivided by makehuman, "none" otherwise
+        """
+        return "catmullClark" if (preview or self.usd_subdivision) else "none"
+
+    def import_meshes(self, prim_path: str, stage: Usd.Stage, offset: List[float] = [0, 0, 0], subdivision_scheme: str = "none"):
         """Imports the meshes of the human into the scene. This is called when the human is
         added to the scene, and when the human is updated. This function creates mesh prims
         for both the human and its proxies, and attaches them to the human prim. If a mesh already
-        exists in the scene, its values are updated instead of creating a new mesh.
+        exists in the scene, its values are updated instead of creating a new mesh. Mesh prims
+        of the human which are not written, such as those of removed proxies or meshes named
+        by earlier versions, are removed.
+
+        If `compact_meshes` is set, vertices which no remaining face references are left out
+        and face indices are remapped. The kept vertices of each mesh are stored in
+        `vertex_maps`, so that weights and blend shapes can be remapped the same way.
+
+        Extents are written on each mesh, and an estimate of the skinned bounds on the
+        human prim. See `bounds.human_bounds()` to query the bounds of all humans.
 
         Parameters
         ----------
@@ -242,6 +626,8 @@ class Human:
             Stage to write to
         offset : List[float], optional
             Offset to move the mesh relative to the prim origin, by default [0, 0, 0]
+        subdivision_scheme : str, optional
+            USD subdivision scheme to apply to the meshes, by default "none"
 
         Returns
         -------
@@ -256,34 +642,27 @@ class Human:
         meshes = [o.mesh for o in objects]
 
         usd_mesh_paths = []
+        # Rest extent of each mesh, used to estimate the bounds of the skinned human
+        extents = []
 
         for mesh in meshes:
-            # Number of vertices per face
-            nPerFace = mesh.vertsPerFaceForExport
-            # Lists to hold pruned lists of vertex and UV indices
-            newvertindices = []
-            newuvindices = []
-
-            # Array of coordinates organized [[x1,y1,z1],[x2,y2,z2]...]
-            # Adding the given offset moves the mesh relative to the prim origin
-            coords = mesh.getCoords() + offset
-            for fn, fv in enumerate(mesh.fvert):
-                if not mesh.face_mask[fn]:
-                    continue
-                # only include <nPerFace> verts for each face, and order them
-                # consecutively
-                newvertindices += [(fv[n]) for n in range(nPerFace)]
-                fuv = mesh.fuvs[fn]
-                # build an array of (u,v)s for each face
-                newuvindices += [(fuv[n]) for n in range(nPerFace)]
-
-            # Type conversion
-            newvertindices = np.array(newvertindices)
+            name, nPerFace, coords, newvertindices, uvs, normals = self._mesh_arrays(mesh, offset)
 
             # Create mesh prim at appropriate path. Does not yet hold any data
-            name = sanitize(mesh.name)
             usd_mesh_path = prim_path + "/" + name
             usd_mesh_paths.append(usd_mesh_path)
+
+            # Extents let renderers and bbox caches skip computing bounds from points
+            extent = bounds.points_extent(coords)
+            extents.append(extent)
+
+            # Hand contiguous buffers to USD, which copies them without converting each element
+            nface = Vt.IntArray.FromNumpy(np.full(len(newvertindices) // nPerFace, nPerFace, dtype=np.int32))
+            uvs = Vt.Vec2fArray.FromNumpy(uvs)
+            coords = Vt.Vec3fArray.FromNumpy(np.ascontiguousarray(coords))
+            normals = Vt.Vec3fArray.FromNumpy(np.ascontiguousarray(normals))
+            newvertindices = Vt.IntArray.FromNumpy(newvertindices)
+
             # Check to see if the mesh prim already exists
             prim = stage.GetPrimAtPath(usd_mesh_path)
 
@@ -293,14 +672,13 @@ class Human:
                 point_attr.Set(coords)
 
                 face_count = prim.GetAttribute('faceVertexCounts')
-                nface = [nPerFace] * int(len(newvertindices) / nPerFace)
                 face_count.Set(nface)
 
                 face_idx = prim.GetAttribute('faceVertexIndices')
                 face_idx.Set(newvertindices)
 
                 normals_attr = prim.GetAttribute('normals')
-                normals_attr.Set(mesh.getNormals())
+                normals_attr.Set(normals)
 
                 meshGeom = UsdGeom.Mesh(prim)
 
@@ -314,11 +692,11 @@ class Human:
                     #  an existing proxy of this type already exists, and we must overwrite it
                     type = p.type if p.type else "proxymeshes"
                     if not (type == "clothes" or type == "proxymeshes"):
-                        for child in self.prim.GetChildren():
+                        for child in stage.GetPrimAtPath(prim_path).GetChildren():
                             child_type = child.GetCustomDataByKey("Proxy_type:")
                             if child_type == type:
                                 # If the child prim has the same type as the proxy, delete it
-                                omni.kit.commands.execute("DeletePrims", paths=[child.GetPath()])
+                                self._delete_prims(stage, [child.GetPath()])
                                 break
 
                 meshGeom = UsdGeom.Mesh.Define(stage, usd_mesh_path)
@@ -338,7 +716,6 @@ class Human:
                 #   Example: 4 faces with 4 vertices each
                 #   meshGeom.CreateFaceVertexCountsAttr([4, 4, 4, 4])
 
-                nface = [nPerFace] * int(len(newvertindices) / nPerFace)
                 meshGeom.CreateFaceVertexCountsAttr(nface)
 
                 # Set face vertex indices.
@@ -353,7 +730,7 @@ class Human:
                 # meshGeom.CreateNormalsAttr([(0, 1, 0), (0, 1, 0), (0, 1, 0), (0, 1,
                 # 0)])
 
-                meshGeom.CreateNormalsAttr(mesh.getNormals())
+                meshGeom.CreateNormalsAttr(normals)
                 meshGeom.SetNormalsInterpolation("vertex")
 
                 # If the mesh is a proxy, write the proxy path to the mesh prim
@@ -372,16 +749,223 @@ class Human:
             texCoords = meshGeom.CreatePrimvar(
                 "st", Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.faceVarying
             )
-            texCoords.Set(mesh.getUVs(newuvindices))
+            texCoords.Set(uvs)
+
+            # Subdivision is "none" by default, so the mesh is as imported and not further
+            # refined. Previews use "catmullClark" to let the renderer refine the mesh
+            meshGeom.CreateSubdivisionSchemeAttr().Set(subdivision_scheme)
 
-            # # Subdivision is set to none. The mesh is as imported and not further refined
-            meshGeom.CreateSubdivisionSchemeAttr().Set("none")
+            meshGeom.CreateExtentAttr().Set(Vt.Vec3fArray.FromNumpy(extent))
+
+        # Estimate the bounds of the skinned meshes on the SkelRoot, so that the human can be
+        # bounded without skinning its meshes. Updated whenever the points are written
+        root = UsdSkel.Root(stage.GetPrimAtPath(prim_path))
+        root.CreateExtentAttr().Set(Vt.Vec3fArray.FromNumpy(bounds.skinned_extent(extents)))
+
+        # Report how many faces were left out because they are hidden
+        total, visible = MHCaller.polycount()
+        stage.GetPrimAtPath(prim_path).SetCustomDataByKey("Polycount", {"total": total, "visible": visible})
+        carb.log_info(f"Wrote {visible} of {total} faces for {prim_path}")
 
         # ConvertPath strings to USD Sdf paths. TODO change to map() for performance
         paths = [Sdf.Path(mesh_path) for mesh_path in usd_mesh_paths]
 
+        # Remove meshes which were not written, such as meshes named after makehuman's
+        # subdivided mesh rather than its seed mesh by earlier versions
+        stale = [
+            child.GetPath()
+            for child in stage.GetPrimAtPath(prim_path).GetChildren()
+            if child.IsA(UsdGeom.Mesh) and child.GetPath() not in paths
+        ]
+        if stale:
+            self._delete_prims(stage, stale)
+
         return paths
 
+    def _mesh_arrays(self, mesh: 'Object3D', offset: List[float]) -> Tuple[str, int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Arrays to write for a makehuman mesh. Hidden faces are left out. If `compact_meshes`
+        is set, vertices which no remaining face references are left out as well, and the kept
+        vertices are stored in `vertex_maps`.
+
+        Parameters
+        ----------
+        mesh : Object3D
+            Makehuman mesh
+        offset : List[float]
+            Offset to move the mesh relative to the prim origin
+
+        Returns
+        -------
+        name : str
+            Name of the mesh prim. Named after the unsubdivided mesh so that it is reused
+            whether or not makehuman subdivides the mesh
+        n_per_face : int
+            Number of vertices per face
+        coords : np.ndarray
+            Vertex coordinates, shape (n, 3), float32
+        indices : np.ndarray
+            Vertex indices of each face, ordered consecutively, int32
+        uvs : np.ndarray
+            Face-varying texture coordinates, shape (len(indices), 2), float32
+        normals : np.ndarray
+            Vertex normals, shape (n, 3), float32
+        """
+        # Number of vertices per face
+        nPerFace = mesh.vertsPerFaceForExport
+
+        # Array of coordinates organized [[x1,y1,z1],[x2,y2,z2]...], kept in float32 as
+        # USD stores them. Adding the given offset moves the mesh relative to the prim origin
+        coords = np.array(mesh.getCoords(), dtype=np.float32)
+        coords += np.asarray(offset, dtype=np.float32)
+
+        # Vertex and UV indices of unmasked faces. Only include <nPerFace> verts for each
+        # face, ordered consecutively
+        face_mask = np.asarray(mesh.face_mask, dtype=bool)
+        newvertindices = np.ascontiguousarray(mesh.fvert[face_mask][:, :nPerFace], dtype=np.int32).ravel()
+        newuvindices = np.asarray(mesh.fuvs[face_mask][:, :nPerFace]).ravel()
+        uvs = np.ascontiguousarray(mesh.getUVs(newuvindices), dtype=np.float32)
+
+        # Vertex normals, for the same vertices as coords
+        normals = np.asarray(mesh.getNormals(), dtype=np.float32)
+
+        name = sanitize(mesh.object.getSeedMesh().name)
+
+        if self.compact_meshes:
+            # Keep only referenced vertices, and index them by their position among the kept
+            # vertices
+            vertex_map, newvertindices = np.unique(newvertindices, return_inverse=True)
+            newvertindices = newvertindices.astype(np.int32)
+            if len(vertex_map) < len(coords):
+                carb.log_info(f"Compacted {name} from {len(coords)} to {len(vertex_map)} vertices")
+            coords = coords[vertex_map]
+            normals = normals[vertex_map]
+            self.vertex_maps[name] = vertex_map
+        else:
+            self.vertex_maps.pop(name, None)
+
+        return name, nPerFace, coords, newvertindices, uvs, normals
+
+    def import_merged_mesh(self, prim_path: str, stage: Usd.Stage, offset: List[float] = [0, 0, 0], subdivision_scheme: str = "none") -> Tuple[Sdf.Path, List[Sdf.Path]]:
+        """Imports the human and its proxies as a single mesh, so that each human is one prim
+        with one skin binding. Each makehuman mesh becomes a `UsdGeom.Subset` of faces, which
+        materials are bound to. Subsets of proxies hold the proxy data which is otherwise
+        written to proxy mesh prims.
+
+        Parameters
+        ----------
+        prim_path : str
+            Path to the human prim
+        stage : Usd.Stage
+            Stage to write to
+        offset : List[float], optional
+            Offset to move the mesh relative to the prim origin, by default [0, 0, 0]
+        subdivision_scheme : str, optional
+            USD subdivision scheme to apply to the mesh, by default "none"
+
+        Returns
+        -------
+        mesh_path : Sdf.Path
+            Path to the merged mesh
+        subset_paths : List[Sdf.Path]
+            Paths to the subset of each makehuman mesh, in the order of makehuman objects
+        """
+        objects = MHCaller.objects
+
+        mesh_path = Sdf.Path(prim_path).AppendChild(MERGED_MESH_NAME)
+        meshGeom = UsdGeom.Mesh.Define(stage, mesh_path)
+
+        coords, indices, counts, uvs, normals = [], [], [], [], []
+        subsets = []
+        # Index of the first vertex and face of the current mesh in the merged mesh
+        start, face_start = 0, 0
+        for o in objects:
+            name, nPerFace, mesh_coords, mesh_indices, mesh_uvs, mesh_normals = self._mesh_arrays(o.mesh, offset)
+            n_faces = len(mesh_indices) // nPerFace
+
+            coords.append(mesh_coords)
+            indices.append(mesh_indices + start)
+            counts.append(np.full(n_faces, nPerFace, dtype=np.int32))
+            uvs.append(mesh_uvs)
+            normals.append(mesh_normals)
+
+            subset = UsdGeom.Subset.Define(stage, mesh_path.AppendChild(name))
+            subset.CreateElementTypeAttr().Set(UsdGeom.Tokens.face)
+            subset.CreateFamilyNameAttr().Set(UsdShade.Tokens.materialBind)
+            subset.CreateIndicesAttr().Set(Vt.IntArray.FromNumpy(np.arange(face_start, face_start + n_faces, dtype=np.int32)))
+            subset_prim = subset.GetPrim()
+            # Subsets of proxies hold the proxy data, so that proxies can be read back from the prim
+            p = o.proxy
+            if p:
+                type = p.type if p.type else "proxymeshes"
+                subset_prim.SetCustomDataByKey("Proxy_path:", p.file)
+                subset_prim.SetCustomDataByKey("Proxy_type:", type)
+                subset_prim.SetCustomDataByKey("Proxy_name:", p.name)
+            subsets.append(subset_prim.GetPath())
+
+            start += len(mesh_coords)
+            face_start += n_faces
+
+        # Remove subsets of proxies which have been removed
+        for child in meshGeom.GetPrim().GetChildren():
+            if child.IsA(UsdGeom.Subset) and child.GetPath() not in subsets:
+                stage.RemovePrim(child.GetPath())
+
+        coords = np.concatenate(coords)
+        extent = bounds.points_extent(coords)
+
+        # Hand contiguous buffers to USD, which copies them without converting each element
+        meshGeom.CreatePointsAttr().Set(Vt.Vec3fArray.FromNumpy(np.ascontiguousarray(coords)))
+        meshGeom.CreateFaceVertexCountsAttr().Set(Vt.IntArray.FromNumpy(np.concatenate(counts)))
+        meshGeom.CreateFaceVertexIndicesAttr().Set(Vt.IntArray.FromNumpy(np.concatenate(indices)))
+        meshGeom.CreateNormalsAttr().Set(Vt.Vec3fArray.FromNumpy(np.ascontiguousarray(np.concatenate(normals))))
+        meshGeom.SetNormalsInterpolation("vertex")
+        texCoords = meshGeom.CreatePrimvar("st", Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.faceVarying)
+        texCoords.Set(Vt.Vec2fArray.FromNumpy(np.ascontiguousarray(np.concatenate(uvs))))
+        meshGeom.CreateSubdivisionSchemeAttr().Set(subdivision_scheme)
+        meshGeom.CreateExtentAttr().Set(Vt.Vec3fArray.FromNumpy(extent))
+        # Each face belongs to exactly one subset
+        UsdShade.MaterialBindingAPI(meshGeom.GetPrim()).SetMaterialBindSubsetsFamilyType(UsdGeom.Tokens.partition)
+
+        root = UsdSkel.Root(stage.GetPrimAtPath(prim_path))
+        root.CreateExtentAttr().Set(Vt.Vec3fArray.FromNumpy(bounds.skinned_extent([extent])))
+
+        total, visible = MHCaller.polycount()
+        stage.GetPrimAtPath(prim_path).SetCustomDataByKey("Polycount", {"total": total, "visible": visible})
+        carb.log_info(f"Wrote {visible} of {total} faces for {prim_path} as one mesh")
+
+        return mesh_path, subsets
+
+    def get_polycount(self) -> Union[Tuple[int, int], None]:
+        """Number of faces of the human in the scene, before and after hidden faces are left out.
+        MAY BE STALE IF THE HUMAN HAS BEEN UPDATED IN MAKEHUMAN AND THE CHANGES HAVE NOT BEEN WRITTEN TO THE PRIM.
+
+        Returns
+        -------
+        Union[Tuple[int, int], None]
+            Total and visible number of faces, or None if the human has not been written
+        """
+        if not self.prim:
+            return None
+        polycount = self.prim.GetCustomDataByKey("Polycount")
+        if not polycount:
+            return None
+        return polycount["total"], polycount["visible"]
+
+    def get_pruned_bytes(self) -> Union[Dict[str, int], None]:
+        """Bytes saved on the skinning primvars of each mesh by pruning influences. See
+        `max_influences` and `weight_threshold`.
+        MAY BE STALE IF THE HUMAN HAS BEEN UPDATED IN MAKEHUMAN AND THE CHANGES HAVE NOT BEEN WRITTEN TO THE PRIM.
+
+        Returns
+        -------
+        Union[Dict[str, int], None]
+            Bytes saved, keyed by mesh prim name, or None if the human has not been written
+        """
+        if not self.prim:
+            return None
+        saved = self.prim.GetCustomDataByKey("Pruned_weights")
+        return dict(saved) if saved is not None else None
+
     def get_written_modifiers(self) -> Union[Dict[str, float], None]:
         """List of modifier names and values written to the human prim.
         MAY BE STALE IF THE HUMAN HAS BEEN UPDATED IN MAKEHUMAN AND THE CHANGES HAVE NOT BEEN WRITTEN TO THE PRIM.
@@ -408,22 +992,21 @@ class Human:
         Parameters
         ----------
         modifier : makehuman.humanmodifier.Modifier
-            Modifier to change
+            Modifier to change. Nothing is set if None, as returned by
+            `get_modifier_by_name()` for unknown names
         value : float
             Value to set the modifier to
         """
+        # Unknown modifiers are reported by get_modifier_by_name(), which returns None
+        if modifier is None:
+            return False
 
-        # Get the range of the modifier
-        val_min = modifier.getMin()
-        val_max = modifier.getMax()
-
-        # Check if the value is within the range of the modifier
-        if value >= val_min and value <= val_max:
+        # Check that the value is within the range of the modifier
+        if MHCaller.modifier_catalog.validate(modifier.fullName, value):
             # Set the value of the modifier
             modifier.setValue(value)
             return True
         else:
-            carb.log_warn(f"Value must be between {str(val_min)} and {str(val_max)}")
             return False
 
     def get_modifier_by_name(self, name: str):
@@ -437,12 +1020,275 @@ class Human:
         Returns
         -------
         makehuman.modifiers.Modifier
-            Modifier with the given name
+            Modifier with the given name, or None if there is no such modifier
         """
+        if name not in MHCaller.modifier_catalog:
+            carb.log_warn(f"No modifier named {name}")
+            return None
         return MHCaller.human.getModifier(name)
 
     def get_modifier_names(self):
-        return MHCaller.human.getModifierNames()
+        """Full names of all modifiers available to the human"""
+        return MHCaller.modifier_catalog.names()
+
+    def export_blend_shapes(self, modifiers: List[str] = blendshapes.MACRO_MODIFIERS):
+        """Export modifiers as blend shapes, so that they can be changed with
+        `set_blend_shape_values()` by writing blend shape weights instead of reimporting
+        the meshes. Each modifier is represented by a pair of blend shapes on every mesh,
+        computed around the current value of the modifier. Blend shapes are a linear
+        approximation of modifiers, which are exact at the current, minimum and maximum
+        values. Use `verify_blend_shapes()` to measure the error in between.
+
+        Instant updates from the modifier sliders only write blend shape weights when every
+        changed modifier is exported. Blend shapes are rebuilt around the current values
+        whenever the full-resolution human is written, and dropped by previews.
+
+        The human is updated in the scene. Pass an empty list to remove all blend shapes.
+
+        Parameters
+        ----------
+        modifiers : List[str], optional
+            Full names of the modifiers to export, by default the macro modifiers
+        """
+        if not self.prim:
+            carb.log_warn("Can't export blend shapes. No human prim selected!")
+            return
+
+        stage = omni.usd.get_context().get_stage()
+        if not self._is_editable(stage.GetPrimAtPath(self.prim_path)):
+            return
+        # Humans with their own layer keep the list of exported modifiers in it
+        target_stage, target_path = self._authoring_target(stage.GetPrimAtPath(self.prim_path))
+        prim = target_stage.GetPrimAtPath(target_path)
+
+        modifiers = [m for m in modifiers if m in MHCaller.modifier_catalog]
+        if not modifiers and prim.GetCustomDataByKey("BlendShapes"):
+            # Remove the blend shapes along with the list of exported modifiers
+            prim.ClearCustomDataByKey("BlendShapes")
+            mesh_paths = [child.GetPath() for child in prim.GetChildren() if child.GetTypeName() == "Mesh"]
+            skeleton = UsdSkel.Skeleton(target_stage.GetPrimAtPath(target_path + "/Skeleton"))
+            blendshapes.remove_blend_shapes(target_stage, mesh_paths, skeleton)
+            return
+
+        prim.SetCustomDataByKey("BlendShapes", list(modifiers))
+        # Blend shapes are written when the human is updated
+        self.update_in_scene(self.prim_path)
+
+    def setup_blend_shapes(self, modifiers: List[str], mesh_paths: List[Sdf.Path], stage: Usd.Stage):
+        """Compute blend shapes for the given modifiers around their current values and write
+        them to the human's meshes. The meshes in the stage must match the human in makehuman.
+
+        Parameters
+        ----------
+        modifiers : List[str]
+            Full names of the modifiers to export
+        mesh_paths : List[Sdf.Path]
+            Paths to the mesh prims, in the order of makehuman objects
+        stage : Usd.Stage
+            Stage in which the meshes exist
+        """
+        human = MHCaller.human
+        catalog = MHCaller.modifier_catalog
+
+        base = self._mesh_coords()
+        # (base, min, max) value of each modifier, used to map values to weights
+        ranges = {}
+        shapes = []
+        for name in modifiers:
+            info = catalog.get(name)
+            if info is None:
+                carb.log_warn(f"No modifier named {name}")
+                continue
+            modifier = human.getModifier(name)
+            value = modifier.getValue()
+            ranges[name] = (value, info.min, info.max)
+
+            for shape_name, target in zip(blendshapes.shape_names(name), (info.max, info.min)):
+                if target == value:
+                    # The modifier is at its limit, so the shape has no effect
+                    empty = (np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.int32))
+                    mesh_offsets = [empty] * len(base)
+                else:
+                    modifier.setValue(target)
+                    human.applyAllTargets()
+                    mesh_offsets = [blendshapes.sparse_offsets(b, t) for b, t in zip(base, self._mesh_coords())]
+                shapes.append((shape_name, mesh_offsets))
+
+            # Restore the modifier
+            modifier.setValue(value)
+        human.applyAllTargets()
+
+        # A merged mesh holds the points of all meshes in order
+        if len(mesh_paths) == 1 and len(base) > 1:
+            starts = np.cumsum([0] + [len(b) for b in base[:-1]])
+            shapes = [(name, [blendshapes.merge_offsets(mesh_offsets, starts)]) for name, mesh_offsets in shapes]
+
+        anim = blendshapes.author_blend_shapes(stage, mesh_paths, self.usd_skel, shapes)
+        # Store the base values on the animation so that weights can be computed from values
+        anim.GetPrim().SetCustomDataByKey("BlendShapeBase", {name: r[0] for name, r in ranges.items()})
+
+    def has_blend_shapes(self, names: List[str]) -> bool:
+        """Whether all the given modifiers are exported as blend shapes in the scene, so that
+        they can be changed with `set_blend_shape_values()`
+
+        Parameters
+        ----------
+        names : List[str]
+            Full names of the modifiers
+
+        Returns
+        -------
+        bool
+            True if the human has blend shapes for every modifier, False otherwise
+        """
+        ranges = self._blend_shape_ranges()
+        return bool(ranges) and all(name in ranges for name in names)
+
+    def set_blend_shape_values(self, values: Dict[str, float]) -> bool:
+        """Set the values of modifiers which have been exported as blend shapes. Only writes
+        blend shape weights, without reimporting the meshes. Modifier values are also stored
+        on the human prim and in makehuman, so later updates keep them.
+
+        Parameters
+        ----------
+        values : Dict[str, float]
+            New modifier values, keyed by full name
+
+        Returns
+        -------
+        bool
+            True if the values were set, False otherwise
+        """
+        ranges = self._blend_shape_ranges()
+        if ranges is None:
+            carb.log_warn("The human has no blend shapes. Use export_blend_shapes() first")
+            return False
+        for name, value in values.items():
+            if name not in ranges:
+                carb.log_warn(f"Modifier {name} has not been exported as a blend shape")
+                return False
+            if not MHCaller.modifier_catalog.validate(name, value):
+                return False
+
+        stage = omni.usd.get_context().get_stage()
+        if not self._is_editable(stage.GetPrimAtPath(self.prim_path)):
+            return False
+        # Humans with their own layer are written to that layer only
+        target_stage, target_path = self._authoring_target(stage.GetPrimAtPath(self.prim_path))
+        prim = target_stage.GetPrimAtPath(target_path)
+        for name, value in values.items():
+            MHCaller.human.getModifier(name).setValue(value)
+            prim.SetCustomDataByKey("Modifiers:" + name, value)
+
+        # Weights depend on the values of all exported modifiers, which are read from the prim
+        written = prim.GetCustomDataByKey("Modifiers") or {}
+        current = {name: written.get(name, r[0]) for name, r in ranges.items()}
+        anim = UsdSkel.Animation(target_stage.GetPrimAtPath(target_path + "/" + blendshapes.ANIMATION_NAME))
+        anim.GetBlendShapeWeightsAttr().Set(Vt.FloatArray(blendshapes.shape_weights(current, ranges)))
+        return True
+
+    def verify_blend_shapes(self, samples: int = 5, tolerance: float = 1e-3) -> Dict[str, float]:
+        """Check blend shapes against makehuman. For each exported modifier, points
+        reconstructed from the meshes and blend shapes in the stage are compared with the
+        points makehuman generates at evenly spaced values of the modifier. Logs a warning
+        for modifiers whose error exceeds the tolerance. The human must be up to date in
+        the scene.
+
+        Parameters
+        ----------
+        samples : int, optional
+            Number of values to check per modifier, by default 5
+        tolerance : float, optional
+            Largest acceptable error in makehuman units, by default 1e-3
+
+        Returns
+        -------
+        Dict[str, float]
+            Largest point error of each modifier, keyed by full name
+        """
+        ranges = self._blend_shape_ranges()
+        if ranges is None:
+            carb.log_warn("The human has no blend shapes. Use export_blend_shapes() first")
+            return {}
+
+        stage = omni.usd.get_context().get_stage()
+        prim = stage.GetPrimAtPath(self.prim_path)
+        names = [shape for name in ranges for shape in blendshapes.shape_names(name)]
+
+        merged = prim.GetChild(MERGED_MESH_NAME)
+        if merged:
+            # The merged mesh holds the points of all makehuman objects in order
+            mesh_prims = [merged]
+        else:
+            children = {child.GetName(): child for child in prim.GetChildren() if child.GetTypeName() == "Mesh"}
+            mesh_prims = [children.get(sanitize(obj.mesh.object.getSeedMesh().name)) for obj in MHCaller.objects]
+            if not all(mesh_prims):
+                carb.log_warn("The meshes in the stage don't match the human. Update the human first")
+                return {}
+
+        # Points and blend shapes of each mesh, in the order of makehuman objects
+        meshes = []
+        for mesh_prim in mesh_prims:
+            points = np.array(mesh_prim.GetAttribute("points").Get(), dtype=np.float32)
+            shapes = []
+            for name in names:
+                shape = UsdSkel.BlendShape(mesh_prim.GetChild(name))
+                offsets = np.array(shape.GetOffsetsAttr().Get(), dtype=np.float32).reshape(-1, 3)
+                indices = np.array(shape.GetPointIndicesAttr().Get(), dtype=np.int64)
+                shapes.append((offsets, indices))
+            meshes.append((points, shapes))
+
+        def expected_coords():
+            coords = self._mesh_coords()
+            return [np.concatenate(coords)] if merged else coords
+
+        human = MHCaller.human
+        errors = {}
+        for name, (base, vmin, vmax) in ranges.items():
+            modifier = human.getModifier(name)
+            error = 0.0
+            for value in np.linspace(vmin, vmax, samples):
+                weights = blendshapes.shape_weights({name: value}, ranges)
+                modifier.setValue(value)
+                human.applyAllTargets()
+                for (points, shapes), expected in zip(meshes, expected_coords()):
+                    result = points.copy()
+                    for weight, (offsets, indices) in zip(weights, shapes):
+                        if weight:
+                            result[indices] += weight * offsets
+                    error = max(error, float(np.abs(result - expected).max()))
+            modifier.setValue(base)
+            errors[name] = error
+            if error > tolerance:
+                carb.log_warn(f"Blend shapes for {name} differ from makehuman by up to {error}")
+        human.applyAllTargets()
+        return errors
+
+    def _blend_shape_ranges(self) -> Union[Dict[str, Tuple[float, float, float]], None]:
+        """(base, min, max) values of each modifier exported as blend shapes, or None if the human
+        has no blend shapes"""
+        if not self.prim:
+            return None
+        stage = omni.usd.get_context().get_stage()
+        anim_prim = stage.GetPrimAtPath(self.prim_path + "/" + blendshapes.ANIMATION_NAME)
+        if not anim_prim.IsValid():
+            return None
+        base = anim_prim.GetCustomDataByKey("BlendShapeBase") or {}
+        catalog = MHCaller.modifier_catalog
+        return {name: (value, catalog.get(name).min, catalog.get(name).max) for name, value in base.items()}
+
+    def _mesh_coords(self) -> List[np.ndarray]:
+        """Coordinates of each makehuman mesh, offset so that the human stands on the ground. These
+        match the points written by `import_meshes()`, including compaction"""
+        objects = MHCaller.objects
+        offset = -1 * objects[0].getJointPosition("ground")
+        coords = []
+        for o in objects:
+            mesh_coords = np.array(o.mesh.getCoords(), dtype=np.float32)
+            mesh_coords += np.asarray(offset, dtype=np.float32)
+            vertex_map = self.vertex_maps.get(sanitize(o.mesh.object.getSeedMesh().name))
+            coords.append(mesh_coords if vertex_map is None else mesh_coords[vertex_map])
+        return coords
 
     def write_properties(self, prim_path: str, stage: Usd.Stage):
         """Writes the properties of the human to the human prim. This includes modifiers and
@@ -462,6 +1308,13 @@ class Human:
         # Add custom data to the prim by key, designating the prim is a human
         prim.SetCustomDataByKey("human", True)
 
+        # Record whether subdivision is left to USD, so the human is updated the same way
+        prim.SetCustomDataByKey("USD_subdivision", self.usd_subdivision)
+        prim.SetCustomDataByKey("Merged_meshes", self.merge_meshes)
+        prim.SetCustomDataByKey("Texture_level", self.texture_level)
+        # Whether faces covered by clothes are hidden, which differs between humans
+        prim.SetCustomDataByKey("Hide_faces", MHCaller.hide_faces)
+
         # Get the modifiers of the human in mhcaller
         modifiers = MHCaller.modifiers
 
@@ -503,9 +1356,18 @@ class Human:
 
         self.prim = usd_prim
 
+        # Humans in their own layer need their payload loaded to read their proxies
+        if self.prim.HasAuthoredPayloads() and not self.prim.IsLoaded():
+            self.prim.Load()
+
         # Get the data from the prim
         humandata = self.prim.GetCustomData()
 
+        # Humans written before the option existed were subdivided by makehuman
+        self.usd_subdivision = bool(humandata.get("USD_subdivision", False))
+        self.merge_meshes = bool(humandata.get("Merged_meshes", False))
+        self.texture_level = int(humandata.get("Texture_level", 0))
+
         # Get the list of modifiers from the prim
         modifiers = humandata.get("Modifiers")
         for m, v in modifiers.items():
@@ -513,9 +1375,14 @@ class Human:
 
         # Gather proxies from the prim children
         proxies = []
-        for child in self.prim.GetChildren():
-            if child.GetTypeName() == "Mesh" and child.GetCustomDataByKey("Proxy_path:"):
-                proxies.append(child)
+        # The proxy body of the "proxy" level of detail is not part of the human
+        lod_proxy = None
+        if lod.has_lods(self.prim) and self.prim.GetVariantSet(lod.LOD_SET).GetVariantSelection() == "proxy":
+            lod_proxy = os.path.abspath(lod.proxy_mesh_path())
+        for child in self._proxy_prims(self.prim):
+            if os.path.abspath(child.GetCustomDataByKey("Proxy_path:")) == lod_proxy:
+                continue
+            proxies.append(child)
 
         # Clear the makehuman proxies
         MHCaller.clear_proxies()
@@ -528,6 +1395,10 @@ class Human:
                 # name = p.GetCustomDataByKey("Proxy_name:")
                 MHCaller.add_proxy(path, type)
 
+        # Hide faces under the clothes as the human was written. Humans written before this
+        # was recorded keep the current setting
+        MHCaller.set_face_hiding(bool(humandata.get("Hide_faces", MHCaller.hide_faces)))
+
         # Update the human in MHCaller
         MHCaller.human.applyAllTargets()
 
@@ -546,49 +1417,59 @@ class Human:
             (breadth-first) order.
         joint_paths : list of str
             List of the full usd path to each joint corresponding to the skeleton to bind to
-        """
-
-         # Generate bone weights for all meshes up front so they can be reused for all
-        rawWeights = MHCaller.human.getVertexWeights(
-            MHCaller.human.getSkeleton()
-        )  # Basemesh weights
-        for mesh in self.mh_meshes:
-            if mesh.object.proxy:
-                # Transfer weights to proxy
-                parentWeights = mesh.object.proxy.getVertexWeights(
-                    rawWeights, MHCaller.human.getSkeleton()
-                )
-            else:
-                parentWeights = rawWeights
-            # Transfer weights to face/vert masked and/or subdivided mesh
-            weights = mesh.getVertexWeights(parentWeights)
 
-            # Attach these vertexWeights to the mesh to pass them around the
-            # exporter easier, the cloned mesh is discarded afterwards, anyway
-            
-            # if this is the same person, just skip updating weights
-            mesh.vertexWeights = weights
+        Returns
+        -------
+        Dict[str, int]
+            Bytes saved on the skinning primvars of each mesh by pruning influences, keyed by
+            mesh prim path
+        """
+        saved = {}
+
+        # Generate bone weights for the body once, as a sparse matrix of shape
+        # (vertices, joints), so they can be reused for all meshes
+        skeleton = MHCaller.human.getSkeleton()
+        rawWeights = MHCaller.human.getVertexWeights(skeleton)  # Basemesh weights
+        transfer = MHCaller.weight_transfer
+        body_weights = transfer.body_weights(
+            rawWeights, joint_names, MHCaller.human.meshData.getVertexCount(excludeMaskedVerts=False)
+        )
+
+        all_weights = []
+        for mh_mesh in mh_meshes:
+            # Transfer weights to proxies and to subdivided meshes
+            mesh_weights = transfer.mesh_weights(mh_mesh, body_weights, rawWeights, skeleton, joint_names)
+
+            # Keep the weights of the vertices written to the compacted mesh
+            vertex_map = self.vertex_maps.get(sanitize(mh_mesh.object.getSeedMesh().name))
+            if vertex_map is not None:
+                mesh_weights = mesh_weights[vertex_map]
+            all_weights.append(mesh_weights)
+
+        # A single binding for several meshes is a merged mesh, which holds the vertices of all
+        # meshes in order
+        if len(bindings) == 1 and len(all_weights) > 1:
+            all_weights = [sparse.vstack(all_weights, format="csr")]
 
         # Iterate through corresponding meshes and bindings
-        for mh_mesh, binding in zip(mh_meshes, bindings):
+        for mesh_weights, binding in zip(all_weights, bindings):
+            path = binding.GetPrim().GetPath().pathString
 
             # Calculate vertex weights
-            indices, weights = self.calculate_influences(mh_mesh, joint_names)
-            # Type conversion to native ints and floats from numpy
-            indices = list(map(int, indices))
-            weights = list(map(float, weights))
-            # Type conversion to USD
-            indices = Vt.IntArray(indices)
-            weights = Vt.FloatArray(weights)
+            indices, weights, elementSize = self.calculate_influences(mesh_weights)
 
-            # The number of weights to apply to each vertex, taken directly from
-            # MakeHuman data
-            elementSize = int(mh_mesh.vertexWeights._nWeights)
-            # weight_data = list(mh_mesh.vertexWeights.data) TODO remove
+            # Joint indices and weights each take 4 bytes per influence
+            full_size = max(int(np.diff(mesh_weights.indptr).max()), 1) if mesh_weights.shape[0] else 1
+            saved[path] = (full_size - elementSize) * mesh_weights.shape[0] * 8
+            if saved[path]:
+                carb.log_info(f"Pruned skin weights of {path} from {full_size} to {elementSize} influences, saving {saved[path]} bytes")
+            # Type conversion to USD
+            indices = Vt.IntArray.FromNumpy(indices)
+            weights = Vt.FloatArray.FromNumpy(weights)
 
-            # We might not need to normalize. Makehuman weights are automatically
-            # normalized when loaded, see:
+            # Makehuman weights are automatically normalized when loaded, see:
             # http://www.makehumancommunity.org/wiki/Technical_notes_on_MakeHuman
+            # but pruned influences must be renormalized
 
             UsdSkel.NormalizeWeights(weights, elementSize)
             UsdSkel.SortInfluences(indices, weights, elementSize)
@@ -611,37 +1492,27 @@ class Human:
 
             weights_attribute.Set(weights)
 
-    def calculate_influences(self, mh_mesh: Object3D, joint_names: List[str]):
+        return saved
+
+    def calculate_influences(self, mesh_weights: sparse.csr_matrix):
         """Build arrays of joint indices and corresponding weights for each vertex.
-        Joints are in USD (breadth-first) order.
+        Joints are in USD (breadth-first) order. Influences are pruned according to
+        `max_influences` and `weight_threshold`.
 
         Parameters
         ----------
-        mh_mesh : Object3D
-            Makehuman-format mesh. Contains weight and vertex data.
-        joint_names : list of str
-            Unique, plaintext names of all joints in the skeleton in USD
-            (breadth-first) order.
+        mesh_weights : scipy.sparse.csr_matrix
+            Weights of a mesh, of shape (vertices, joints)
 
         Returns
         -------
-        indices : list of int
-            Flat list of joint indices for each vertex
-        weights : list of float
-            Flat list of weights corresponding to joint indices
+        indices : np.ndarray
+            Flat array of joint indices for each vertex
+        weights : np.ndarray
+            Flat array of weights corresponding to joint indices
+        elementSize : int
+            The number of weights applied to each vertex
         """
-        # The maximum number of weights a vertex might have
-        max_influences = mh_mesh.vertexWeights._nWeights
-
-        # Named joints corresponding to vertices and weights ie.
-        # {"joint",([indices],[weights])}
-        influence_joints = mh_mesh.vertexWeights.data
-
-        num_verts = mh_mesh.getVertexCount(excludeMaskedVerts=False)
-
-        # all skeleton joints in USD order
-        binding_joints = joint_names
-
         # Corresponding arrays of joint indices and weights of length num_verts.
         # Allots the maximum number of weights for every vertex, and pads any
         # remaining weights with 0's, per USD spec, see:
@@ -649,37 +1520,7 @@ class Human:
         # "If a point has fewer influences than are needed for other points, the
         # unused array elements of that point should be filled with 0, both for
         # joint indices and for weights."
-
-        indices = np.zeros((num_verts, max_influences))
-        weights = np.zeros((num_verts, max_influences))
-
-        # Keep track of the number of joint influences on each vertex
-        influence_counts = np.zeros(num_verts, dtype=int)
-
-        for joint, joint_data in influence_joints.items():
-            # get the index of the joint in our USD-ordered list of all joints
-            joint_index = binding_joints.index(joint)
-            for vert_index, weight in zip(*joint_data):
-
-                # Use influence_count to keep from overwriting existing influences
-                influence_count = influence_counts[vert_index]
-
-                # Add the joint index to our vertex array
-                indices[vert_index][influence_count] = joint_index
-                # Add the weight to the same vertex
-                weights[vert_index][influence_count] = weight
-
-                # Add to the influence count for this vertex
-                influence_counts[vert_index] += 1
-
-        # Check for any unweighted verts (this is a test routine)
-        # for i, d in enumerate(indices): if np.all((d == 0)): print(i)
-
-        # Flatten arrays to one dimensional lists
-        indices = indices.flatten()
-        weights = weights.flatten()
-
-        return indices, weights
+        return influences(mesh_weights, self.max_influences, self.weight_threshold)
 
     def setup_bindings(self, paths: List[Sdf.Path], stage: Usd.Stage, skeleton: UsdSkel.Skeleton):
         """Setup bindings between meshes in the USD scene and the skeleton
@@ -727,7 +1568,7 @@ class Human:
 
         return bindings
     
-    def setup_materials(self, mh_meshes: List['Object3D'], meshes: List[Sdf.Path], root: str, stage: Usd.Stage):
+    def setup_materials(self, mh_meshes: List['Object3D'], meshes: List[Sdf.Path], root: str, stage: Usd.Stage, texture_level: int = 0):
         """Fetches materials from Makehuman meshes and applies them to their corresponding
         Usd mesh prims in the stage.
 
@@ -742,16 +1583,88 @@ class Human:
         stage : Usd.Stage
             Usd stage in which to create materials, and which contains the meshes
             to which to apply materials
+        texture_level : int, optional
+            Resolution of the textures, by default 0 (full resolution)
         """
-        for mh_mesh, mesh in zip(self.mh_meshes, meshes):
-            # Get a texture path and name from the makehuman mesh
-            texture, name = get_mesh_texture(mh_mesh)
+        cache = textures.get_cache()
+        mesh_textures = [get_mesh_texture(mh_mesh) for mh_mesh in self.mh_meshes]
+        # Downscale all textures in parallel
+        cache.prefetch([texture for texture, _ in mesh_textures], [texture_level])
+        for (texture, name), mesh in zip(mesh_textures, meshes):
             if texture:
                 # If we can get a texture from the makehuman mesh, create a material
                 # from it and bind it to the corresponding USD mesh in the stage
-                material = create_material(texture, name, root, stage)
+                material = create_material(texture, textures.level_name(name, texture_level), root, stage)
+                # Downscaled textures replace the source once they are generated
+                cache.bind_variants(material, texture_level)
                 bind_material(mesh, material, stage)
 
+    def setup_atlas(self, mesh_paths: List[Sdf.Path], part_paths: List[Sdf.Path], root: str, stage: Usd.Stage, texture_level: int = 0) -> bool:
+        """Bake the textures of the human and its proxies into atlases, move the UVs of the
+        meshes into the atlas and bind a single material to all meshes. Must run after the
+        meshes are written, since their UVs are rewritten in place.
+
+        Parameters
+        ----------
+        mesh_paths : List[Sdf.Path]
+            Paths to the mesh prims
+        part_paths : List[Sdf.Path]
+            Paths to the prim of each makehuman mesh. These are the meshes, or the subsets of
+            the merged mesh
+        root : str
+            The root path under which to create the material
+        stage : Usd.Stage
+            Stage which holds the meshes
+        texture_level : int, optional
+            Resolution of the atlas, by default 0 (full resolution)
+
+        Returns
+        -------
+        bool
+            Whether the atlas was bound. If False, no UVs were changed
+        """
+        # The body is textured with the skin rather than its makehuman material
+        sources = [{"diffuse": data_path("skins/textures/skin.png")}]
+        sources += [get_mesh_textures(mh_mesh) for mh_mesh in self.mh_meshes[1:]]
+        size = carb.settings.get_settings().get("/exts/siborg.create.human/atlas/size") or atlas.ATLAS_SIZE
+        baked = atlas.bake(sources, size)
+        if baked is None:
+            return False
+
+        for i, mesh_path in enumerate(mesh_paths):
+            mesh = UsdGeom.Mesh(stage.GetPrimAtPath(mesh_path))
+            st = UsdGeom.PrimvarsAPI(mesh).GetPrimvar("st")
+            uvs = np.array(st.Get(), dtype=np.float32)
+            if len(mesh_paths) == 1 and len(part_paths) > 1:
+                # Find the part of each face-varying UV of the merged mesh from its subsets
+                counts = np.array(mesh.GetFaceVertexCountsAttr().Get(), dtype=np.int64)
+                face_parts = np.zeros(len(counts), dtype=np.int64)
+                for part, subset_path in enumerate(part_paths):
+                    face_parts[np.array(UsdGeom.Subset(stage.GetPrimAtPath(subset_path)).GetIndicesAttr().Get(), dtype=np.int64)] = part
+                parts = np.repeat(face_parts, counts)
+            else:
+                parts = i
+            st.Set(Vt.Vec2fArray.FromNumpy(np.ascontiguousarray(baked.remap_uvs(uvs, parts))))
+
+        maps = baked.textures
+        material = create_material(
+            maps["diffuse"],
+            textures.level_name("Atlas_" + baked.key[:16], texture_level),
+            root,
+            stage,
+            normal_image_path=maps.get("normal"),
+            ao_image_path=maps.get("ao"),
+        )
+        # Downscaled atlases replace the full atlases once they are generated
+        textures.get_cache().bind_variants(material, texture_level)
+        for mesh_path in mesh_paths:
+            bind_material(mesh_path, material, stage)
+        # Parts fall back to the binding of their mesh
+        for part_path in part_paths:
+            if part_path not in mesh_paths:
+                UsdShade.MaterialBindingAPI(stage.GetPrimAtPath(part_path)).UnbindDirectBinding()
+        return True
+
     def add_item(self, path: str):
         """Add a new asset to the human. Propagates changes to the Makehuman app
         and then upates the stage with the new asset. If the asset is a proxy,
@@ -772,6 +1685,72 @@ class Human:
         else:
             carb.log_warn("Can't add asset. No human prim selected!")
 
+    def clone(self, new_path: str = None) -> Union[Usd.Prim, None]:
+        """Duplicate the human in the scene by copying its specs, rather than regenerating it
+        through makehuman. Meshes, skeleton, bindings and material bindings are copied with
+        `Sdf.CopySpec`, which remaps relationship targets within the human to the clone. The
+        clone is a regular human, which can be selected and edited like any other. The clone
+        records its source as "Source" custom data, and the source lists its clones as
+        "Clones".
+
+        Parameters
+        ----------
+        new_path : str, optional
+            Path of the clone, by default the next free path beside the human
+
+        Returns
+        -------
+        Union[Usd.Prim, None]
+            The clone's prim, or None if the human couldn't be copied
+        """
+        if not self.prim:
+            carb.log_warn("Can't clone human. No human prim selected!")
+            return None
+
+        stage = omni.usd.get_context().get_stage()
+        layer = stage.GetEditTarget().GetLayer()
+        source_path = Sdf.Path(self.prim_path)
+        if not layer.GetPrimAtPath(source_path):
+            carb.log_warn(f"Can't clone {source_path}. It is not authored in the current edit target")
+            return None
+
+        if new_path is None:
+            new_path = omni.usd.get_stage_next_free_path(stage, self.prim_path, False)
+        new_path = Sdf.Path(new_path)
+        # Ancestors of the clone must exist for the copy to succeed. Missing ancestors are
+        # defined as Xforms, and ancestors defined in other layers get an over in this one
+        parent_path = new_path.GetParentPath()
+        if parent_path != Sdf.Path.absoluteRootPath:
+            for ancestor in parent_path.GetPrefixes():
+                if not stage.GetPrimAtPath(ancestor).IsDefined():
+                    UsdGeom.Xform.Define(stage, ancestor)
+            Sdf.CreatePrimInLayer(layer, parent_path)
+        if not Sdf.CopySpec(layer, source_path, layer, new_path):
+            carb.log_warn(f"Could not copy {source_path} to {new_path}")
+            return None
+
+        prim = stage.GetPrimAtPath(new_path)
+        # Record where the clone came from. Prototype hashes are not copied, since the clone may
+        # be edited
+        prim.SetCustomDataByKey("Source", source_path.pathString)
+        prim.ClearCustomDataByKey("PrototypeHash")
+        # The copied list of clones belongs to the source
+        prim.ClearCustomDataByKey("Clones")
+
+        # Humans in their own layer get a copy of it, so that editing the clone leaves the
+        # source untouched
+        source_layer = layers.layer_of(self.prim)
+        if source_layer is not None:
+            directory = None if source_layer.anonymous else os.path.dirname(source_layer.realPath)
+            clone_layer = layers.create_layer(new_path.pathString.strip("/").replace("/", "_"), directory, stage)
+            clone_layer.TransferContent(source_layer)
+            layers.add_payload(prim, clone_layer)
+
+        # Record the clone on the source, so that its clones can be found
+        clones = list(self.prim.GetCustomDataByKey("Clones") or [])
+        self.prim.SetCustomDataByKey("Clones", clones + [new_path.pathString])
+        return prim
+
     @staticmethod
     def _set_scale(prim : Usd.Prim, scale : float):
         """Set scale of a prim.
@@ -0,0 +1,408 @@
+from typing import Dict, List, Union
+import os
+import numpy as np
+import carb
+import omni.usd
+from pxr import Usd, UsdGeom, Sdf, Gf, Vt
+from .bounds import find_humans, human_bounds
+
+# Path of the human's SkelRoot within its own layer. The payload maps it to the human prim
+HUMAN_ROOT = "/Human"
+# Name of the box shown in place of a human while its payload is unloaded
+STAND_IN_NAME = "StandIn"
+STAND_IN_COLOR = Gf.Vec3f(0.6, 0.6, 0.65)
+
+# Human layers by identifier, so that edits go through the same layer while it is loaded. Keeps
+# anonymous layers alive while their payloads are unloaded, since they can't be reopened
+_layers: Dict[str, Sdf.Layer] = {}
+# Stages opened on human layers, used to author into them
+_stages: Dict[str, Usd.Stage] = {}
+
+
+def layer_directory(stage: Usd.Stage) -> Union[str, None]:
+    """Default directory for the layers of a stage's humans, next to the stage's root layer
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+
+    Returns
+    -------
+    Union[str, None]
+        "<stage name>_humans" beside the root layer, or None if the stage hasn't been saved
+    """
+    root = stage.GetRootLayer()
+    if root.anonymous or not root.realPath:
+        return None
+    stem = os.path.splitext(os.path.basename(root.realPath))[0]
+    return os.path.join(os.path.dirname(root.realPath), stem + "_humans")
+
+
+def create_layer(name: str, directory: str = None, stage: Usd.Stage = None, prim: Usd.Prim = None) -> Sdf.Layer:
+    """Create a layer to hold a human's data. Humans of stages which haven't been saved get an
+    anonymous layer, which is written next to the stage when it is saved, see `save()`. Files
+    which already exist are left as they are, and the layer gets a numbered name instead,
+    unless the file is the layer already recorded on the human prim.
+
+    Parameters
+    ----------
+    name : str
+        Name of the human
+    directory : str, optional
+        Directory to write the layer to, by default a directory next to the root layer of
+        the stage
+    stage : Usd.Stage, optional
+        Stage which holds the human, used to find the default directory, by default None
+    prim : Usd.Prim, optional
+        Human prim, whose recorded layer may be cleared and reused, by default None
+
+    Returns
+    -------
+    Sdf.Layer
+        The new, empty layer
+    """
+    directory = directory or (layer_directory(stage) if stage else None)
+    if directory:
+        owned = layer_of(prim) if prim is not None and prim.GetCustomDataByKey("Layer") else None
+        os.makedirs(directory, exist_ok=True)
+        path = _free_path(directory, name, owned)
+        layer = Sdf.Layer.FindOrOpen(path) or Sdf.Layer.CreateNew(path)
+        # Humans are always rewritten from makehuman
+        layer.Clear()
+    else:
+        layer = Sdf.Layer.CreateAnonymous(name + ".usd")
+    layer.defaultPrim = HUMAN_ROOT.lstrip("/")
+    _layers[layer.identifier] = layer
+    return layer
+
+
+def _free_path(directory: str, name: str, owned: Sdf.Layer = None) -> str:
+    """Path of a layer file in the directory which doesn't overwrite another file. The file of
+    the owned layer may be reused"""
+    path = os.path.join(directory, name + ".usd")
+    index = 1
+    while os.path.exists(path) or Sdf.Layer.Find(path):
+        if owned is not None and owned.realPath and os.path.normcase(os.path.abspath(owned.realPath)) == os.path.normcase(os.path.abspath(path)):
+            break
+        path = os.path.join(directory, f"{name}_{index}.usd")
+        index += 1
+    return path
+
+
+def asset_path(layer: Sdf.Layer, anchor: Sdf.Layer) -> str:
+    """Path to a human layer to author in another layer. Paths are relative to that layer when
+    both are files, so that a stage can be moved or shared along with its human layers
+
+    Parameters
+    ----------
+    layer : Sdf.Layer
+        The human's layer
+    anchor : Sdf.Layer
+        Layer in which the path is authored
+
+    Returns
+    -------
+    str
+        Relative path, or the layer's identifier if it can't be relative
+    """
+    if layer.anonymous or anchor.anonymous or not anchor.realPath:
+        return layer.identifier
+    try:
+        relative = os.path.relpath(layer.realPath, os.path.dirname(anchor.realPath)).replace(os.sep, "/")
+    except ValueError:
+        # The layers are on different drives
+        return layer.identifier
+    return relative if relative.startswith("../") else "./" + relative
+
+
+def resolve(path: str, stage: Usd.Stage = None) -> str:
+    """Identifier of a human layer recorded on a human prim, resolving relative paths through
+    the root layer of the stage
+
+    Parameters
+    ----------
+    path : str
+        Path recorded on the human prim
+    stage : Usd.Stage, optional
+        Stage which holds the human, by default None
+
+    Returns
+    -------
+    str
+        Identifier of the layer
+    """
+    if stage is None or Sdf.Layer.IsAnonymousLayerIdentifier(path) or os.path.isabs(path):
+        return path
+    return Sdf.ComputeAssetPathRelativeToLayer(stage.GetRootLayer(), path)
+
+
+def find_layer(identifier: str, stage: Usd.Stage = None) -> Union[Sdf.Layer, None]:
+    """Find a human layer by identifier, opening it from disk if needed
+
+    Parameters
+    ----------
+    identifier : str
+        Identifier of the layer, or its path relative to the root layer of the stage
+    stage : Usd.Stage, optional
+        Stage to resolve relative paths through, by default None
+
+    Returns
+    -------
+    Union[Sdf.Layer, None]
+        The layer, or None if it can't be found
+    """
+    identifier = resolve(identifier, stage)
+    layer = _layers.get(identifier) or Sdf.Layer.FindOrOpen(identifier)
+    if layer is None:
+        carb.log_warn(f"Could not find the layer {identifier}")
+        return None
+    _layers[layer.identifier] = layer
+    return layer
+
+
+def layer_of(prim: Usd.Prim) -> Union[Sdf.Layer, None]:
+    """The layer which holds a human's data, or None if the human is authored in the stage itself
+
+    Parameters
+    ----------
+    prim : Usd.Prim
+        Human prim
+
+    Returns
+    -------
+    Union[Sdf.Layer, None]
+        The human's layer
+    """
+    identifier = prim.GetCustomDataByKey("Layer")
+    return find_layer(identifier, prim.GetStage()) if identifier else None
+
+
+def authoring_stage(layer: Sdf.Layer) -> Usd.Stage:
+    """Stage on which to author a human's layer. Edits through it only change that layer.
+
+    Parameters
+    ----------
+    layer : Sdf.Layer
+        The human's layer
+
+    Returns
+    -------
+    Usd.Stage
+        Stage whose root layer is the human's layer
+    """
+    stage = _stages.get(layer.identifier)
+    if stage is None:
+        stage = Usd.Stage.Open(layer, Usd.Stage.LoadAll)
+        _stages[layer.identifier] = stage
+    return stage
+
+
+def add_payload(prim: Usd.Prim, layer: Sdf.Layer):
+    """Bring a human's layer into the stage as a payload on the human prim, and record the
+    layer on the prim so that updates can be written to it. The payload is relative to the
+    layer it is authored in, and the recorded path to the stage's root layer
+
+    Parameters
+    ----------
+    prim : Usd.Prim
+        Human prim
+    layer : Sdf.Layer
+        The human's layer
+    """
+    stage = prim.GetStage()
+    prim.GetPayloads().ClearPayloads()
+    prim.GetPayloads().AddPayload(Sdf.Payload(asset_path(layer, stage.GetEditTarget().GetLayer()), HUMAN_ROOT))
+    prim.SetCustomDataByKey("Layer", asset_path(layer, stage.GetRootLayer()))
+
+
+def author_stand_in(prim: Usd.Prim, layer_stage: Usd.Stage):
+    """Author a box in place of a human, so that it can be seen and selected while its payload
+    is unloaded. The human's extent is copied to the prim, so that it can be bounded without
+    loading it. The payload hides the box once it is loaded. Authored once, when the payload
+    is added, so that updating the human only changes its own layer.
+
+    Parameters
+    ----------
+    prim : Usd.Prim
+        Human prim, which has the human's layer as a payload
+    layer_stage : Usd.Stage
+        Stage on which the human's layer is authored
+    """
+    extent = UsdGeom.Boundable(layer_stage.GetPrimAtPath(HUMAN_ROOT)).GetExtentAttr().Get()
+    if not extent:
+        return
+    UsdGeom.Boundable(prim).CreateExtentAttr().Set(extent)
+
+    lower, upper = np.array(extent, dtype=np.float64)
+    cube = UsdGeom.Cube.Define(prim.GetStage(), prim.GetPath().AppendChild(STAND_IN_NAME))
+    cube.CreateSizeAttr().Set(1.0)
+    cube.CreateExtentAttr().Set(Vt.Vec3fArray([Gf.Vec3f(-0.5), Gf.Vec3f(0.5)]))
+    cube.CreateDisplayColorAttr().Set(Vt.Vec3fArray([STAND_IN_COLOR]))
+    xform = UsdGeom.XformCommonAPI(cube)
+    xform.SetTranslate(Gf.Vec3d(*((lower + upper) / 2).tolist()))
+    xform.SetScale(Gf.Vec3f(*(upper - lower).tolist()))
+
+    # Opinions in the payload apply only while it is loaded
+    over = layer_stage.OverridePrim(Sdf.Path(HUMAN_ROOT).AppendChild(STAND_IN_NAME))
+    UsdGeom.Imageable(over).CreateVisibilityAttr().Set(UsdGeom.Tokens.invisible)
+
+
+def _release(layer: Union[Sdf.Layer, None]):
+    """Save a file-backed human layer and stop holding on to it. Anonymous layers are kept, since
+    they can't be reopened."""
+    if layer and not layer.anonymous:
+        if layer.dirty:
+            layer.Save()
+        _stages.pop(layer.identifier, None)
+        _layers.pop(layer.identifier, None)
+
+
+def unload(prim: Usd.Prim):
+    """Unload a human's payload. File-backed layers are saved first and then released, so that
+    they no longer take up memory. Anonymous layers are kept, since they can't be reopened.
+
+    Parameters
+    ----------
+    prim : Usd.Prim
+        Human prim
+    """
+    layer = layer_of(prim)
+    prim.Unload()
+    _release(layer)
+
+
+def load_region(stage: Usd.Stage, region: Gf.Range3d, unload_outside: bool = False) -> List[str]:
+    """Load the humans whose bounds overlap a world-space region. Bounds are read from the extents
+    authored on the human prims, so unloaded humans don't have to be loaded to test them. All
+    payloads are loaded and unloaded in one batch.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+    region : Gf.Range3d
+        World-space region in which to load humans
+    unload_outside : bool, optional
+        Whether to unload the humans outside of the region, by default False
+
+    Returns
+    -------
+    List[str]
+        Paths of the humans in the region
+    """
+    # The default predicate skips unloaded prims
+    predicate = Usd.PrimIsActive & Usd.PrimIsDefined & ~Usd.PrimIsAbstract
+    humans = [prim for prim in find_humans(stage, predicate) if prim.HasAuthoredPayloads()]
+    boxes = human_bounds(stage, prims=humans)
+
+    inside, load, unload = [], [], []
+    for prim in humans:
+        box = boxes.get(prim.GetPath().pathString)
+        if box is not None and not Gf.Range3d.GetIntersection(box, region).IsEmpty():
+            inside.append(prim.GetPath().pathString)
+            if not prim.IsLoaded():
+                load.append(prim.GetPath())
+        elif unload_outside and prim.IsLoaded():
+            unload.append(prim.GetPath())
+
+    released = [layer_of(stage.GetPrimAtPath(path)) for path in unload]
+    if load or unload:
+        stage.LoadAndUnload(load, unload)
+    for layer in released:
+        _release(layer)
+    return inside
+
+
+def open_stage(url: str, on_finish_fn=None) -> bool:
+    """Open a stage in the current context without loading any payloads, so that stages with
+    many humans open quickly. Humans are shown by their stand-ins until they are selected or
+    loaded with `load_region()`. Payloads of other assets are not loaded either.
+
+    Parameters
+    ----------
+    url : str
+        Path of the stage to open
+    on_finish_fn : optional
+        Called once the stage is opened, by default None
+
+    Returns
+    -------
+    bool
+        Whether the stage began opening
+    """
+    return omni.usd.get_context().open_stage(
+        url, on_finish_fn, load_set=omni.usd.UsdContextInitialLoadSet.LOAD_NONE
+    )
+
+
+def save(stage: Usd.Stage) -> List[str]:
+    """Save the layers of the humans in a stage which have unsaved changes. Called when the
+    stage is saved. Anonymous layers are written next to the stage, and the payloads of their
+    humans are pointed at the new files, so that they can be reopened with the stage. Layers
+    without changes are left as they are.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+
+    Returns
+    -------
+    List[str]
+        Identifiers of the layers which were saved
+    """
+    directory = layer_directory(stage)
+    saved = []
+    moved = False
+    # Unloaded humans were saved when they were unloaded, so only loaded humans are checked
+    for prim in find_humans(stage):
+        identifier = prim.GetCustomDataByKey("Layer")
+        layer = _layers.get(resolve(identifier, stage)) if identifier else None
+        if layer is None:
+            continue
+        if layer.anonymous:
+            if not directory:
+                continue
+            layer = _persist(prim, layer, directory)
+            moved = True
+        elif not layer.dirty:
+            continue
+        layer.Save()
+        saved.append(layer.identifier)
+
+    # The payloads were changed after the stage was written
+    edited = stage.GetEditTarget().GetLayer()
+    if moved and not edited.anonymous and edited.dirty:
+        edited.Save()
+    return saved
+
+
+def _persist(prim: Usd.Prim, layer: Sdf.Layer, directory: str) -> Sdf.Layer:
+    """Move a human's anonymous layer to a file in the given directory, and point the human's
+    payload at it
+
+    Parameters
+    ----------
+    prim : Usd.Prim
+        Human prim
+    layer : Sdf.Layer
+        The human's anonymous layer
+    directory : str
+        Directory to write the layer to
+
+    Returns
+    -------
+    Sdf.Layer
+        The file-backed layer
+    """
+    name = prim.GetPath().pathString.strip("/").replace("/", "_")
+    os.makedirs(directory, exist_ok=True)
+    persisted = Sdf.Layer.CreateNew(_free_path(directory, name))
+    persisted.TransferContent(layer)
+
+    _layers.pop(layer.identifier, None)
+    _stages.pop(layer.identifier, None)
+    _layers[persisted.identifier] = persisted
+    add_payload(prim, persisted)
+    return persisted
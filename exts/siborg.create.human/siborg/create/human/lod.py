@@ -0,0 +1,218 @@
+from typing import Dict, List, Sequence, Tuple
+from contextlib import contextmanager
+import numpy as np
+import carb
+import carb.settings
+from pxr import Usd, Sdf, Gf
+from .mhcaller import MHCaller
+import mh
+from .bounds import human_bounds
+
+# Name of the variant set which holds the levels of detail of a human
+LOD_SET = "LOD"
+# Levels of detail, from most to least detailed. "full" is the human as it is normally written,
+# "cage" is the unsubdivided base mesh, and "proxy" replaces the body with a low-poly proxy mesh
+LODS = ("full", "cage", "proxy")
+# Proxy mesh used for the "proxy" level, relative to makehuman's system data
+DEFAULT_PROXY_MESH = "proxymeshes/proxy741/proxy741.proxy"
+# Distances from the camera at which humans switch to the next level of detail
+DEFAULT_DISTANCES = (1000.0, 3000.0)
+# Texture level of each level of detail. See `textures.TextureCache`
+DEFAULT_TEXTURE_LEVELS = (0, 1, 2)
+
+
+def proxy_mesh_path() -> str:
+    """Path to the proxy mesh used for the "proxy" level of detail, read from the extension
+    settings
+
+    Returns
+    -------
+    str
+        Absolute path to the proxy file
+    """
+    path = carb.settings.get_settings().get("/exts/siborg.create.human/lod/proxy_mesh") or DEFAULT_PROXY_MESH
+    return mh.getSysDataPath(path)
+
+
+def texture_level(level: str) -> int:
+    """Texture level used by a level of detail, read from the extension settings
+
+    Parameters
+    ----------
+    level : str
+        Level of detail, one of LODS
+
+    Returns
+    -------
+    int
+        Texture level. Each level halves the resolution of the textures
+    """
+    levels = carb.settings.get_settings().get("/exts/siborg.create.human/lod/texture_levels") or DEFAULT_TEXTURE_LEVELS
+    index = LODS.index(level)
+    return int(levels[index]) if index < len(levels) else 0
+
+
+@contextmanager
+def level_state(level: str, usd_subdivision: bool):
+    """Configure makehuman to write a level of detail, and restore it afterwards
+
+    Parameters
+    ----------
+    level : str
+        Level of detail, one of LODS
+    usd_subdivision : bool
+        Whether the "full" level leaves subdivision to USD, as set on the human
+    """
+    human = MHCaller.human
+    subdivided = human.isSubdivided()
+    body_proxy = human.getProxy()
+    try:
+        if level == "full":
+            MHCaller.set_subdivided(not usd_subdivision)
+        else:
+            MHCaller.set_subdivided(False)
+        if level == "proxy" and body_proxy is None:
+            # Clothes and other proxies stay on the proxy body
+            MHCaller.add_proxy(proxy_mesh_path(), "proxymeshes")
+            MHCaller.set_subdivided(False)
+        yield
+    finally:
+        if level == "proxy" and body_proxy is None and human.getProxy() is not None:
+            MHCaller.remove_proxy(human.getProxy())
+        MHCaller.set_subdivided(subdivided)
+
+
+def has_lods(prim: Usd.Prim) -> bool:
+    """Whether a human was written with levels of detail
+
+    Parameters
+    ----------
+    prim : Usd.Prim
+        Human prim
+
+    Returns
+    -------
+    bool
+        Whether the prim has the LOD variant set
+    """
+    return prim.GetVariantSets().HasVariantSet(LOD_SET)
+
+
+def clear_level(stage: Usd.Stage, prim_path: str, level: str):
+    """Remove the prims written in a level of detail, so that it can be rewritten without
+    leaving prims of removed proxies behind
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the human
+    prim_path : str
+        Path to the human's SkelRoot
+    level : str
+        Level of detail to clear
+    """
+    layer = stage.GetEditTarget().GetLayer()
+    spec = layer.GetPrimAtPath(Sdf.Path(prim_path).AppendVariantSelection(LOD_SET, level))
+    if spec:
+        for child in list(spec.nameChildren):
+            spec.RemoveNameChild(child)
+
+
+def set_lods(stage: Usd.Stage, levels: Dict[str, str]) -> int:
+    """Select the levels of detail of many humans at once. Selections are authored with the Sdf
+    API in a single change block, so the stage recomposes once. Humans which already have the
+    level selected are skipped.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+    levels : Dict[str, str]
+        Level of detail to select, keyed by human prim path
+
+    Returns
+    -------
+    int
+        Number of humans whose level changed
+    """
+    edit_target = stage.GetEditTarget()
+    layer = edit_target.GetLayer()
+    changed = []
+    for path, level in levels.items():
+        if level not in LODS:
+            carb.log_warn(f"Unknown level of detail {level}")
+            continue
+        prim = stage.GetPrimAtPath(path)
+        if prim and prim.GetVariantSet(LOD_SET).GetVariantSelection() != level:
+            changed.append((path, level))
+
+    with Sdf.ChangeBlock():
+        for path, level in changed:
+            spec = Sdf.CreatePrimInLayer(layer, edit_target.MapToSpecPath(Sdf.Path(path)))
+            spec.variantSelections[LOD_SET] = level
+    return len(changed)
+
+
+def lods_by_distance(
+    stage: Usd.Stage, camera: Gf.Vec3d, distances: Sequence[float] = None, paths: List[str] = None
+) -> Dict[str, str]:
+    """Choose a level of detail for each human from its distance to the camera. Distances are
+    measured to the center of each human's bounds.
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+    camera : Gf.Vec3d
+        World-space position of the camera
+    distances : Sequence[float], optional
+        Distance at which each level switches to the next. Read from the extension settings
+        by default
+    paths : List[str], optional
+        Paths of the humans to choose levels for, by default all loaded humans with levels of
+        detail
+
+    Returns
+    -------
+    Dict[str, str]
+        Level of detail, keyed by human prim path
+    """
+    if distances is None:
+        distances = carb.settings.get_settings().get("/exts/siborg.create.human/lod/distances") or DEFAULT_DISTANCES
+    distances = sorted(distances)[: len(LODS) - 1]
+
+    bounds = human_bounds(stage)
+    if paths is None:
+        paths = [path for path in bounds if has_lods(stage.GetPrimAtPath(path))]
+    paths = [path for path in paths if path in bounds]
+    if not paths:
+        return {}
+
+    centers = np.array([bounds[path].GetMidpoint() for path in paths], dtype=np.float64)
+    d = np.linalg.norm(centers - np.array(camera, dtype=np.float64), axis=1)
+    indices = np.searchsorted(np.asarray(distances, dtype=np.float64), d)
+    return {path: LODS[i] for path, i in zip(paths, indices)}
+
+
+def update_lods(stage: Usd.Stage, camera: Gf.Vec3d, distances: Sequence[float] = None) -> Tuple[Dict[str, str], int]:
+    """Select the level of detail of every human from its distance to the camera
+
+    Parameters
+    ----------
+    stage : Usd.Stage
+        Stage which holds the humans
+    camera : Gf.Vec3d
+        World-space position of the camera
+    distances : Sequence[float], optional
+        Distance at which each level switches to the next. Read from the extension settings
+        by default
+
+    Returns
+    -------
+    levels : Dict[str, str]
+        Level of detail of each human, keyed by prim path
+    changed : int
+        Number of humans whose level changed
+    """
+    levels = lods_by_distance(stage, camera, distances)
+    return levels, set_lods(stage, levels)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from module3d import Object3D
 from pxr import Usd, UsdGeom, UsdShade, Sdf
 
@@ -27,7 +27,30 @@ def get_mesh_texture(mh_mesh: Object3D):
         return (None, None)
 
 
-def create_material(diffuse_image_path: str, name: str, root_path: str, stage: Usd.Stage):
+def get_mesh_textures(mh_mesh: Object3D) -> Dict[str, str]:
+    """Gets the diffuse, normal and ambient occlusion textures of a Makehuman mesh object
+
+    Parameters
+    ----------
+    mh_mesh : Object3D
+        A Makehuman mesh object. Contains path to bound material/textures
+
+    Returns
+    -------
+    Dict[str, str]
+        Path to each texture on disk, keyed by "diffuse", "normal" and "ao". Textures
+        the material doesn't have are left out
+    """
+    material = mh_mesh.material
+    textures = {
+        "diffuse": material.diffuseTexture,
+        "normal": getattr(material, "normalMapTexture", None),
+        "ao": getattr(material, "aoMapTexture", None),
+    }
+    return {kind: path for kind, path in textures.items() if path}
+
+
+def create_material(diffuse_image_path: str, name: str, root_path: str, stage: Usd.Stage, normal_image_path: str = None, ao_image_path: str = None):
     """Create OmniPBR Material with specified diffuse texture
 
     Parameters
@@ -40,6 +63,10 @@ def create_material(diffuse_image_path: str, name: str, root_path: str, stage: U
         Root path under which to place material scope
     stage : Usd.Stage
         USD stage into which to add the material
+    normal_image_path : str, optional
+        Path to normal map on disk, by default None
+    ao_image_path : str, optional
+        Path to ambient occlusion map on disk, by default None
 
     Returns
     -------
@@ -77,6 +104,17 @@ def create_material(diffuse_image_path: str, name: str, root_path: str, stage: U
     diffTexIn.Set(diffuse_image_path)
     diffTexIn.GetAttr().SetColorSpace("sRGB")
 
+    # Normal and ambient occlusion maps hold data rather than colors
+    if normal_image_path:
+        normalTexIn = shader.CreateInput("normalmap_texture", Sdf.ValueTypeNames.Asset)
+        normalTexIn.Set(normal_image_path)
+        normalTexIn.GetAttr().SetColorSpace("raw")
+    if ao_image_path:
+        aoTexIn = shader.CreateInput("ao_texture", Sdf.ValueTypeNames.Asset)
+        aoTexIn.Set(ao_image_path)
+        aoTexIn.GetAttr().SetColorSpace("raw")
+        shader.CreateInput("ao_to_diffuse", Sdf.ValueTypeNames.Float).Set(1.0)
+
     # Set Diffuse value. TODO make default color NVIDIA Green
     # diffTintIn = shader.CreateInput("diffuse_tint", Sdf.ValueTypeNames.Color3f)
     # diffTintIn.Set((0.9, 0.9, 0.9))
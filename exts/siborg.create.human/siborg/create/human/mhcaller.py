@@ -22,7 +22,11 @@ import proxy, gui3d, events3d, targets
 from getpath import findFile
 import numpy as np
 import carb
+import carb.settings
 from .shared import data_path
+from .catalog import ModifierCatalog
+from .fitting import ProxyFitter
+from .weights import WeightTransfer
 
 
 class classproperty:
@@ -48,10 +52,25 @@ class MHCaller:
     human : Human
         Makehuman Human object. Encapsulates all human data (parameters, available)
         modifiers, skeletons, meshes, assets, etc) and functions.
+    modifier_catalog : ModifierCatalog
+        Precomputed labels, ranges and images of all the modifiers loaded on the human
+    fitter : ProxyFitter
+        Fits all proxies attached to the human to the body at once
+    weight_transfer : WeightTransfer
+        Computes skin weights of the body and proxies as sparse matrices
+    hide_faces : bool
+        Whether faces of the body and of inner clothing layers covered by clothes are hidden
+    delete_verts : Dict[str, np.ndarray]
+        Indices of the body vertices each clothing proxy hides, keyed by proxy uuid
     """
 
     G = G
     human = None
+    modifier_catalog = None
+    fitter = ProxyFitter()
+    weight_transfer = WeightTransfer()
+    hide_faces = False
+    delete_verts = {}
 
     def __init__(cls):
         """Constructs an instance of MHCaller. This involves setting up the
@@ -59,6 +78,8 @@ class MHCaller:
         This includes app globals (G) and the human object."""
         cls._config_mhapp()
         cls.init_human()
+        cls.init_catalog()
+        cls.hide_faces = bool(carb.settings.get_settings().get("/exts/siborg.create.human/hide_faces"))
 
     def __new__(cls):
         """Singleton pattern. Only one instance of MHCaller can exist at a time."""
@@ -81,16 +102,21 @@ class MHCaller:
         cls.human_mapper = {}
 
     @classmethod
-    def reset_human(cls):
+    def reset_human(cls, subdivided: bool = True):
         """Resets the human object to its initial state. This involves setting the
         human's name to its default, resetting all modifications, and resetting all
         proxies. Does not reset the skeleton. Also flags the human as having been
         reset so that the new name can be created when adding to the Usd stage.
+
+        Parameters
+        ----------
+        subdivided : bool, optional
+            Whether makehuman should subdivide the human mesh, by default True
         """
         cls.human.resetMeshValues()
 
         # Subdivide the human mesh. This also means that any proxies added to the human are subdivided
-        cls.human.setSubdivided(True)
+        cls.human.setSubdivided(subdivided)
         # Restore eyes
         # cls.add_proxy(data_path("eyes/high-poly/high-poly.mhpxy"), "eyes")
         # Reset skeleton to the game skeleton
@@ -103,6 +129,22 @@ class MHCaller:
         # http://static.makehumancommunity.org/makehuman/docs/professional_mesh_topology.html
         cls.human.setAge(cls.human.getAge())
 
+    @classmethod
+    def set_subdivided(cls, subdivided: bool):
+        """Sets whether makehuman subdivides the human and all of its proxies. Proxies
+        added afterwards follow the human's setting.
+
+        Parameters
+        ----------
+        subdivided : bool
+            Whether the meshes should be subdivided
+        """
+        cls.human.setSubdivided(subdivided)
+        # Makehuman relies on GUI plugins to propagate the setting to proxies, so
+        # we have to set it on each proxy object explicitly
+        for obj in cls.human.getObjects()[1:]:
+            obj.setSubdivided(subdivided)
+
     @classmethod
     def init_human(cls):
         """Initialize the human and set some required files from disk. This
@@ -136,6 +178,24 @@ class MHCaller:
         # Set the game skeleton
         cls.human.setSkeleton(cls.game_skel)
 
+    @classmethod
+    def init_catalog(cls, rebuild: bool = False):
+        """Load the catalog of modifier metadata for the human, building and caching it
+        if it does not exist for the installed makehuman version. Must be run after
+        the human's modifiers are loaded.
+
+        Parameters
+        ----------
+        rebuild : bool, optional
+            Rebuild the catalog even if the cached one is up to date, by default False.
+            Needed after editing targets inside subdirectories of makehuman's targets
+            directory, which the cache doesn't detect
+        """
+        if rebuild:
+            cls.modifier_catalog = ModifierCatalog.rebuild(cls.human)
+        else:
+            cls.modifier_catalog = ModifierCatalog.load_or_build(cls.human)
+
     @classproperty
     def objects(cls):
         """List of objects attached to the human.
@@ -193,12 +253,14 @@ class MHCaller:
         # For every mesh object except for the human (first object), update the
         # mesh and corresponding proxy
         # See https://github.com/makehumancommunity/makehuman/search?q=adaptproxytohuman
-        for obj in cls.human.getObjects()[1:]:
+        objects = cls.human.getObjects()[1:]
+        # Fit all proxies to the posed human at once. Equivalent to calling
+        # pxy.update(mesh, fit_to_posed=True) for each proxy
+        coords = cls.fitter.fit([obj.getProxy() for obj in objects], cls.human.meshData.coord)
+        for obj, coord in zip(objects, coords):
             mesh = obj.getSeedMesh()
-            pxy = obj.getProxy()
-            # Update the proxy and fit to posed human
-            # args are (mesh, fit_to_posed = false) by default
-            pxy.update(mesh, True)
+            mesh.changeCoords(coord)
+            mesh.calcNormals()
             # Update the mesh
             mesh.update()
 
@@ -230,16 +292,6 @@ class MHCaller:
         # TODO Can this next line be deleted? The app isn't running
         gui3d.app.addObject(obj)
 
-        # Fit the proxy mesh to the human
-        mesh2 = obj.getSeedMesh()
-        fit_to_posed = True
-        pxy.update(mesh2, fit_to_posed)
-        mesh2.update()
-
-        # Set the object to be subdivided if the human is subdivided
-        obj.setSubdivided(cls.human.isSubdivided())
-
-
         # Set/add proxy based on type
         if proxy_type == "eyes":
             cls.human.setEyesProxy(pxy)
@@ -255,16 +307,22 @@ class MHCaller:
             # Body proxies (musculature, etc)
             cls.human.setProxy(pxy)
 
+        # Fit the proxy to the posed human along with the others, through the shared fitter
+        cls.update()
+
+        # Set the object to be subdivided if the human is subdivided
+        obj.setSubdivided(cls.human.isSubdivided())
+
         vertsMask = np.ones(cls.human.meshData.getVertexCount(), dtype=bool)
         proxyVertMask = proxy.transferVertexMaskToProxy(vertsMask, pxy)
         # Apply accumulated mask from previous layers on this proxy
         obj.changeVertexMask(proxyVertMask)
 
-        # Delete masked vertices
-        # TODO add toggle for this feature in UI
-        # verts = np.argwhere(pxy.deleteVerts)[..., 0]
-        # vertsMask[verts] = False
-        # cls.human.changeVertexMask(vertsMask)
+        # Record the body vertices the proxy covers, and hide them along with those of
+        # the other clothes
+        if proxy_type == "clothes" and pxy.deleteVerts is not None:
+            cls.delete_verts[pxy.uuid] = np.argwhere(pxy.deleteVerts)[..., 0]
+            cls.update_vertex_masks()
 
     Proxy = TypeVar("Proxy")
 
@@ -294,12 +352,107 @@ class MHCaller:
             # Body proxies (musculature, etc)
             cls.human.setProxy(None)
 
+        # Show the faces the proxy was hiding
+        if cls.delete_verts.pop(proxy.uuid, None) is not None:
+            cls.update_vertex_masks()
+
+    @classmethod
+    def set_face_hiding(cls, enabled: bool):
+        """Sets whether faces covered by clothes are hidden. Hidden faces are not written to
+        the stage, which reduces the number of polygons that are stored and shaded without
+        ever being visible.
+
+        Parameters
+        ----------
+        enabled : bool
+            Whether covered faces should be hidden
+        """
+        cls.hide_faces = enabled
+        cls.update_vertex_masks()
+
+    @classmethod
+    def update_vertex_masks(cls):
+        """Combine the vertices hidden by each clothing proxy into the vertex mask of the
+        body. Clothing layers are masked as well, by the layers above them, as makehuman
+        does when faces are hidden in its GUI."""
+        vertsMask = np.ones(cls.human.meshData.getVertexCount(), dtype=bool)
+        objects = {obj.proxy.uuid: obj for obj in cls.human.getObjects()[1:] if obj.proxy}
+        clothes = [p for p in cls.proxies if p.type and p.type.lower() == "clothes"]
+        # Outermost layers first, so that each layer is masked by the layers covering it
+        for pxy in sorted(clothes, key=lambda p: p.z_depth, reverse=True):
+            obj = objects.get(pxy.uuid)
+            if obj is None:
+                continue
+            if cls.hide_faces:
+                obj.changeVertexMask(proxy.transferVertexMaskToProxy(vertsMask, pxy))
+                verts = cls.delete_verts.get(pxy.uuid)
+                if verts is not None:
+                    vertsMask[verts] = False
+            else:
+                obj.changeVertexMask(None)
+        cls.human.changeVertexMask(vertsMask if cls.hide_faces else None)
+
+    @classmethod
+    def polycount(cls):
+        """Number of faces of the human and its proxies, with and without hidden faces
+
+        Returns
+        -------
+        total : int
+            Number of faces of all meshes
+        visible : int
+            Number of faces which are not hidden
+        """
+        # Proxies are already fitted, so skip the update done by `meshes`
+        meshes = [o.mesh for o in cls.human.getObjects()]
+        total = sum(len(mesh.fvert) for mesh in meshes)
+        visible = sum(int(np.count_nonzero(mesh.face_mask)) for mesh in meshes)
+        return total, visible
+
     @classmethod
     def clear_proxies(cls):
         """Removes all proxies from the human"""
         for pxy in cls.proxies:
             cls.remove_proxy(pxy)
 
+    @classmethod
+    def save_state(cls) -> dict:
+        """Record the state of the human, so that it can be put back with `restore_state()`
+        after the human is used to generate others
+
+        Returns
+        -------
+        dict
+            Modifier values, proxies, skeleton, subdivision and face hiding of the human
+        """
+        return {
+            # Every modifier, since others may be changed before the state is restored
+            "modifiers": {m.fullName: m.getValue() for m in cls.human.modifiers},
+            "proxies": [(p.file, p.type) for p in cls.proxies],
+            "skeleton": cls.human.getSkeleton(),
+            "subdivided": cls.human.isSubdivided(),
+            "hide_faces": cls.hide_faces,
+        }
+
+    @classmethod
+    def restore_state(cls, state: dict):
+        """Put back the state of the human recorded by `save_state()`
+
+        Parameters
+        ----------
+        state : dict
+            State returned by `save_state()`
+        """
+        for name, value in state["modifiers"].items():
+            cls.human.getModifier(name).setValue(value, skipDependencies=False)
+        cls.clear_proxies()
+        for path, proxy_type in state["proxies"]:
+            cls.add_proxy(path, proxy_type)
+        cls.human.setSkeleton(state["skeleton"])
+        cls.set_subdivided(state["subdivided"])
+        cls.set_face_hiding(state["hide_faces"])
+        cls.human.applyAllTargets()
+
     Skeleton = TypeVar("Skeleton")
 
     @classmethod
@@ -0,0 +1,176 @@
+from typing import List, TypeVar, Union
+import hashlib
+import json
+import omni.usd
+from pxr import Usd, Sdf
+from .mhcaller import MHCaller
+
+# Name of the scope which holds prototypes, under the stage's default prim
+LIBRARY_NAME = "HumanPrototypes"
+
+Human = TypeVar("Human")
+
+
+def spec_hash(human: Human) -> str:
+    """Hash of everything that determines the prims written for a human: modifier values,
+    proxies, skeleton and authoring options. Humans with the same hash are written identically,
+    so they can share a prototype.
+
+    Parameters
+    ----------
+    human : Human
+        Human whose makehuman state is hashed
+
+    Returns
+    -------
+    str
+        Hex digest of the human's spec
+    """
+    skeleton = MHCaller.human.getSkeleton()
+    spec = {
+        # Values are rounded so that float noise doesn't make humans differ
+        "modifiers": {m.fullName: round(float(m.getValue()), 6) for m in MHCaller.modifiers},
+        "proxies": sorted(p.file for p in MHCaller.proxies),
+        "skeleton": getattr(skeleton, "file", None) if skeleton else None,
+        "options": {
+            "usd_subdivision": human.usd_subdivision,
+            "max_influences": human.max_influences,
+            "weight_threshold": human.weight_threshold,
+            "compact_meshes": human.compact_meshes,
+            "hide_faces": MHCaller.hide_faces,
+            "lods": human.lods,
+            "merge_meshes": human.merge_meshes,
+            "atlas_textures": human.atlas_textures,
+            "texture_level": human.texture_level,
+        },
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+class PrototypeLibrary:
+    """Library of human prototypes in a stage. Each prototype is a full human hierarchy,
+    written once under an abstract (class) scope so that it is not rendered itself. Identical
+    humans are written as instanceable references to the same prototype. Prototypes are found
+    by the hash of their spec, so callers don't have to keep track of them.
+
+    Attributes
+    ----------
+    stage : Usd.Stage
+        Stage which holds the library
+    path : str
+        Path to the scope which holds the prototypes
+    """
+
+    def __init__(self, stage: Usd.Stage = None, path: str = None):
+        """Constructs an instance of PrototypeLibrary
+
+        Parameters
+        ----------
+        stage : Usd.Stage, optional
+            Stage which holds the library, by default the current stage
+        path : str, optional
+            Path to the library scope, by default "HumanPrototypes" under the stage's default prim
+        """
+        self.stage = stage or omni.usd.get_context().get_stage()
+        if path is None:
+            default_prim = self.stage.GetDefaultPrim()
+            parent = default_prim.GetPath().pathString if default_prim.IsValid() else ""
+            path = parent + "/" + LIBRARY_NAME
+        self.path = path
+
+    def find(self, digest: str) -> Union[str, None]:
+        """Find the prototype with the given spec hash
+
+        Parameters
+        ----------
+        digest : str
+            Spec hash, as returned by `spec_hash()`
+
+        Returns
+        -------
+        Union[str, None]
+            Path to the prototype, or None if the library has no such prototype
+        """
+        prim = self.stage.GetPrimAtPath(self._prototype_path(digest))
+        if prim.IsValid() and prim.GetCustomDataByKey("PrototypeHash") == digest:
+            return prim.GetPath().pathString
+        return None
+
+    def get_or_create(self, human: Human) -> str:
+        """Get the prototype for the human's current state, writing it if the library doesn't
+        have it yet
+
+        Parameters
+        ----------
+        human : Human
+            Human to get a prototype for. Its prim is set to the prototype
+
+        Returns
+        -------
+        str
+            Path to the prototype
+        """
+        digest = spec_hash(human)
+        path = self.find(digest)
+        if path is None:
+            self.stage.DefinePrim(self.path, "Scope").SetSpecifier(Sdf.SpecifierClass)
+            # Name the prototype after its hash so that it can be found again
+            name, human.name = human.name, self._prototype_path(digest).rsplit("/", 1)[-1]
+            try:
+                # Materials are written inside the prototype, since bindings to prims outside of
+                # a referenced prim don't resolve in its instances
+                prim = human.add_to_scene(parent_path=self.path, local_materials=True)
+            finally:
+                human.name = name
+            prim.GetPrim().SetCustomDataByKey("PrototypeHash", digest)
+            path = human.prim_path
+        return path
+
+    def add_instances(self, paths: List[str], prototype_paths: List[str]):
+        """Create instanceable references to prototypes. Authored in a single change block, so
+        that thousands of instances can be created at once.
+
+        Parameters
+        ----------
+        paths : List[str]
+            Paths of the instances to create
+        prototype_paths : List[str]
+            Path to the prototype of each instance
+        """
+        edit_target = self.stage.GetEditTarget()
+        layer = edit_target.GetLayer()
+        with Sdf.ChangeBlock():
+            for path, prototype_path in zip(paths, prototype_paths):
+                spec = Sdf.CreatePrimInLayer(layer, edit_target.MapToSpecPath(Sdf.Path(path)))
+                spec.specifier = Sdf.SpecifierDef
+                # Everything an instance needs, including its materials, is under the prototype
+                spec.referenceList.Prepend(Sdf.Reference(primPath=prototype_path))
+                spec.instanceable = True
+
+    def instance(self, human: Human, parent_path: str = None) -> Usd.Prim:
+        """Write a human as an instance of the prototype for its current state
+
+        Parameters
+        ----------
+        human : Human
+            Human to write
+        parent_path : str, optional
+            Path to the prim under which to create the instance, by default the stage's
+            default prim
+
+        Returns
+        -------
+        Usd.Prim
+            The instance prim
+        """
+        prototype_path = self.get_or_create(human)
+        if parent_path is None:
+            default_prim = self.stage.GetDefaultPrim()
+            parent_path = default_prim.GetPath().pathString if default_prim.IsValid() else ""
+        path = omni.usd.get_stage_next_free_path(self.stage, parent_path + "/" + human.name, False)
+        self.add_instances([path], [prototype_path])
+        return self.stage.GetPrimAtPath(path)
+
+    def _prototype_path(self, digest: str) -> str:
+        """Path of the prototype with the given spec hash"""
+        return f"{self.path}/Prototype_{digest[:16]}"
@@ -0,0 +1,116 @@
+from typing import Callable, Dict, Tuple
+import asyncio
+import carb
+import carb.settings
+import omni.kit.app
+
+FRAME_BUDGET_SETTING = "/exts/siborg.create.human/instant_update/frame_budget"
+
+
+class UpdateScheduler:
+    """Coalesces parameter changes made in "Update Instantly" mode so that the human is
+    not rebuilt once per slider edit. Only the latest value of each parameter is kept,
+    and at most one rebuild runs at a time. A rebuild waits for a number of frames (the
+    frame budget) before starting; if more changes arrive while it waits, it is dropped
+    in favor of a rebuild that includes them.
+
+    Attributes
+    ----------
+    frame_budget : int
+        Number of frames without new changes to wait for before rebuilding
+    """
+
+    def __init__(self, update_fn: Callable[[Dict[str, float]], None], frame_budget: int = None):
+        """Constructs an instance of UpdateScheduler
+
+        Parameters
+        ----------
+        update_fn : Callable[[Dict[str, float]], None]
+            Function which rebuilds the human after pending changes are applied. Receives the
+            applied values, keyed by parameter name
+        frame_budget : int, optional
+            Number of frames without new changes to wait for before rebuilding. Read from
+            the extension settings by default
+        """
+        if frame_budget is None:
+            frame_budget = carb.settings.get_settings().get(FRAME_BUDGET_SETTING) or 1
+        self.frame_budget = max(int(frame_budget), 1)
+
+        self._update_fn = update_fn
+        # Pending changes keyed by parameter name. Each holds the function to apply the change
+        # and the latest value
+        self._pending: Dict[str, Tuple[Callable[[float], None], float]] = {}
+        # Incremented with every change so that superseded rebuilds can be detected
+        self._generation = 0
+        self._task: asyncio.Future = None
+
+    @property
+    def pending(self) -> bool:
+        """Whether there are changes which have not been applied yet"""
+        return bool(self._pending)
+
+    def schedule(self, name: str, fn: Callable[[float], None], value: float):
+        """Schedule a parameter change. Replaces any pending change to the same parameter
+        and starts a rebuild if none is scheduled.
+
+        Parameters
+        ----------
+        name : str
+            Full name of the parameter
+        fn : Callable[[float], None]
+            Function which applies the value to the human
+        value : float
+            New value of the parameter
+        """
+        self._pending[name] = (fn, value)
+        self._generation += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def apply_pending(self) -> Dict[str, float]:
+        """Apply all pending changes to the human without rebuilding it
+
+        Returns
+        -------
+        Dict[str, float]
+            Applied values, keyed by parameter name
+        """
+        pending, self._pending = self._pending, {}
+        for fn, value in pending.values():
+            fn(value)
+        return {name: value for name, (_, value) in pending.items()}
+
+    def flush(self):
+        """Apply all pending changes and rebuild the human immediately, if there are any"""
+        if self._pending:
+            self._update_fn(self.apply_pending())
+
+    def cancel(self):
+        """Discard all pending changes and stop any scheduled rebuild"""
+        self._pending = {}
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        """Wait for changes to settle and then rebuild, until no changes are pending"""
+        app = omni.kit.app.get_app()
+        while self._pending:
+            generation = self._generation
+            for _ in range(self.frame_budget):
+                await app.next_update_async()
+            # Changes arrived while waiting. Drop this rebuild and wait again
+            if generation != self._generation:
+                continue
+            # Pending changes may have been applied by an explicit update in the meantime
+            if not self._pending:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                carb.log_error(f"Instant update failed: {e}")
+
+    def destroy(self):
+        """Cancels any scheduled rebuild and removes the reference to the update function"""
+        self.cancel()
+        self._update_fn = None
@@ -44,3 +44,21 @@ def sanitize(s: str):
         # Replace illegal characters with underscores
         s = s.replace(c, "_")
     return s
+
+
+def cache_path(path):
+    """Returns the absolute path of a path given relative to "exts/<omni.ext>/cache". The cache
+    folder holds data generated by the extension, which can safely be deleted.
+
+    Parameters
+    ----------
+    path : str
+        Relative path
+
+    Returns
+    -------
+    str
+        Absolute path
+    """
+    cache = os.path.join(str(Path(__file__).parents[3]), "cache", path)
+    return cache
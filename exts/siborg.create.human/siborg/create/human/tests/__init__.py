@@ -0,0 +1,4 @@
+from .test_blendshapes import *
+from .test_crowd import *
+from .test_downloader import *
+from .test_fitting import *
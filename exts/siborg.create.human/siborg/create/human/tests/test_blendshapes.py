@@ -0,0 +1,87 @@
+import numpy as np
+import omni.kit.test
+import omni.usd
+from pxr import UsdSkel
+from ..human import Human, MERGED_MESH_NAME
+from ..mhcaller import MHCaller
+from ..shared import sanitize
+from .. import blendshapes
+
+# Modifiers exported in the tests
+MODIFIERS = ["macrodetails/Gender", "macrodetails-height/Height"]
+# Largest acceptable difference from makehuman, in makehuman units
+TOLERANCE = 1e-3
+
+
+class TestBlendShapes(omni.kit.test.AsyncTestCase):
+    """Blend shapes exported from a human are compared with the targets makehuman applies"""
+
+    async def setUp(self):
+        await omni.usd.get_context().new_stage_async()
+        MHCaller.reset_human()
+
+    async def tearDown(self):
+        MHCaller.reset_human()
+
+    def _reconstruct(self, human: Human, values: dict) -> list:
+        """Points of each mesh prim with the blend shape weights for the given values applied"""
+        stage = omni.usd.get_context().get_stage()
+        prim = stage.GetPrimAtPath(human.prim_path)
+        merged = prim.GetChild(MERGED_MESH_NAME)
+        if merged:
+            mesh_prims = [merged]
+        else:
+            mesh_prims = [prim.GetChild(sanitize(o.mesh.object.getSeedMesh().name)) for o in MHCaller.objects]
+        ranges = human._blend_shape_ranges()
+        weights = blendshapes.shape_weights(values, ranges)
+        names = [shape for name in ranges for shape in blendshapes.shape_names(name)]
+
+        result = []
+        for mesh_prim in mesh_prims:
+            self.assertTrue(mesh_prim.IsValid())
+            points = np.array(mesh_prim.GetAttribute("points").Get(), dtype=np.float32)
+            for weight, name in zip(weights, names):
+                shape = UsdSkel.BlendShape(mesh_prim.GetChild(name))
+                offsets = np.array(shape.GetOffsetsAttr().Get(), dtype=np.float32).reshape(-1, 3)
+                indices = np.array(shape.GetPointIndicesAttr().Get(), dtype=np.int64)
+                points[indices] += weight * offsets
+            result.append(points)
+        return result
+
+    def _check_limits(self, merge_meshes: bool):
+        human = Human(merge_meshes=merge_meshes, separate_layer=False, lods=False, atlas_textures=False)
+        human.add_to_scene()
+        human.export_blend_shapes(MODIFIERS)
+
+        mh_human = MHCaller.human
+        for name in MODIFIERS:
+            modifier = mh_human.getModifier(name)
+            base = modifier.getValue()
+            # Blend shapes are exact at the limits of each modifier
+            for value in (modifier.getMin(), modifier.getMax()):
+                reconstructed = self._reconstruct(human, {name: value})
+                modifier.setValue(value)
+                mh_human.applyAllTargets()
+                expected = human._mesh_coords()
+                if merge_meshes:
+                    expected = [np.concatenate(expected)]
+                self.assertEqual(len(reconstructed), len(expected))
+                for points, coords in zip(reconstructed, expected):
+                    self.assertEqual(points.shape, coords.shape)
+                    self.assertLess(float(np.abs(points - coords).max()), TOLERANCE, f"{name} at {value}")
+            modifier.setValue(base)
+            mh_human.applyAllTargets()
+
+        # Macro targets are weighted linearly on either side of the default value of the
+        # tested modifiers, so blend shapes computed at the default match makehuman in between
+        # as well. Nine samples check values inside both the "down" and the "up" range
+        errors = human.verify_blend_shapes(samples=9, tolerance=TOLERANCE)
+        self.assertEqual(sorted(errors), sorted(MODIFIERS))
+        for name, error in errors.items():
+            self.assertLess(error, TOLERANCE, name)
+
+    async def test_blend_shapes_match_targets(self):
+        self._check_limits(merge_meshes=False)
+
+    async def test_merged_blend_shapes_match_targets(self):
+        self._check_limits(merge_meshes=True)
@@ -0,0 +1,182 @@
+import numpy as np
+import omni.kit.test
+import omni.usd
+from pxr import Gf, UsdGeom
+from scipy.spatial import cKDTree
+from ..blendshapes import MACRO_MODIFIERS
+from ..crowd import apply_xforms, build_crowd, kmeans, poisson_disc
+from ..mhcaller import MHCaller
+
+# Number of prims transformed in the comparison with XformCommonAPI
+PRIM_COUNT = 2000
+# Number of points placed in the largest check of poisson_disc()
+POINT_COUNT = 20000
+
+
+class TestApplyXforms(omni.kit.test.AsyncTestCase):
+    """`apply_xforms()` keeps existing ops and writes the same transforms as XformCommonAPI"""
+
+    async def setUp(self):
+        await omni.usd.get_context().new_stage_async()
+        self.stage = omni.usd.get_context().get_stage()
+
+    def _define(self, prefix: str, count: int):
+        paths = [f"/{prefix}_{i}" for i in range(count)]
+        for path in paths:
+            UsdGeom.Xform.Define(self.stage, path)
+        return paths
+
+    def test_keeps_orient_and_scale(self):
+        xform = UsdGeom.Xform.Define(self.stage, "/Oriented")
+        xform.AddTranslateOp()
+        xform.AddOrientOp(UsdGeom.XformOp.PrecisionDouble).Set(Gf.Quatd(1, 0, 0, 0))
+        xform.AddScaleOp().Set(Gf.Vec3f(2, 2, 2))
+
+        apply_xforms(self.stage, ["/Oriented"], np.array([[1.0, 0.0, 2.0]]), np.array([[0.0, 90.0, 0.0]]))
+
+        ops = xform.GetOrderedXformOps()
+        self.assertEqual([op.GetOpName() for op in ops], ["xformOp:translate", "xformOp:orient", "xformOp:scale"])
+        self.assertEqual(ops[1].GetPrecision(), UsdGeom.XformOp.PrecisionDouble)
+        self.assertEqual(ops[2].Get(), Gf.Vec3f(2, 2, 2))
+        expected = Gf.Rotation(Gf.Vec3d.YAxis(), 90).GetQuat()
+        self.assertTrue(Gf.IsClose(ops[1].Get().GetImaginary(), expected.GetImaginary(), 1e-6))
+
+        # The rotation matches a rotateXYZ op with the same angles
+        reference = UsdGeom.Xform.Define(self.stage, "/Reference")
+        UsdGeom.XformCommonAPI(reference).SetRotate(Gf.Vec3f(0, 90, 0))
+        direction = Gf.Vec3d(1, 2, 3)
+        rotated = xform.GetLocalTransformation().TransformDir(direction) / 2
+        self.assertTrue(Gf.IsClose(rotated, reference.GetLocalTransformation().TransformDir(direction), 1e-5))
+
+    def test_replaces_other_rotations(self):
+        xform = UsdGeom.Xform.Define(self.stage, "/Rotated")
+        xform.AddRotateZYXOp().Set(Gf.Vec3f(10, 20, 30))
+        xform.AddScaleOp().Set(Gf.Vec3f(3, 3, 3))
+
+        apply_xforms(self.stage, ["/Rotated"], np.array([[0.0, 0.0, 0.0]]), np.array([[0.0, 45.0, 0.0]]))
+
+        names = [op.GetOpName() for op in xform.GetOrderedXformOps()]
+        self.assertEqual(names, ["xformOp:translate", "xformOp:rotateXYZ", "xformOp:scale"])
+
+    def test_matches_xform_common_api(self):
+        rng = np.random.default_rng(0)
+        translations = rng.uniform(-1000, 1000, (PRIM_COUNT, 3))
+        rotations = np.zeros((PRIM_COUNT, 3))
+        rotations[:, 1] = rng.uniform(0, 360, PRIM_COUNT)
+
+        paths = self._define("Batched", PRIM_COUNT)
+        apply_xforms(self.stage, paths, translations, rotations)
+
+        paths = self._define("Single", PRIM_COUNT)
+        for path, translation, rotation in zip(paths, translations.tolist(), rotations.tolist()):
+            api = UsdGeom.XformCommonAPI(self.stage.GetPrimAtPath(path))
+            api.SetTranslate(Gf.Vec3d(*translation))
+            api.SetRotate(Gf.Vec3f(*rotation))
+
+        # Both write the same transforms
+        for i in (0, PRIM_COUNT // 2, PRIM_COUNT - 1):
+            point = Gf.Vec3d(1, 2, 3)
+            a = UsdGeom.Xformable(self.stage.GetPrimAtPath(f"/Batched_{i}")).GetLocalTransformation().Transform(point)
+            b = UsdGeom.Xformable(self.stage.GetPrimAtPath(f"/Single_{i}")).GetLocalTransformation().Transform(point)
+            self.assertTrue(Gf.IsClose(a, b, 1e-3))
+
+
+class TestPoissonDisc(omni.kit.test.AsyncTestCase):
+    """`poisson_disc()` keeps points apart and places the requested number"""
+
+    def _check_spacing(self, points: np.ndarray, spacing: float):
+        # Pairs closer than the spacing, allowing for rounding
+        self.assertFalse(cKDTree(points).query_pairs(spacing * (1 - 1e-9)))
+
+    def test_places_count_with_min_spacing(self):
+        region = ((-10.0, -20.0), (30.0, 40.0))
+        points = poisson_disc(region, 500, 1.5, seed=0)
+        self.assertEqual(points.shape, (500, 2))
+        self._check_spacing(points, 1.5)
+        self.assertTrue(np.all(points >= region[0]) and np.all(points < region[1]))
+
+    def test_small_region(self):
+        # At most one point fits in each spacing / sqrt(2) cell
+        points = poisson_disc(((0.0, 0.0), (10.0, 10.0)), 1000, 1.0, seed=0)
+        self.assertGreater(len(points), 0)
+        self.assertLess(len(points), 200)
+        self._check_spacing(points, 1.0)
+
+    def test_large_sparse_region(self):
+        # A few humans in a large region
+        points = poisson_disc(((0.0, 0.0), (1000.0, 1000.0)), 100, 0.5, seed=0)
+        self.assertEqual(len(points), 100)
+        self._check_spacing(points, 0.5)
+
+    def test_tens_of_thousands(self):
+        points = poisson_disc(((0.0, 0.0), (300.0, 300.0)), POINT_COUNT, 1.0, seed=0)
+        self.assertEqual(len(points), POINT_COUNT)
+        self._check_spacing(points, 1.0)
+
+
+class TestKMeans(omni.kit.test.AsyncTestCase):
+    """`kmeans()` finds well separated clusters and labels points by their nearest center"""
+
+    def test_separated_clusters(self):
+        rng = np.random.default_rng(0)
+        truth = np.array([[0.0, 0.0, 0.0], [10.0, 0.0, 0.0], [0.0, 10.0, 5.0], [5.0, -10.0, 10.0]])
+        data = np.concatenate([c + rng.normal(0, 0.1, (50, 3)) for c in truth])
+
+        centers, labels = kmeans(data, len(truth), seed=0)
+
+        self.assertEqual(centers.shape, truth.shape)
+        # Each true cluster maps to one center, close to its mean
+        for i, c in enumerate(truth):
+            cluster = labels[i * 50:(i + 1) * 50]
+            self.assertEqual(len(np.unique(cluster)), 1)
+            self.assertLess(float(np.linalg.norm(centers[cluster[0]] - c)), 0.1)
+        self.assertEqual(len(np.unique(labels)), len(truth))
+        # Labels name the nearest center
+        distances = ((data[:, None] - centers) ** 2).sum(axis=2)
+        self.assertTrue(np.array_equal(labels, distances.argmin(axis=1)))
+
+    def test_more_clusters_than_points(self):
+        data = np.array([[0.0, 1.0], [2.0, 3.0], [4.0, 5.0]])
+        centers, labels = kmeans(data, 10, seed=0)
+        self.assertEqual(len(centers), len(data))
+        self.assertEqual(sorted(labels.tolist()), [0, 1, 2])
+
+
+class TestBuildCrowd(omni.kit.test.AsyncTestCase):
+    """`build_crowd()` leaves the human being edited as it was and only keeps placed individuals"""
+
+    # A modifier which is not a macro, so that it is only recorded once it is changed
+    MODIFIER = "stomach/stomach-pregnant-decr|incr"
+
+    async def setUp(self):
+        await omni.usd.get_context().new_stage_async()
+        self.stage = omni.usd.get_context().get_stage()
+        MHCaller.reset_human()
+
+    async def tearDown(self):
+        MHCaller.reset_human()
+
+    def _modifier_values(self):
+        return {m.fullName: m.getValue() for m in MHCaller.human.modifiers}
+
+    def test_keeps_edited_human(self):
+        MHCaller.human.getModifier("macrodetails/Gender").setValue(0.2)
+        MHCaller.human.applyAllTargets()
+        before = self._modifier_values()
+
+        modifiers = list(MACRO_MODIFIERS) + [self.MODIFIER]
+        build_crowd(4, 2, ((0.0, 0.0), (500.0, 500.0)), modifiers=modifiers, seed=0)
+
+        after = self._modifier_values()
+        changed = [name for name, value in before.items() if abs(after[name] - value) > 1e-6]
+        self.assertEqual(changed, [])
+
+    def test_removes_unplaced_individuals(self):
+        report = build_crowd(20, 1, ((0.0, 0.0), (1.0, 1.0)), spacing=10.0, seed=0)
+
+        self.assertLess(report.individuals, 20)
+        self.assertEqual(len(report.instance_paths), report.individuals)
+        self.assertEqual(len(report.labels), report.individuals)
+        crowd = self.stage.GetPrimAtPath(report.instance_paths[0]).GetParent()
+        humans = [child for child in crowd.GetChildren() if child.GetName().startswith("Human_")]
+        self.assertEqual(len(humans), report.individuals)
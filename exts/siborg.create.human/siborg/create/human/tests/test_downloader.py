@@ -0,0 +1,129 @@
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+import omni.client
+import omni.kit.test
+from aiohttp import web
+from ..browser.downloader import Downloader
+
+ETAG = '"v1"'
+
+
+def _zip_bytes() -> bytes:
+    """A small zip to serve"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("assets/a.txt", "a" * 100000)
+        z.writestr("assets/b.txt", os.urandom(50000))
+    return buffer.getvalue()
+
+
+class TestDownloader(omni.kit.test.AsyncTestCase):
+    """Downloads from a local server which supports range requests"""
+
+    async def setUp(self):
+        self.data = _zip_bytes()
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+        # Headers of each request the server received
+        self.requests = []
+        # Number of range requests answered with a range which starts at the wrong offset
+        self.wrong_ranges = 0
+
+        app = web.Application()
+        app.router.add_get("/pack.zip", self._handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}/pack.zip"
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "pack.zip")
+
+    async def tearDown(self):
+        await self.runner.cleanup()
+        self.directory.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.headers))
+        data = self.data
+        headers = {"ETag": ETAG}
+        range_header = request.headers.get("Range")
+        if range_header and request.headers.get("If-Range", ETAG) == ETAG:
+            start = int(range_header.split("=", 1)[1].split("-", 1)[0])
+            if start >= len(data):
+                headers["Content-Range"] = f"bytes */{len(data)}"
+                return web.Response(status=416, headers=headers)
+            if self.wrong_ranges:
+                self.wrong_ranges -= 1
+                start = 0
+            headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+            return web.Response(status=206, body=data[start:], headers=headers)
+        return web.Response(body=data, headers=headers)
+
+    def _write_part(self, data: bytes, validator: str = ETAG):
+        with open(self.path + ".part", "wb") as f:
+            f.write(data)
+        with open(self.path + ".part.validator", "w") as f:
+            f.write(validator)
+
+    def _assert_downloaded(self, result):
+        self.assertEqual(result["status"], omni.client.Result.OK)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertTrue(os.path.isfile(os.path.join(self.directory.name, "assets", "a.txt")))
+        self.assertFalse(os.path.exists(self.path + ".part"))
+        self.assertFalse(os.path.exists(self.path + ".part.validator"))
+
+    async def test_download(self):
+        result = await Downloader(None).download(self.url, self.directory.name, self.sha256)
+        self._assert_downloaded(result)
+        self.assertNotIn("Range", self.requests[0])
+
+    async def test_resume(self):
+        half = len(self.data) // 2
+        self._write_part(self.data[:half])
+        result = await Downloader(None).download(self.url, self.directory.name, self.sha256)
+        self._assert_downloaded(result)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0]["Range"], f"bytes={half}-")
+        self.assertEqual(self.requests[0]["If-Range"], ETAG)
+
+    async def test_changed_file_restarts(self):
+        # The server sends the whole file when the validator doesn't match
+        self._write_part(b"stale", '"v0"')
+        result = await Downloader(None).download(self.url, self.directory.name, self.sha256)
+        self._assert_downloaded(result)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_unvalidated_part_restarts(self):
+        with open(self.path + ".part", "wb") as f:
+            f.write(b"stale")
+        result = await Downloader(None).download(self.url, self.directory.name, self.sha256)
+        self._assert_downloaded(result)
+        self.assertNotIn("Range", self.requests[0])
+
+    async def test_wrong_range_restarts(self):
+        self.wrong_ranges = 1
+        self._write_part(self.data[: len(self.data) // 2])
+        result = await Downloader(None).download(self.url, self.directory.name, self.sha256)
+        self._assert_downloaded(result)
+        self.assertEqual(len(self.requests), 2)
+        self.assertNotIn("Range", self.requests[1])
+
+    async def test_complete_part(self):
+        # The server answers 416 when the partial download already holds the whole file
+        self._write_part(self.data)
+        result = await Downloader(None).download(self.url, self.directory.name, self.sha256)
+        self._assert_downloaded(result)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_checksum_failure(self):
+        result = await Downloader(None).download(self.url, self.directory.name, "0" * 64)
+        self.assertEqual(result["status"], omni.client.Result.ERROR)
+        self.assertIsNone(result["url"])
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, "assets")))
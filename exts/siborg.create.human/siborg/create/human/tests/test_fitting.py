@@ -0,0 +1,79 @@
+import numpy as np
+import omni.kit.test
+import omni.usd
+from ..fitting import ProxyFitter
+from ..lod import proxy_mesh_path
+from ..mhcaller import MHCaller
+from ..shared import data_path
+from ..weights import WeightTransfer, to_matrix
+
+# One clothing proxy and one body proxy, which replaces the body mesh
+CLOTHES = data_path("clothes/omni_casual/omni_casual.mhclo")
+# Largest acceptable difference from makehuman, in makehuman units for coordinates
+TOLERANCE = 1e-3
+# Largest acceptable difference from makehuman for a single skin weight
+WEIGHT_TOLERANCE = 1e-4
+
+
+class TestProxyFitting(omni.kit.test.AsyncTestCase):
+    """Proxies fitted by ProxyFitter and weights transferred by WeightTransfer are compared
+    with makehuman's own `Proxy.getCoords` and `getVertexWeights`"""
+
+    async def setUp(self):
+        await omni.usd.get_context().new_stage_async()
+        MHCaller.reset_human()
+
+    async def tearDown(self):
+        MHCaller.reset_human()
+
+    def _add_proxies(self, subdivided: bool):
+        """Add the test proxies to a human with an applied modifier, so the proxies aren't
+        fitted to the default body"""
+        MHCaller.reset_human(subdivided=subdivided)
+        MHCaller.human.getModifier("macrodetails/Gender").setValue(0.8)
+        MHCaller.human.applyAllTargets()
+        MHCaller.add_proxy(CLOTHES, "clothes")
+        MHCaller.add_proxy(proxy_mesh_path(), "proxymeshes")
+        proxies = MHCaller.proxies
+        self.assertEqual({p.type for p in proxies}, {"clothes", "proxymeshes"})
+        return proxies
+
+    def test_fit(self):
+        proxies = self._add_proxies(subdivided=False)
+        coords = ProxyFitter().fit(proxies, MHCaller.human.meshData.coord)
+
+        self.assertEqual(len(coords), len(proxies))
+        for p, fitted in zip(proxies, coords):
+            expected = np.asarray(p.getCoords())[:, :3]
+            self.assertEqual(fitted.shape, expected.shape, p.name)
+            self.assertLess(np.abs(fitted - expected).max(), TOLERANCE, p.name)
+
+    def _check_weights(self, subdivided: bool):
+        """Weights of every mesh of the human match the weights makehuman transfers"""
+        self._add_proxies(subdivided)
+        skeleton = MHCaller.human.getSkeleton()
+        joint_names = [bone.name for bone in skeleton.getBones()]
+        raw_weights = MHCaller.human.getVertexWeights(skeleton)
+
+        transfer = WeightTransfer()
+        body = transfer.body_weights(
+            raw_weights, joint_names, MHCaller.human.meshData.getVertexCount(excludeMaskedVerts=False)
+        )
+        for mesh in MHCaller.meshes:
+            self.assertEqual(mesh is not mesh.object.getSeedMesh(), subdivided, mesh.name)
+            weights = transfer.mesh_weights(mesh, body, raw_weights, skeleton, joint_names)
+
+            # Makehuman's transfer, as used before weights were computed as sparse matrices
+            pxy = mesh.object.proxy
+            parent_weights = pxy.getVertexWeights(raw_weights, skeleton) if pxy else raw_weights
+            vertex_count = mesh.getVertexCount(excludeMaskedVerts=False)
+            expected = to_matrix(mesh.getVertexWeights(parent_weights), joint_names, vertex_count)
+
+            self.assertEqual(weights.shape, expected.shape, mesh.name)
+            self.assertLess(abs(weights - expected).max(), WEIGHT_TOLERANCE, mesh.name)
+
+    def test_weights(self):
+        self._check_weights(subdivided=False)
+
+    def test_weights_subdivided(self):
+        self._check_weights(subdivided=True)
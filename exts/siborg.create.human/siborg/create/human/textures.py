@@ -0,0 +1,335 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+import asyncio
+import hashlib
+import os
+import threading
+import carb
+import carb.settings
+from PIL import Image
+from pxr import Usd, UsdShade
+from .shared import cache_path
+
+# Shader inputs of human materials which hold textures
+TEXTURE_INPUTS = ("diffuse_texture", "normalmap_texture", "ao_texture")
+# Number of downscaled levels kept for each texture. Each level halves the previous one, so
+# level 1 is 1/2 and level 2 is 1/4 of the full resolution
+MAX_LEVEL = 2
+# Textures are not downscaled below this width or height
+MIN_SIZE = 64
+
+
+class TextureCache:
+    """Cache of downscaled variants of textures, stored on disk by the hash of the source file
+    so that renamed or copied textures share their variants. Level 0 is the source texture
+    itself, and each further level halves the resolution of the previous one, like a mip chain.
+    Variants are generated in a thread pool.
+
+    Attributes
+    ----------
+    directory : str
+        Directory in which variants are stored
+    """
+
+    def __init__(self, directory: str = None, max_workers: int = None):
+        """Constructs an instance of TextureCache
+
+        Parameters
+        ----------
+        directory : str, optional
+            Directory in which to store variants, by default "textures" in the extension cache
+        max_workers : int, optional
+            Number of threads generating variants, by default read from the extension settings
+        """
+        self.directory = directory or cache_path("textures")
+        os.makedirs(self.directory, exist_ok=True)
+        if max_workers is None:
+            max_workers = carb.settings.get_settings().get("/exts/siborg.create.human/textures/workers") or None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="human_textures")
+        self._lock = threading.Lock()
+        # Hashes of sources, keyed by path and invalidated by modification time and size
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        # Variants being generated, keyed by source path, modification time, size and level
+        self._pending: Dict[Tuple[str, int, int, int], Future] = {}
+
+    def source_hash(self, path: str) -> str:
+        """Hash of the contents of a texture. Hashes are remembered until the file changes.
+
+        Parameters
+        ----------
+        path : str
+            Path to the texture
+
+        Returns
+        -------
+        str
+            Hex digest
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            known = self._hashes.get(path)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        with self._lock:
+            self._hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def variant_path(self, path: str, level: int) -> str:
+        """Path at which a variant of a texture is stored. Hashes the texture if it changed
+        since it was last hashed
+
+        Parameters
+        ----------
+        path : str
+            Path to the source texture
+        level : int
+            Level of the variant. Level 0 is the source itself
+
+        Returns
+        -------
+        str
+            Path to the variant, whether or not it exists yet
+        """
+        if level <= 0:
+            return path
+        return self._variant_file(self.source_hash(path), path, level)
+
+    def _variant_file(self, digest: str, path: str, level: int) -> str:
+        """Path of a variant of a texture with the given hash"""
+        extension = os.path.splitext(path)[1].lower() or ".png"
+        return os.path.join(self.directory, f"{digest}_{level}{extension}")
+
+    def request(self, path: str, level: int) -> Future:
+        """Generate a variant of a texture in the thread pool, along with the levels above it.
+        Only stats the source, so that it can be called while writing a human. Sources are
+        hashed in the thread pool, unless their hash is known already.
+
+        Parameters
+        ----------
+        path : str
+            Path to the source texture
+        level : int
+            Level of the variant
+
+        Returns
+        -------
+        Future
+            Resolves to the path of the variant
+        """
+        level = min(max(level, 0), MAX_LEVEL)
+        future = Future()
+        if level <= 0:
+            future.set_result(path)
+            return future
+        try:
+            source = os.path.abspath(path)
+            stat = os.stat(source)
+        except OSError as e:
+            # Missing textures are left for the renderer to report
+            carb.log_warn(f"Could not read texture {path}: {e}")
+            future.set_result(path)
+            return future
+        key = (source, stat.st_mtime_ns, stat.st_size, level)
+        with self._lock:
+            known = self._hashes.get(source)
+        if known and known[:2] == key[1:3]:
+            target = self._variant_file(known[2], path, level)
+            if os.path.isfile(target):
+                future.set_result(target)
+                return future
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._executor.submit(self._generate, path, level, key)
+                self._pending[key] = pending
+        return pending
+
+    def get(self, path: str, level: int) -> str:
+        """Path to a variant of a texture, generating it if it isn't cached. Falls back to the
+        source texture if the variant can't be generated. Blocks until the variant exists, so
+        materials in the stage should use `bind_variants()` instead.
+
+        Parameters
+        ----------
+        path : str
+            Path to the source texture
+        level : int
+            Level of the variant
+
+        Returns
+        -------
+        str
+            Path to the variant
+        """
+        if not path or level <= 0:
+            return path
+        try:
+            return self.request(path, level).result()
+        except Exception as e:
+            carb.log_warn(f"Could not downscale texture {path}: {e}")
+            return path
+
+    def bind_variants(self, material: UsdShade.Material, level: int) -> List[Future]:
+        """Point the textures of a material at their variants. Variants which are cached are
+        bound right away. The others keep their source texture until they are generated, and
+        are swapped in on the event loop afterwards, so that writing a human never waits for
+        textures to be downscaled.
+
+        Parameters
+        ----------
+        material : UsdShade.Material
+            Material whose shader inputs hold source textures
+        level : int
+            Level of the variants
+
+        Returns
+        -------
+        List[Future]
+            Futures of the variants which are still being generated
+        """
+        if level <= 0:
+            return []
+        pending = []
+        for prim in Usd.PrimRange(material.GetPrim()):
+            if not prim.IsA(UsdShade.Shader):
+                continue
+            for name in TEXTURE_INPUTS:
+                texture_input = UsdShade.Shader(prim).GetInput(name)
+                value = texture_input.Get() if texture_input else None
+                if not value or not value.path:
+                    continue
+                future = self.request(value.path, level)
+                if future.done() and future.exception() is None:
+                    texture_input.Set(future.result())
+                else:
+                    # Swapped in through the current edit target, which may be a variant
+                    edit_target = prim.GetStage().GetEditTarget()
+                    asyncio.ensure_future(_swap(texture_input.GetAttr(), value.path, future, edit_target))
+                    pending.append(future)
+        return pending
+
+    def prefetch(self, paths: Iterable[str], levels: Iterable[int] = None) -> List[Future]:
+        """Generate variants of many textures in the background
+
+        Parameters
+        ----------
+        paths : Iterable[str]
+            Paths to the source textures
+        levels : Iterable[int], optional
+            Levels to generate, by default all of them
+
+        Returns
+        -------
+        List[Future]
+            Futures which resolve to the path of each variant
+        """
+        levels = list(levels) if levels is not None else list(range(1, MAX_LEVEL + 1))
+        # Levels are generated from the level above, so the lowest level generates all of them
+        level = max(levels, default=0)
+        return [self.request(path, level) for path in set(paths) if path and level > 0]
+
+    def shutdown(self):
+        """Stop generating variants. Variants which haven't started are cancelled, and the ones
+        in progress are waited for"""
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _generate(self, path: str, level: int, key: Tuple[str, int, int, int]) -> str:
+        """Hash a texture and generate its variants up to the given level, unless they are
+        cached. Runs in the thread pool."""
+        try:
+            final = self.variant_path(path, level)
+            if os.path.isfile(final):
+                return final
+            image_format = Image.registered_extensions().get(os.path.splitext(final)[1], "PNG")
+            image = Image.open(path)
+            image.load()
+            for current in range(1, level + 1):
+                target = self.variant_path(path, current)
+                if os.path.isfile(target):
+                    image = Image.open(target)
+                    image.load()
+                    continue
+                width, height = image.size
+                size = (max(width // 2, min(width, MIN_SIZE)), max(height // 2, min(height, MIN_SIZE)))
+                image = image.resize(size, Image.LANCZOS)
+                # Write to a temporary file first, so that partial variants are never used
+                partial = target + ".part"
+                image.save(partial, format=image_format)
+                os.replace(partial, target)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        return final
+
+
+async def _swap(attr: Usd.Attribute, source: str, future: Future, edit_target: Usd.EditTarget):
+    """Replace a source texture with its variant once the variant is generated. Runs on the
+    event loop, which owns the stage."""
+    try:
+        variant = await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # The cache was shut down
+        return
+    except Exception as e:
+        carb.log_warn(f"Could not downscale texture {source}: {e}")
+        return
+    # The material may have been removed or rewritten in the meantime
+    value = attr.Get() if attr.IsValid() else None
+    if value and value.path == source:
+        with Usd.EditContext(attr.GetStage(), edit_target):
+            attr.Set(variant)
+
+
+def level_name(name: str, level: int) -> str:
+    """Name of a material whose textures are at the given level, so that materials of humans
+    with different texture levels don't overwrite each other
+
+    Parameters
+    ----------
+    name : str
+        Name of the material
+    level : int
+        Texture level
+
+    Returns
+    -------
+    str
+        Name of the material at the level
+    """
+    return name if level <= 0 else f"{name}_{1 << min(level, MAX_LEVEL)}x"
+
+
+_cache = None
+
+
+def get_cache() -> TextureCache:
+    """The texture cache shared by all humans
+
+    Returns
+    -------
+    TextureCache
+        Shared texture cache, created on first use
+    """
+    global _cache
+    if _cache is None:
+        _cache = TextureCache()
+    return _cache
+
+
+def shutdown_cache():
+    """Shut down the shared texture cache, if it was created. Called when the extension shuts
+    down, so that no generation outlives it"""
+    global _cache
+    if _cache is not None:
+        _cache.shutdown()
+        _cache = None
@@ -0,0 +1,308 @@
+from collections import OrderedDict
+from typing import Callable, List, Tuple, TypeVar
+import numpy as np
+from scipy import sparse
+import animation
+from .fitting import reference_matrix
+
+# Contributions of body vertices to proxy weights below this value are dropped, matching
+# makehuman's weight transfer
+WEIGHT_THRESHOLD = 1e-4
+# Number of proxy reference matrices and subdivision maps kept, each
+CACHE_SIZE = 16
+
+VertexBoneWeights = TypeVar("VertexBoneWeights")
+Proxy = TypeVar("Proxy")
+Object3D = TypeVar("Object3D")
+
+
+class WeightTransfer:
+    """Computes skin weights for the body and every proxy mesh as sparse matrices of
+    shape (vertices, joints), with joints in USD (breadth-first) order. Proxy weights are
+    the product of the proxy reference weights and the body weights, and weights of meshes
+    subdivided by makehuman are the product of a cached subdivision map and the weights of
+    the unsubdivided mesh. This replaces makehuman's per-vertex, dictionary-based transfer.
+    """
+
+    def __init__(self):
+        """Constructs an instance of WeightTransfer"""
+        # Body weights, along with the makehuman weights and joint order they were built from
+        self._body_source = None
+        self._body_key = None
+        self._body = None
+        # Proxy reference matrices, keyed by proxy uuid and body vertex count. Least recently
+        # used entries are dropped, so that swapping proxies doesn't grow the caches
+        self._references: OrderedDict = OrderedDict()
+        # Subdivision maps, keyed by mesh name, vertex counts and face mask
+        self._subdivision_maps: OrderedDict = OrderedDict()
+
+    def body_weights(self, vertex_weights: VertexBoneWeights, joint_names: List[str], vertex_count: int) -> sparse.csr_matrix:
+        """Weights of the body. Rebuilt only when the skeleton weights or joint order change.
+
+        Parameters
+        ----------
+        vertex_weights : animation.VertexBoneWeights
+            Makehuman weights of the body for the human's skeleton
+        joint_names : List[str]
+            Names of all joints in USD (breadth-first) order
+        vertex_count : int
+            Number of vertices of the body
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Body weights, shape (body vertices, joints)
+        """
+        key = (tuple(joint_names), vertex_count)
+        if vertex_weights is not self._body_source or key != self._body_key:
+            self._body = to_matrix(vertex_weights, joint_names, vertex_count)
+            self._body_source = vertex_weights
+            self._body_key = key
+        return self._body
+
+    def proxy_weights(self, proxy: Proxy, body: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Transfer body weights to a proxy through its reference weights
+
+        Parameters
+        ----------
+        proxy : proxy.Proxy
+            Makehuman proxy
+        body : scipy.sparse.csr_matrix
+            Body weights, shape (body vertices, joints)
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Proxy weights, shape (proxy vertices, joints)
+        """
+        key = (proxy.uuid, body.shape[0])
+        reference = _cached(self._references, key, lambda: reference_matrix(proxy, body.shape[0]))
+        reference = reference.tocoo()
+        body = body.tocsr()
+
+        # Expand the product into the contribution of each body vertex to each proxy vertex,
+        # so that small contributions are dropped before they are summed, as makehuman does
+        counts = np.diff(body.indptr)[reference.col]
+        rows = np.repeat(reference.row, counts)
+        starts = np.repeat(body.indptr[reference.col] - (np.cumsum(counts) - counts), counts)
+        positions = starts + np.arange(len(rows))
+        data = np.repeat(reference.data, counts) * body.data[positions]
+        keep = data > WEIGHT_THRESHOLD
+        # Contributions to the same proxy vertex and joint are summed
+        weights = sparse.csr_matrix(
+            (data[keep], (rows[keep], body.indices[positions[keep]])),
+            shape=(reference.shape[0], body.shape[1]),
+        )
+        return normalize(weights)
+
+    def subdivision_map(self, mesh: Object3D, parent_vertex_count: int) -> sparse.csr_matrix:
+        """Sparse map from the vertices of an unsubdivided mesh to its subdivided mesh. Built by
+        passing weights with one bone per vertex through makehuman's weight remapping once,
+        and cached until the mesh topology changes.
+
+        Parameters
+        ----------
+        mesh : Object3D
+            Makehuman mesh subdivided from its object's seed mesh
+        parent_vertex_count : int
+            Number of vertices of the seed mesh
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Subdivision map, shape (mesh vertices, seed mesh vertices)
+        """
+        seed = mesh.object.getSeedMesh()
+        vertex_count = mesh.getVertexCount(excludeMaskedVerts=False)
+        key = (mesh.name, parent_vertex_count, vertex_count, hash(np.asarray(seed.face_mask).tobytes()))
+
+        def build():
+            probe = animation.VertexBoneWeights(
+                {str(v): ([v], [1.0]) for v in range(parent_vertex_count)}, parent_vertex_count
+            )
+            rows, cols, data = [], [], []
+            for bone, (indices, weights) in mesh.getVertexWeights(probe).data.items():
+                rows.append(np.asarray(indices, dtype=np.int64))
+                cols.append(np.full(len(indices), int(bone), dtype=np.int64))
+                data.append(np.asarray(weights, dtype=np.float32))
+            return sparse.csr_matrix(
+                (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                shape=(vertex_count, parent_vertex_count),
+            )
+
+        return _cached(self._subdivision_maps, key, build)
+
+    def mesh_weights(
+        self,
+        mesh: Object3D,
+        body: sparse.csr_matrix,
+        raw_weights: VertexBoneWeights,
+        skeleton,
+        joint_names: List[str],
+    ) -> sparse.csr_matrix:
+        """Weights of a makehuman mesh, whether it belongs to the body or a proxy and whether or
+        not it is subdivided
+
+        Parameters
+        ----------
+        mesh : Object3D
+            Makehuman mesh
+        body : scipy.sparse.csr_matrix
+            Body weights, shape (body vertices, joints)
+        raw_weights : animation.VertexBoneWeights
+            Makehuman weights of the body. Needed for proxies which define their own weights
+        skeleton : skeleton.Skeleton
+            Makehuman skeleton the weights are for
+        joint_names : List[str]
+            Names of all joints in USD (breadth-first) order
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Mesh weights, shape (mesh vertices, joints)
+        """
+        pxy = mesh.object.proxy
+        if pxy and pxy.vertexBoneWeights:
+            # The proxy defines its own weights, which makehuman maps to the skeleton
+            vertex_count = mesh.object.getSeedMesh().getVertexCount(excludeMaskedVerts=False)
+            weights = to_matrix(pxy.getVertexWeights(raw_weights, skeleton), joint_names, vertex_count)
+        elif pxy:
+            weights = self.proxy_weights(pxy, body)
+        else:
+            weights = body
+
+        if mesh is not mesh.object.getSeedMesh():
+            # Map weights to the mesh subdivided by makehuman
+            weights = normalize(self.subdivision_map(mesh, weights.shape[0]) @ weights)
+        return weights
+
+
+def _cached(cache: OrderedDict, key: Tuple, build: Callable[[], sparse.csr_matrix]) -> sparse.csr_matrix:
+    """Look up a matrix in a cache, building it if it is missing. The least recently used
+    matrices are dropped once the cache holds more than CACHE_SIZE of them."""
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache[key] = value
+        if len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return value
+
+
+def to_matrix(vertex_weights: VertexBoneWeights, joint_names: List[str], vertex_count: int) -> sparse.csr_matrix:
+    """Convert makehuman weights to a sparse matrix
+
+    Parameters
+    ----------
+    vertex_weights : animation.VertexBoneWeights
+        Makehuman weights, holding a list of vertex indices and weights per bone
+    joint_names : List[str]
+        Names of all joints in USD (breadth-first) order
+    vertex_count : int
+        Number of vertices the weights are for
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Weights, shape (vertices, joints)
+    """
+    joint_indices = {name: i for i, name in enumerate(joint_names)}
+    rows, cols, data = [], [], []
+    for joint, (indices, weights) in vertex_weights.data.items():
+        rows.append(np.asarray(indices, dtype=np.int64))
+        cols.append(np.full(len(indices), joint_indices[joint], dtype=np.int64))
+        data.append(np.asarray(weights, dtype=np.float32))
+    if not rows:
+        return sparse.csr_matrix((vertex_count, len(joint_names)), dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(vertex_count, len(joint_names)),
+    )
+
+
+def normalize(weights: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Normalize the weights of each vertex to sum to 1. Vertices without weights are bound
+    to the root joint, as makehuman does.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.csr_matrix
+        Weights, shape (vertices, joints)
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Normalized weights
+    """
+    weights = weights.tocsr().astype(np.float32)
+    sums = np.asarray(weights.sum(axis=1)).ravel()
+    unweighted = np.flatnonzero(sums <= 0)
+    if len(unweighted):
+        root = sparse.csr_matrix(
+            (np.ones(len(unweighted), dtype=np.float32), (unweighted, np.zeros(len(unweighted), dtype=np.int64))),
+            shape=weights.shape,
+        )
+        weights = weights + root
+        sums[unweighted] = 1
+    return sparse.diags(1 / sums) @ weights
+
+
+def influences(weights: sparse.csr_matrix, max_influences: int = None, threshold: float = 0.0) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Build flat arrays of joint indices and weights for each vertex, for use as UsdSkel
+    primvars. Influences are sorted by decreasing weight, and vertices with fewer influences
+    than others are padded with 0's, per the UsdSkel spec. Influences can be pruned to the
+    strongest few per vertex, and by weight. Pruning is applied to the final weights of each
+    vertex, after the weights have been transferred and normalized, so it is independent of
+    the WEIGHT_THRESHOLD makehuman applies during transfer. Pruned weights are not
+    renormalized.
+
+    Parameters
+    ----------
+    weights : scipy.sparse.csr_matrix
+        Weights, shape (vertices, joints)
+    max_influences : int, optional
+        Largest number of influences to keep per vertex, by default None (keep all)
+    threshold : float, optional
+        Influences whose final weight is below the threshold are dropped, except for the
+        strongest influence of each vertex, by default 0.0 (keep all)
+
+    Returns
+    -------
+    indices : np.ndarray
+        Flat int32 array of joint indices, `element_size` per vertex
+    weights : np.ndarray
+        Flat float32 array of weights corresponding to joint indices
+    element_size : int
+        Number of influences per vertex
+    """
+    weights = weights.tocsr()
+    weights.eliminate_zeros()
+    vertex_count = weights.shape[0]
+    counts = np.diff(weights.indptr)
+
+    # Order the influences of each vertex by decreasing weight
+    rows = np.repeat(np.arange(vertex_count), counts)
+    order = np.lexsort((-weights.data, rows))
+    rows = rows[order]
+    joints = weights.indices[order]
+    data = weights.data[order]
+    # Position of each influence within its vertex
+    ranks = np.arange(len(rows)) - weights.indptr[rows]
+
+    # Prune weak influences
+    keep = np.ones(len(rows), dtype=bool)
+    if max_influences:
+        keep &= ranks < max_influences
+    if threshold:
+        keep &= (data >= threshold) | (ranks == 0)
+    rows, ranks, joints, data = rows[keep], ranks[keep], joints[keep], data[keep]
+
+    element_size = int(ranks.max()) + 1 if len(ranks) else 1
+
+    indices = np.zeros((vertex_count, element_size), dtype=np.int32)
+    values = np.zeros((vertex_count, element_size), dtype=np.float32)
+    indices[rows, ranks] = joints
+    values[rows, ranks] = data
+    return indices.ravel(), values.ravel(), element_size
@@ -2,6 +2,7 @@ from .ext_ui import ParamPanelModel, ParamPanel, NoSelectionNotification
 from .browser import MHAssetBrowserModel, AssetBrowserFrame
 from .human import Human
 from .mhcaller import MHCaller
+from .scheduler import UpdateScheduler
 from .styles import window_style, button_style
 import omni.ui as ui
 import omni.kit.ui
@@ -37,10 +38,17 @@ class MHWindow(ui.Window):
 
         # Holds the state of the realtime toggle
         self.toggle_model = ui.SimpleBoolModel()
+        # Holds the state of the toggle for hiding faces under clothes
+        self.hide_faces_model = ui.SimpleBoolModel(MHCaller.hide_faces)
+        self.hide_faces_model.add_value_changed_fn(self._on_hide_faces_changed)
         # Holds the state of the parameter list
         self.param_model = ParamPanelModel(self.toggle_model)
         # Keep track of the human
         self._human = Human()
+        # Coalesces changes made while updating instantly
+        self._scheduler = UpdateScheduler(self._update_preview)
+        # Whether the human in the scene is a low-resolution preview
+        self._preview_active = False
 
         # A model to hold browser data
         self.browser_model = MHAssetBrowserModel(
@@ -81,10 +89,12 @@ class MHWindow(ui.Window):
                             ui.Spacer(width=spacer_width)
                     with ui.HStack():
                         with ui.VStack():
-                            self.param_panel = ParamPanel(self.param_model,self.update_human)
+                            self.param_panel = ParamPanel(self.param_model, self._scheduler.schedule)
                             with ui.HStack(height=0):
                                 # Toggle whether changes should propagate instantly
                                 ui.ToolButton(text = "Update Instantly", model = self.toggle_model)
+                                # Toggle whether faces covered by clothes are left out
+                                ui.ToolButton(text = "Hide Under Clothes", model = self.hide_faces_model)
                 with ui.VStack(width = 100, style=button_style):
                     # Creates a new human in scene and resets modifiers and assets
                     ui.Button(
@@ -120,6 +130,13 @@ class MHWindow(ui.Window):
 
         prim_path = event.payload["prim_path"]
 
+        if prim_path != self._human.prim_path:
+            # Write the previous human once at full resolution, with its pending changes
+            self._commit_preview()
+        else:
+            # Finish updating the human before it is reloaded
+            self._scheduler.flush()
+
         # If a valid human prim is selected, 
         if not prim_path or not stage.GetPrimAtPath(prim_path):
             # Hide the property panel
@@ -149,13 +166,18 @@ class MHWindow(ui.Window):
 
             # Update the human in MHCaller
             self._human.set_prim(prim)
+            # Show whether the selected human hides faces under its clothes
+            self.hide_faces_model.set_value(MHCaller.hide_faces)
 
             # Update the list of applied modifiers
             self.param_panel.load_values(prim)
 
     def new_human(self):
         """Creates a new human in the scene and selects it"""
-        
+
+        # Finish editing the current human
+        self._commit_preview()
+
         # Reset the human class
         self._human.reset()
 
@@ -171,15 +193,59 @@ class MHWindow(ui.Window):
         """Updates the current human in the scene"""
         # Collect changed values from the parameter panel
         self.param_panel.update_models()
-
+        # Include changes still waiting for an instant update
+        self._scheduler.apply_pending()
 
         # Update the human in the scene
         self._human.update_in_scene(self._human.prim_path)
+        self._preview_active = False
+
+    def _update_preview(self, values: dict):
+        """Writes a low-resolution preview of the current human to the scene. Changes to
+        modifiers which are all exported as blend shapes only write blend shape weights
+
+        Parameters
+        ----------
+        values : dict
+            Changed modifier values, keyed by full name
+        """
+        if self._human.has_blend_shapes(list(values)) and self._human.set_blend_shape_values(values):
+            return
+        self._human.update_in_scene(self._human.prim_path, preview=True)
+        self._preview_active = True
+
+    def _commit_preview(self):
+        """Applies changes waiting for an instant update and writes the full-resolution meshes
+        of the current human, if the scene holds a preview or there were such changes. The
+        human is written once, without a preview first"""
+        changed = bool(self._scheduler.apply_pending())
+        if (changed or self._preview_active) and self._human.prim and self._human.prim.IsValid():
+            self._human.update_in_scene(self._human.prim_path)
+        self._preview_active = False
+
+    def _on_hide_faces_changed(self, model: ui.SimpleBoolModel):
+        """Hides or shows faces covered by clothes, and updates the current human
+
+        Parameters
+        ----------
+        model : ui.SimpleBoolModel
+            Model holding the state of the toggle
+        """
+        enabled = model.get_value_as_bool()
+        # The model is also set to match a selected human, which doesn't change it
+        if enabled == MHCaller.hide_faces:
+            return
+        MHCaller.set_face_hiding(enabled)
+        if self._human.prim and self._human.prim.IsValid():
+            self.update_human()
 
     def reset_human(self):
         """Resets the current human in the scene"""
-        # Reset the human
-        self._human.reset()
+        # Discard changes waiting for an instant update
+        self._scheduler.cancel()
+
+        # Reset the human. It keeps its subdivision, merging and texture options
+        self._human.reset(keep_options=True)
 
         # Delete the proxy prims
         self._human.delete_proxies()
@@ -191,4 +257,5 @@ class MHWindow(ui.Window):
         """Called when the window is destroyed. Unsuscribes from human selection events"""
         self._selection_sub.unsubscribe()
         self._selection_sub = None
+        self._scheduler.destroy()
         super().destroy()